@@ -0,0 +1,371 @@
+"""
+Write-behind activity log.
+
+Routes enqueue activity events instead of committing one row per action;
+a background task writes them in bulk INSERTs once `batch_size` events are
+waiting or every `interval` seconds. Logging never writes to the database
+itself (it may run inside the caller's transaction): memory is bounded by
+dropping the oldest event once `max_pending` are queued. A batch that fails
+to write is retried on later flushes, apart from newer events so it cannot
+hold them up, and dropped after `max_attempts` failures. Anything left is
+flushed on shutdown, and readers that need their own writes (history right
+after an upload) call flush() first.
+
+Retention: raw events older than ACTIVITY_RETENTION_DAYS are compacted into
+per-user daily counts (ActivityDaily) by archive_activity(), one day at a
+time, so the activities table only holds the recent window. Clearing a
+user's history just records a HistoryClear timestamp that hides older
+events; the archival job deletes them later. Run it by hand with
+`python -m app.activity`.
+"""
+
+import asyncio
+import threading
+from datetime import datetime, time, timedelta
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import func, insert, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.config import (
+    ACTIVITY_BATCH_SIZE,
+    ACTIVITY_FLUSH_INTERVAL_SECONDS,
+    ACTIVITY_MAX_PENDING,
+    ACTIVITY_FLUSH_ATTEMPTS,
+    ACTIVITY_RETENTION_DAYS,
+    ACTIVITY_RECENT_DAYS,
+)
+from app.database import SessionLocal
+from app.models import Activity, ActivityDaily, HistoryClear, UserUsage, File as FileModel
+from app.usage import bump_version
+
+
+class ActivityLog:
+    def __init__(
+        self, batch_size: int, interval: float, max_pending: int, max_attempts: int = 3
+    ):
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_pending = max_pending
+        self.max_attempts = max(1, max_attempts)
+        self._pending: List[dict] = []
+        # Batches that failed to write: (events, failures so far), oldest first.
+        self._failed: List[Tuple[List[dict], int]] = []
+        self._lock = threading.Lock()
+        # Serializes flushes so events are inserted in the order they were logged.
+        self._flush_lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0
+
+    def log(
+        self,
+        user_id: int,
+        action: str,
+        filename: Optional[str] = None,
+        file_id: Optional[int] = None,
+    ) -> None:
+        """Queue one event. Safe to call from any thread."""
+        event = {
+            "user_id": user_id,
+            "action": action,
+            "filename": filename,
+            "file_id": file_id,
+            "created_at": datetime.utcnow(),
+        }
+        with self._lock:
+            self._pending.append(event)
+            if len(self._pending) > self.max_pending:
+                del self._pending[0]  # the flusher is far behind; keep the bound
+                self.dropped += 1
+            queued = len(self._pending)
+        if queued >= self.batch_size and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def detach_files(self, file_ids: Iterable[int]) -> None:
+        """Drop file references from queued events (the files are being deleted)."""
+        file_ids = set(file_ids)
+        with self._lock:
+            for event in self._queued():
+                if event["file_id"] in file_ids:
+                    event["file_id"] = None
+
+    def discard_user(self, user_id: int) -> None:
+        """Forget queued events of a user whose history is being cleared."""
+        with self._lock:
+            self._pending = [e for e in self._pending if e["user_id"] != user_id]
+            kept = (
+                ([e for e in events if e["user_id"] != user_id], failures)
+                for events, failures in self._failed
+            )
+            self._failed = [(events, failures) for events, failures in kept if events]
+
+    def _queued(self) -> Iterator[dict]:
+        """Events waiting to be written, new or retried (hold _lock)."""
+        for events, _ in self._failed:
+            yield from events
+        yield from self._pending
+
+    def flush(self) -> int:
+        """
+        Write every queued event now, and retry batches that failed before.
+        Blocking; returns how many were written. Failures are reported, not
+        raised.
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+                attempts, self._failed = self._failed, []
+            if batch:
+                attempts.append((batch, 0))
+            written = 0
+            for events, failures in attempts:
+                try:
+                    self._write(events)
+                except Exception as e:
+                    failures += 1
+                    with self._lock:
+                        if failures < self.max_attempts:
+                            self._failed.append((events, failures))
+                        else:
+                            self.dropped += len(events)
+                    if failures < self.max_attempts:
+                        print(f"⚠️ Activity flush failed, {len(events)} events kept:", e)
+                    else:
+                        print(f"⚠️ Activity flush failed {failures} times, "
+                              f"{len(events)} events dropped:", e)
+                    continue
+                written += len(events)
+                self.batches += 1
+            self.written += written
+            return written
+
+    def _write(self, batch: List[dict]) -> None:
+        db = SessionLocal()
+        users = {e["user_id"] for e in batch}
+        try:
+            try:
+                db.execute(insert(Activity), batch)
+                bump_version(db, users, UserUsage.history_version)
+                db.commit()
+            except IntegrityError:
+                # A referenced file was deleted between logging and flushing.
+                db.rollback()
+                ids = {e["file_id"] for e in batch if e["file_id"] is not None}
+                alive = {
+                    i for (i,) in db.query(FileModel.id).filter(FileModel.id.in_(ids))
+                }
+                for e in batch:
+                    if e["file_id"] not in alive:
+                        e["file_id"] = None
+                db.execute(insert(Activity), batch)
+                bump_version(db, users, UserUsage.history_version)
+                db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await asyncio.to_thread(self.flush)
+
+    def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background task and write whatever is still queued."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._loop = None
+        await asyncio.to_thread(self.flush)
+
+    def stats(self) -> dict:
+        with self._lock:
+            pending = len(self._pending)
+            retrying = sum(len(events) for events, _ in self._failed)
+        return {
+            "pending": pending,
+            "retrying": retrying,
+            "written": self.written,
+            "batches": self.batches,
+            "dropped": self.dropped,
+        }
+
+
+activity_log = ActivityLog(
+    batch_size=ACTIVITY_BATCH_SIZE,
+    interval=ACTIVITY_FLUSH_INTERVAL_SECONDS,
+    max_pending=ACTIVITY_MAX_PENDING,
+    max_attempts=ACTIVITY_FLUSH_ATTEMPTS,
+)
+
+
+# ---------------- HISTORY CLEARING ----------------
+
+def history_horizon(db: Session, user_id: int) -> Optional[datetime]:
+    """Activity at or before this time was cleared by the user."""
+    return (
+        db.query(HistoryClear.cleared_at)
+        .filter(HistoryClear.user_id == user_id)
+        .scalar()
+    )
+
+
+def visible_activity(db: Session, user_id: int, *columns):
+    """Query of the user's activity that has not been cleared (of `columns`, or entities)."""
+    query = db.query(*(columns or (Activity,))).filter(Activity.user_id == user_id)
+    horizon = history_horizon(db, user_id)
+    if horizon is not None:
+        query = query.filter(Activity.created_at > horizon)
+    return query
+
+
+def clear_history(db: Session, user_id: int) -> None:
+    """Hide all of the user's activity so far; one row write, whatever its size."""
+    activity_log.discard_user(user_id)
+    now = datetime.utcnow()
+    mark = db.get(HistoryClear, user_id)
+    if mark:
+        mark.cleared_at = now
+    else:
+        db.add(HistoryClear(user_id=user_id, cleared_at=now))
+    bump_version(db, [user_id], UserUsage.history_version)
+    try:
+        db.commit()
+    except IntegrityError:
+        # Concurrent first clear by the same user; update the row it created.
+        db.rollback()
+        db.get(HistoryClear, user_id).cleared_at = now
+        bump_version(db, [user_id], UserUsage.history_version)
+        db.commit()
+
+
+# ---------------- RETENTION ----------------
+
+def recent_activity_count(db: Session, days: int = ACTIVITY_RECENT_DAYS) -> int:
+    """Events in the last `days` days (an index range on created_at)."""
+    since = datetime.utcnow() - timedelta(days=days)
+    return (
+        db.query(func.count(Activity.id))
+        .filter(Activity.created_at >= since)
+        .scalar()
+    )
+
+
+def _purge_cleared(db: Session) -> int:
+    """
+    Delete the raw events and daily counts hidden by HistoryClear marks
+    that are newer than their last purge, one user (and transaction) at a
+    time, each an index range on (user_id, created_at). Nothing to do, and
+    no scan, when nobody has cleared their history since the last run.
+    """
+    marks = (
+        db.query(HistoryClear.user_id, HistoryClear.cleared_at)
+        .filter(
+            or_(
+                HistoryClear.purged_at.is_(None),
+                HistoryClear.purged_at < HistoryClear.cleared_at,
+            )
+        )
+        .all()
+    )
+    removed = 0
+    for user_id, cleared_at in marks:
+        removed += (
+            db.query(Activity)
+            .filter(Activity.user_id == user_id, Activity.created_at <= cleared_at)
+            .delete(synchronize_session=False)
+        )
+        db.query(ActivityDaily).filter(
+            ActivityDaily.user_id == user_id, ActivityDaily.day < cleared_at
+        ).delete(synchronize_session=False)
+        # Only if not cleared again meanwhile; a newer mark is purged next run.
+        db.query(HistoryClear).filter(
+            HistoryClear.user_id == user_id, HistoryClear.cleared_at == cleared_at
+        ).update({HistoryClear.purged_at: cleared_at}, synchronize_session=False)
+        db.commit()
+    return removed
+
+
+def _compact_day(db: Session, start: datetime) -> int:
+    """Fold one day of raw events into ActivityDaily and delete them."""
+    end = start + timedelta(days=1)
+    in_day = (Activity.created_at >= start, Activity.created_at < end)
+    counts = (
+        db.query(Activity.user_id, Activity.action, func.count(Activity.id))
+        .filter(*in_day)
+        .group_by(Activity.user_id, Activity.action)
+        .all()
+    )
+    existing = {
+        (d.user_id, d.action): d
+        for d in db.query(ActivityDaily).filter(ActivityDaily.day == start.date())
+    }
+    for user_id, action, n in counts:
+        row = existing.get((user_id, action))
+        if row:
+            row.count += n
+        else:
+            db.add(ActivityDaily(user_id=user_id, day=start.date(), action=action, count=n))
+    removed = db.query(Activity).filter(*in_day).delete(synchronize_session=False)
+    # Those events are gone from their owners' history.
+    bump_version(db, {u for u, _, _ in counts}, UserUsage.history_version)
+    db.commit()
+    return removed
+
+
+def archive_activity(
+    db: Optional[Session] = None, retention_days: int = ACTIVITY_RETENTION_DAYS
+) -> dict:
+    """
+    Drop cleared events, then compact every whole day older than the
+    retention window, oldest first, one transaction per day.
+    """
+    own_session = db is None
+    db = db or SessionLocal()
+    try:
+        purged = _purge_cleared(db)
+        cutoff = datetime.combine(
+            datetime.utcnow().date() - timedelta(days=retention_days), time.min
+        )
+        archived = days = 0
+        while True:
+            oldest = (
+                db.query(func.min(Activity.created_at))
+                .filter(Activity.created_at < cutoff)
+                .scalar()
+            )
+            if oldest is None:
+                break
+            archived += _compact_day(db, datetime.combine(oldest.date(), time.min))
+            days += 1
+        return {"purged": purged, "archived": archived, "days": days}
+    finally:
+        if own_session:
+            db.close()
+
+
+if __name__ == "__main__":
+    result = archive_activity()
+    print(
+        f"Removed {result['purged']} cleared event(s); compacted {result['archived']} "
+        f"event(s) from {result['days']} day(s) into daily counts."
+    )
@@ -2,15 +2,21 @@
 Admin dashboard APIs: global stats, user list, etc.
 """
 
-from typing import List
+from typing import Iterator, List
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 
 from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
 
-from app.database import get_db
-from app.models import User, File, Activity
-from app.auth import get_current_user, require_admin
+from app.database import SessionLocal, get_db, pool_stats
+from app.models import User, UserUsage, Blob, File as FileModel
+from app.auth import Principal, require_admin, principal_cache, password_hasher
+from app.files import signed_urls, download_cache, preview_workers
+from app.activity import activity_log, recent_activity_count
+from app.metrics import profiles
+from app.admission import admission
+from app.responses import json_array_stream
 
 router = APIRouter(prefix="/api/admin", tags=["admin"])
 
@@ -18,36 +24,87 @@ router = APIRouter(prefix="/api/admin", tags=["admin"])
 @router.get("/stats")
 def admin_stats(
     db: Session = Depends(get_db),
-    user: User = Depends(require_admin),
+    user: Principal = Depends(require_admin),
 ) -> dict:
-    """Admin dashboard: total users, total files, total storage, recent activity count."""
+    """Admin dashboard: totals (storage is logical), recent activity, dedup and compression savings."""
     total_users = db.query(User).count()
-    total_files = db.query(File).count()
-    total_storage = db.query(func.sum(File.size_bytes)).scalar() or 0
-    recent_activities = db.query(Activity).count()  # or filter by last 7 days
+    # Per-user counters (see app.usage), one row per user instead of a files scan.
+    total_files, total_storage = db.query(
+        func.coalesce(func.sum(UserUsage.file_count), 0),
+        func.coalesce(func.sum(UserUsage.bytes_used), 0),
+    ).one()
+    recent_activities = recent_activity_count(db)  # last ACTIVITY_RECENT_DAYS
+
+    # Each blob reference beyond the first is an upload that was deduplicated.
+    blobs, refs, stored, referenced, physical = db.query(
+        func.count(Blob.sha256),
+        func.coalesce(func.sum(Blob.ref_count), 0),
+        func.coalesce(func.sum(Blob.size_bytes), 0),
+        func.coalesce(func.sum(Blob.size_bytes * Blob.ref_count), 0),
+        func.coalesce(func.sum(func.coalesce(Blob.stored_size_bytes, Blob.size_bytes)), 0),
+    ).one()
+    # Files from before deduplication have no blob (and are never compressed).
+    unshared = (
+        db.query(func.coalesce(func.sum(FileModel.size_bytes), 0))
+        .filter(FileModel.blob_sha256.is_(None))
+        .scalar()
+    )
+    # None until a proxied download has built it (or outside proxy mode).
+    cache = download_cache(create=False)
     return {
         "total_users": total_users,
         "total_files": total_files,
         "total_storage_bytes": total_storage,
         "total_storage_mb": round(total_storage / (1024 * 1024), 2),
         "recent_activities": recent_activities,
+        "dedup_hit_rate": round((refs - blobs) / refs, 4) if refs else 0.0,
+        "dedup_bytes_saved": referenced - stored,
+        "compression_bytes_saved": stored - physical,
+        "physical_storage_bytes": physical + unshared,
+        "signed_url_cache": signed_urls.stats(),
+        "download_cache": cache.stats() if cache else None,
+        "previews": preview_workers.stats(),
+        "auth_cache": principal_cache.stats(),
+        "password_hasher": password_hasher.stats(),
+        "activity_log": activity_log.stats(),
+        "db_pool": pool_stats(),
+        "admission": admission.stats(),
     }
 
 
+def _user_rows(batch_size: int = 1000) -> Iterator[dict]:
+    """Every user, newest first, read `batch_size` rows at a time."""
+    db = SessionLocal()
+    try:
+        rows = (
+            db.query(User.id, User.email, User.full_name, User.is_admin, User.created_at)
+            .order_by(User.created_at.desc())
+            .yield_per(batch_size)
+        )
+        for u in rows:
+            yield {
+                "id": u.id,
+                "email": u.email,
+                "full_name": u.full_name,
+                "is_admin": u.is_admin,
+                "created_at": u.created_at,
+            }
+    finally:
+        db.close()
+
+
 @router.get("/users")
 def admin_users(
-    db: Session = Depends(get_db),
-    user: User = Depends(require_admin),
+    user: Principal = Depends(require_admin),
+) -> StreamingResponse:
+    """List all users (for admin), streamed as one JSON array."""
+    return StreamingResponse(json_array_stream(_user_rows()), media_type="application/json")
+
+
+@router.get("/profiles")
+def admin_profiles(
+    full: bool = False,
+    user: Principal = Depends(require_admin),
 ) -> List[dict]:
-    """List all users (for admin)."""
-    users = db.query(User).order_by(User.created_at.desc()).all()
-    return [
-        {
-            "id": u.id,
-            "email": u.email,
-            "full_name": u.full_name,
-            "is_admin": u.is_admin,
-            "created_at": u.created_at.isoformat() if u.created_at else None,
-        }
-        for u in users
-    ]
+    """Kept request profiles, newest first (see app.metrics); `full` includes the cProfile text."""
+    return [p if full else {k: v for k, v in p.items() if k != "profile"} for p in profiles]
@@ -0,0 +1,301 @@
+"""
+Admission control: per-user rate limits and upload caps.
+
+AdmissionMiddleware classifies each request by method and path into a
+route class (auth, upload, download-link, listing) and takes a token from
+that user's bucket for the class; uploads must also get one of the user's
+concurrent upload slots and room for their Content-Length in the per-user
+and process-wide in-flight byte budgets. A request that cannot be admitted
+is answered 429 with Retry-After straight away: it is decided before the
+body is read, a DB connection is taken or the principal is loaded, so a
+client hammering the API costs little more than the rejection itself.
+
+Users are identified by their session token (the same cached decode as
+get_current_user); requests without one, and login/register, by client
+address: the peer's, or behind a trusted proxy the one it forwarded.
+Everything is per process.
+"""
+
+import ipaddress
+import math
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional, Tuple
+
+from fastapi.responses import JSONResponse
+
+from app.auth import user_id_from_token
+from app.config import (
+    RATE_LIMIT_ENABLED,
+    RATE_LIMIT_AUTH_PER_MINUTE,
+    RATE_LIMIT_AUTH_BURST,
+    RATE_LIMIT_UPLOAD_PER_MINUTE,
+    RATE_LIMIT_UPLOAD_BURST,
+    RATE_LIMIT_DOWNLOAD_LINK_PER_MINUTE,
+    RATE_LIMIT_DOWNLOAD_LINK_BURST,
+    RATE_LIMIT_LISTING_PER_MINUTE,
+    RATE_LIMIT_LISTING_BURST,
+    RATE_LIMIT_MAX_KEYS,
+    TRUSTED_PROXIES,
+    UPLOADS_MAX_CONCURRENT_PER_USER,
+    UPLOAD_BYTES_IN_FLIGHT_PER_USER,
+    UPLOAD_BYTES_IN_FLIGHT_MAX,
+    MAX_FILE_SIZE_BYTES,
+)
+from app.metrics import Counter, registry
+
+# (method, path pattern, route class, holds an upload slot)
+ROUTE_CLASSES: List[Tuple[str, "re.Pattern", str, bool]] = [
+    ("POST", re.compile(r"/api/auth/(login|register)"), "auth", False),
+    ("POST", re.compile(r"/api/files/upload"), "upload", True),
+    ("POST", re.compile(r"/api/files/uploads/?"), "upload", False),
+    ("PUT", re.compile(r"/api/files/uploads/[^/]+/parts/\d+"), "upload", True),
+    ("POST", re.compile(r"/api/files/uploads/[^/]+/commit"), "upload", True),
+    ("POST", re.compile(r"/api/files/direct/?"), "upload", False),
+    ("POST", re.compile(r"/api/files/direct/[^/]+/finalize"), "upload", False),
+    ("PUT", re.compile(r"/api/storage/local/.+"), "upload", True),
+    ("GET", re.compile(r"/api/files/\d+/download"), "download-link", False),
+    ("POST", re.compile(r"/api/files/(signed-urls|bulk-download)"), "download-link", False),
+    ("GET", re.compile(r"/api/files/?"), "listing", False),
+    ("GET", re.compile(r"/api/files/(search|storage)"), "listing", False),
+    ("GET", re.compile(r"/api/auth/history"), "listing", False),
+]
+
+# route class -> (requests per minute, burst)
+RATE_LIMITS: Dict[str, Tuple[float, int]] = {
+    "auth": (RATE_LIMIT_AUTH_PER_MINUTE, RATE_LIMIT_AUTH_BURST),
+    "upload": (RATE_LIMIT_UPLOAD_PER_MINUTE, RATE_LIMIT_UPLOAD_BURST),
+    "download-link": (RATE_LIMIT_DOWNLOAD_LINK_PER_MINUTE, RATE_LIMIT_DOWNLOAD_LINK_BURST),
+    "listing": (RATE_LIMIT_LISTING_PER_MINUTE, RATE_LIMIT_LISTING_BURST),
+}
+
+admission_rejections = registry.add(Counter(
+    "admission_rejections_total", "Requests answered 429 by admission control.",
+    ("route_class", "reason"),
+))
+
+
+def classify(method: str, path: str) -> Tuple[Optional[str], bool]:
+    """(route class, holds an upload slot); (None, False) for unlimited routes."""
+    for m, pattern, route_class, upload in ROUTE_CLASSES:
+        if method == m and pattern.fullmatch(path):
+            return route_class, upload
+    return None, False
+
+
+class RateLimiter:
+    """
+    Token buckets keyed by (route class, client). A bucket holds up to
+    `burst` tokens and refills at per_minute / 60 a second; a class with
+    per_minute <= 0 is not limited. At most `max_keys` buckets are kept,
+    least recently used dropped first (an idle bucket is full anyway).
+    """
+
+    def __init__(self, limits: Dict[str, Tuple[float, int]], max_keys: int = 100000):
+        self.limits = limits
+        self.max_keys = max_keys
+        # key -> [tokens, last refill (monotonic)]
+        self._buckets: "OrderedDict[Hashable, list]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, route_class: str, client: Hashable) -> float:
+        """Take a token. Returns 0 if admitted, else seconds until one is available."""
+        per_minute, burst = self.limits.get(route_class, (0, 0))
+        if per_minute <= 0:
+            return 0.0
+        rate = per_minute / 60
+        key = (route_class, client)
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [float(max(burst, 1)), now]
+                while len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(max(burst, 1), bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return 0.0
+            return (1 - bucket[0]) / rate
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class UploadGate:
+    """Concurrent upload slots per user, and in-flight request bytes per user and in total."""
+
+    def __init__(self, max_per_user: int, bytes_per_user: int, bytes_total: int):
+        self.max_per_user = max_per_user
+        self.bytes_per_user = bytes_per_user
+        self.bytes_total = bytes_total
+        self._active: Dict[Hashable, List[int]] = {}  # client -> [uploads, bytes]
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, client: Hashable, nbytes: int) -> Optional[str]:
+        """Reserve a slot and `nbytes`. Returns None if admitted, else the reason it was not."""
+        with self._lock:
+            uploads, held = self._active.get(client, (0, 0))
+            if uploads >= self.max_per_user:
+                return "concurrency"
+            # One upload is always let through, however large, so limits
+            # below MAX_FILE_SIZE_BYTES cannot lock a user out.
+            if uploads and held + nbytes > self.bytes_per_user:
+                return "bytes"
+            if self._bytes and self._bytes + nbytes > self.bytes_total:
+                return "bytes"
+            self._active[client] = [uploads + 1, held + nbytes]
+            self._bytes += nbytes
+            return None
+
+    def release(self, client: Hashable, nbytes: int) -> None:
+        with self._lock:
+            entry = self._active[client]
+            entry[0] -= 1
+            entry[1] -= nbytes
+            if not entry[0]:
+                del self._active[client]
+            self._bytes -= nbytes
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "uploads_in_flight": sum(a[0] for a in self._active.values()),
+                "upload_bytes_reserved": self._bytes,
+                "users_uploading": len(self._active),
+            }
+
+
+class Admission:
+    def __init__(self, limiter: RateLimiter, uploads: UploadGate):
+        self.limiter = limiter
+        self.uploads = uploads
+        self._rejections: Dict[Tuple[str, str], int] = {}
+        self._lock = threading.Lock()
+
+    def rejected(self, route_class: str, reason: str) -> None:
+        admission_rejections.inc(route_class=route_class, reason=reason)
+        with self._lock:
+            key = (route_class, reason)
+            self._rejections[key] = self._rejections.get(key, 0) + 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            rejections = {f"{c}:{r}": n for (c, r), n in sorted(self._rejections.items())}
+        return {
+            "enabled": RATE_LIMIT_ENABLED,
+            "buckets": len(self.limiter),
+            "rejections": rejections,
+            **self.uploads.stats(),
+        }
+
+
+admission = Admission(
+    RateLimiter(RATE_LIMITS, RATE_LIMIT_MAX_KEYS),
+    UploadGate(
+        UPLOADS_MAX_CONCURRENT_PER_USER,
+        UPLOAD_BYTES_IN_FLIGHT_PER_USER,
+        UPLOAD_BYTES_IN_FLIGHT_MAX,
+    ),
+)
+
+
+def _header(scope, name: bytes) -> Optional[str]:
+    for k, v in scope["headers"]:
+        if k == name:
+            return v.decode("latin-1")
+    return None
+
+
+_trusted_networks = [ipaddress.ip_network(p, strict=False) for p in TRUSTED_PROXIES]
+
+
+def _trusted(addr: str) -> bool:
+    try:
+        ip = ipaddress.ip_address(addr)
+    except ValueError:
+        return False
+    return any(ip in net for net in _trusted_networks)
+
+
+def client_address(scope) -> str:
+    """
+    The peer address; when the peer is a trusted proxy, the right-most
+    X-Forwarded-For hop that is not one (the address the outermost trusted
+    proxy saw). Hops further left are the client's own claims.
+    """
+    client = scope.get("client")
+    addr = client[0] if client else "unknown"
+    if not _trusted(addr):
+        return addr
+    forwarded = _header(scope, b"x-forwarded-for") or ""
+    for hop in reversed([h.strip() for h in forwarded.split(",") if h.strip()]):
+        addr = hop
+        if not _trusted(hop):
+            break
+    return addr
+
+
+def client_key(scope, route_class: str) -> str:
+    """The session's user id, or the client address for login/register and anonymous requests."""
+    auth = _header(scope, b"authorization")
+    if route_class != "auth" and auth and auth[:7].lower() == "bearer ":
+        user_id = user_id_from_token(auth[7:].strip())
+        if user_id is not None:
+            return f"user:{user_id}"
+    return f"addr:{client_address(scope)}"
+
+
+def _too_many(retry_after: float, detail: str) -> JSONResponse:
+    seconds = max(1, math.ceil(retry_after))
+    return JSONResponse(
+        {"detail": f"{detail}, retry in {seconds} s"},
+        status_code=429,
+        headers={"Retry-After": str(seconds)},
+    )
+
+
+class AdmissionMiddleware:
+    def __init__(self, app, admission: Admission = admission):
+        self.app = app
+        self.admission = admission
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not RATE_LIMIT_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        route_class, upload = classify(scope["method"], scope["path"])
+        if route_class is None:
+            await self.app(scope, receive, send)
+            return
+
+        client = client_key(scope, route_class)
+        wait = self.admission.limiter.acquire(route_class, client)
+        if wait:
+            self.admission.rejected(route_class, "rate")
+            await _too_many(wait, "Too many requests")(scope, receive, send)
+            return
+        if not upload:
+            await self.app(scope, receive, send)
+            return
+
+        # Without a Content-Length, assume the largest upload allowed.
+        try:
+            nbytes = max(0, int(_header(scope, b"content-length") or MAX_FILE_SIZE_BYTES))
+        except ValueError:
+            nbytes = MAX_FILE_SIZE_BYTES
+        reason = self.admission.uploads.acquire(client, nbytes)
+        if reason:
+            self.admission.rejected(route_class, reason)
+            await _too_many(1, "Too many uploads in progress")(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.admission.uploads.release(client, nbytes)
@@ -0,0 +1,164 @@
+"""
+Streaming ZIP export: build an archive of many storage objects on the fly.
+
+Objects are fetched by a small thread pool, at most `concurrency` at a time,
+each into a queue of at most `readahead` chunks. The ZIP is written to an
+in-memory buffer that is drained after every chunk, so memory stays around
+concurrency * readahead * chunk_size and nothing touches disk. Entries use
+data descriptors, which is what lets the archive be written without seeking.
+"""
+
+import io
+import queue
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import PurePosixPath
+from typing import Iterator, List, NamedTuple, Optional
+
+from app.compression import decode
+from app.storage import StorageBackend
+
+_DONE = object()
+
+
+class ArchiveEntry(NamedTuple):
+    path: str  # storage object path
+    name: str  # file name inside the archive
+    size: int
+    modified: Optional[datetime]
+    encoding: Optional[str] = None  # stored object's content encoding
+
+
+class _Sink(io.RawIOBase):
+    """Unseekable write target whose contents are taken after each write."""
+
+    def __init__(self):
+        self._buf = bytearray()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self._buf += b
+        return len(b)
+
+    def take(self) -> bytes:
+        data = bytes(self._buf)
+        self._buf.clear()
+        return data
+
+
+def unique_names(names: List[str]) -> List[str]:
+    """Disambiguate repeated names as "a.txt", "a (1).txt", "a (2).txt"..."""
+    seen = set()
+    out = []
+    for name in names:
+        name = PurePosixPath(name.replace("\\", "/")).name or "file"
+        candidate, n = name, 0
+        while candidate in seen:
+            n += 1
+            p = PurePosixPath(name)
+            candidate = f"{p.stem} ({n}){p.suffix}"
+        seen.add(candidate)
+        out.append(candidate)
+    return out
+
+
+class ZipStream:
+    def __init__(
+        self,
+        backend: StorageBackend,
+        entries: List[ArchiveEntry],
+        concurrency: int = 4,
+        readahead: int = 4,
+        chunk_size: int = 1024 * 1024,
+        compression: int = zipfile.ZIP_STORED,
+    ):
+        self.backend = backend
+        self.entries = entries
+        self.concurrency = max(1, concurrency)
+        self.readahead = max(1, readahead)
+        self.chunk_size = chunk_size
+        self.compression = compression
+        self._stop = threading.Event()
+
+    def _put(self, q: queue.Queue, item) -> bool:
+        # Block while the consumer is behind, but give up once it has gone away.
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _fetch(self, entry: ArchiveEntry, q: queue.Queue) -> None:
+        try:
+            chunks = self.backend.open_stream(entry.path, self.chunk_size)
+            for chunk in decode(chunks, entry.encoding):
+                if not self._put(q, chunk):
+                    return
+            self._put(q, _DONE)
+        except Exception as e:
+            self._put(q, e)
+
+    def __iter__(self) -> Iterator[bytes]:
+        sink = _Sink()
+        pool = ThreadPoolExecutor(
+            max_workers=self.concurrency, thread_name_prefix="archive"
+        )
+        queues: List[queue.Queue] = []
+
+        def start(i: int) -> None:
+            q = queue.Queue(maxsize=self.readahead)
+            queues.append(q)
+            pool.submit(self._fetch, self.entries[i], q)
+
+        names = unique_names([e.name for e in self.entries])
+        failed = []
+        try:
+            with zipfile.ZipFile(sink, mode="w", compression=self.compression) as zf:
+                for i in range(min(self.concurrency, len(self.entries))):
+                    start(i)
+                for i, entry in enumerate(self.entries):
+                    q = queues[i]
+                    first = q.get()
+                    if i + self.concurrency < len(self.entries):
+                        start(i + self.concurrency)
+                    queues[i] = None  # let the finished queue be collected
+                    if isinstance(first, Exception):
+                        # Object unreadable: leave it out and list it at the end.
+                        failed.append(f"{names[i]}: {first}")
+                        continue
+
+                    info = zipfile.ZipInfo(names[i], _zip_time(entry.modified))
+                    info.compress_type = self.compression
+                    info.file_size = entry.size
+                    with zf.open(info, "w", force_zip64=entry.size > (1 << 31)) as out:
+                        item = first
+                        while item is not _DONE:
+                            if isinstance(item, Exception):
+                                raise item  # mid-object failure: abort the stream
+                            out.write(item)
+                            data = sink.take()
+                            if data:
+                                yield data
+                            item = q.get()
+                    data = sink.take()  # data descriptor
+                    if data:
+                        yield data
+
+                if failed:
+                    zf.writestr("_export_errors.txt", "\n".join(failed) + "\n")
+            yield sink.take()  # central directory
+        finally:
+            self._stop.set()
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _zip_time(modified: Optional[datetime]):
+    t = modified or datetime.utcnow()
+    # ZIP timestamps cannot go before 1980.
+    return max((t.year, t.month, t.day, t.hour, t.minute, t.second), (1980, 1, 1, 0, 0, 0))
@@ -2,31 +2,77 @@
 JWT authentication: hash password, create/verify token, get current user.
 """
 
+import time
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import NamedTuple, Optional, Tuple
 
 import jwt
 from jwt import PyJWTError
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials, OAuth2PasswordBearer
 
-from app.config import JWT_SECRET, JWT_ALGORITHM, JWT_EXPIRE_MINUTES
-from app.database import get_db
+from app.config import (
+    JWT_SECRET,
+    JWT_ALGORITHM,
+    JWT_EXPIRE_MINUTES,
+    AUTH_CACHE_SIZE,
+    AUTH_CACHE_TTL_SECONDS,
+    BCRYPT_ROUNDS,
+    BCRYPT_WORKERS,
+    BCRYPT_MAX_PENDING,
+)
+from app.cache import LRUCache
+from app.hashing import PasswordHasher, PoolSaturated, hash_secret, verify_secret
+from app.database import DBRunner, get_runner
 from app.models import User
+from sqlalchemy import event
 from sqlalchemy.orm import Session
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+password_hasher = PasswordHasher(
+    workers=BCRYPT_WORKERS, max_pending=BCRYPT_MAX_PENDING, rounds=BCRYPT_ROUNDS
+)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login", auto_error=False)
 bearer_scheme = HTTPBearer(auto_error=False)
 
 
+def _normalize(password: str) -> str:
+    return password.strip()[:72]  # bcrypt limit protection
+
+
 def hash_password(password: str) -> str:
-    password = password.strip()[:72]  # bcrypt limit protection
-    return pwd_context.hash(password)
+    return hash_secret(_normalize(password), BCRYPT_ROUNDS)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password.strip()[:72], hashed_password)
+    return verify_secret(_normalize(plain_password), hashed_password, BCRYPT_ROUNDS)[0]
+
+
+def _busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many login attempts in progress, try again shortly",
+        headers={"Retry-After": "1"},
+    )
+
+
+async def hash_password_pooled(password: str) -> str:
+    """hash_password on the bcrypt process pool; 503 when it is saturated."""
+    try:
+        return await password_hasher.hash(_normalize(password))
+    except PoolSaturated:
+        raise _busy()
+
+
+async def verify_password_pooled(
+    plain_password: str, hashed_password: str
+) -> Tuple[bool, Optional[str]]:
+    """
+    Check a password on the bcrypt process pool. Returns (ok, new_hash);
+    new_hash is set when the stored hash used a different cost factor.
+    """
+    try:
+        return await password_hasher.verify(_normalize(plain_password), hashed_password)
+    except PoolSaturated:
+        raise _busy()
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
@@ -43,43 +89,140 @@ def decode_token(token: str) -> Optional[dict]:
         return None
 
 
-def get_current_user(
-    db: Session = Depends(get_db),
+def create_file_token(user_id: int, file_id: int, expires_in: int) -> str:
+    """Token that grants reading one file's content (and nothing else)."""
+    return create_access_token(
+        {"sub": str(user_id), "fid": file_id, "scope": "file"},
+        timedelta(seconds=expires_in),
+    )
+
+
+def user_id_from_file_token(token: str, file_id: int) -> Optional[int]:
+    payload = decode_token(token)
+    if not payload or payload.get("scope") != "file" or payload.get("fid") != file_id:
+        return None
+    return int(payload["sub"])
+
+
+# ---------------- Current user (cached) ----------------
+
+class Principal(NamedTuple):
+    """The authenticated user as routes see it; not attached to a DB session."""
+    id: int
+    email: str
+    full_name: Optional[str]
+    is_admin: bool
+
+
+# token -> user id (kept no longer than the token's own expiry)
+token_cache = LRUCache(AUTH_CACHE_SIZE, AUTH_CACHE_TTL_SECONDS)
+# user id -> Principal
+principal_cache = LRUCache(AUTH_CACHE_SIZE, AUTH_CACHE_TTL_SECONDS)
+
+
+def user_id_from_token(token: str) -> Optional[int]:
+    user_id = token_cache.get(token)
+    if user_id is not None:
+        return user_id
+    payload = decode_token(token)
+    if not payload or "sub" not in payload or "scope" in payload:
+        return None  # scoped tokens (file links) are not sessions
+    user_id = int(payload["sub"])
+    token_cache.set(token, user_id, ttl=payload.get("exp", 0) - time.time())
+    return user_id
+
+
+def load_principal(db: Session, user_id: int) -> Optional[Principal]:
+    """Principal for `user_id`, from cache or a single-row, column-only query."""
+    principal = principal_cache.get(user_id)
+    if principal is not None:
+        return principal
+    return _query_principal(db, user_id)
+
+
+def _query_principal(db: Session, user_id: int) -> Optional[Principal]:
+    row = (
+        db.query(User.id, User.email, User.full_name, User.is_admin)
+        .filter(User.id == user_id)
+        .first()
+    )
+    if not row:
+        return None
+    principal = Principal(row.id, row.email, row.full_name, bool(row.is_admin))
+    principal_cache.set(user_id, principal)
+    return principal
+
+
+def invalidate_user(user_id: int) -> None:
+    """Drop the cached principal; call after changing or deleting a user."""
+    principal_cache.pop(user_id)
+
+
+# ORM updates/deletes of a User (profile edits, admin flag, removal) evict it
+# automatically. Bulk query().update()/delete() bypass these hooks and must
+# call invalidate_user() themselves.
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _evict_changed_user(mapper, connection, target) -> None:
+    invalidate_user(target.id)
+
+
+def _lookup_principal(db: Session, user_id: int) -> Optional[Principal]:
+    """
+    _query_principal, then end the read-only transaction: it would otherwise
+    keep a pooled connection checked out until the request finishes, next
+    to the get_db session of routes that use one (a second connection for
+    the whole of a long upload).
+    """
+    try:
+        return _query_principal(db, user_id)
+    finally:
+        db.rollback()
+
+
+async def _principal(db: DBRunner, user_id: int) -> Optional[Principal]:
+    # Cache hits never leave the event loop.
+    principal = principal_cache.get(user_id)
+    if principal is not None:
+        return principal
+    return await db.run(_lookup_principal, user_id)
+
+
+async def get_current_user(
+    db: DBRunner = Depends(get_runner),
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme),
-) -> User:
+) -> Principal:
     if not credentials:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Not authenticated",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    payload = decode_token(credentials.credentials)
-    if not payload or "sub" not in payload:
+    user_id = user_id_from_token(credentials.credentials)
+    if user_id is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid or expired token",
         )
-    user_id = int(payload["sub"])
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await _principal(db, user_id)
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
     return user
 
 
-def get_current_user_optional(
-    db: Session = Depends(get_db),
+async def get_current_user_optional(
+    db: DBRunner = Depends(get_runner),
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme),
-) -> Optional[User]:
+) -> Optional[Principal]:
     if not credentials:
         return None
-    payload = decode_token(credentials.credentials)
-    if not payload or "sub" not in payload:
+    user_id = user_id_from_token(credentials.credentials)
+    if user_id is None:
         return None
-    user_id = int(payload["sub"])
-    return db.query(User).filter(User.id == user_id).first()
+    return await _principal(db, user_id)
 
 
-def require_admin(user: User = Depends(get_current_user)) -> User:
+def require_admin(user: Principal = Depends(get_current_user)) -> Principal:
     if not user.is_admin:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
     return user
@@ -0,0 +1,79 @@
+"""
+Early 413 for upload bodies over MAX_FILE_SIZE_BYTES.
+
+Upload routes only run once Starlette has spooled the whole multipart body,
+so the size checks in app.files and app.uploads come after every byte has
+arrived. BodyLimitMiddleware answers 413 as soon as the declared
+Content-Length, or the bytes received so far, pass the limit, and reads
+nothing more. The routes still check the file itself; this only bounds
+what a client can make the server receive.
+"""
+
+import re
+from typing import List, Tuple
+
+from fastapi.responses import JSONResponse
+
+from app.config import MAX_FILE_SIZE_BYTES
+
+# (method, path pattern) of routes whose body is an uploaded file.
+UPLOAD_ROUTES: List[Tuple[str, "re.Pattern"]] = [
+    ("POST", re.compile(r"/api/files/upload")),
+    ("PUT", re.compile(r"/api/files/uploads/[^/]+/parts/\d+")),
+]
+
+# Room for the multipart framing (boundary, part headers) around the file.
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+
+def _too_large() -> JSONResponse:
+    return JSONResponse({"detail": "File too large"}, status_code=413)
+
+
+class BodyLimitMiddleware:
+    def __init__(self, app, limit: int = MAX_FILE_SIZE_BYTES + MULTIPART_OVERHEAD_BYTES):
+        self.app = app
+        self.limit = limit
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not any(
+            scope["method"] == m and pattern.fullmatch(scope["path"])
+            for m, pattern in UPLOAD_ROUTES
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        declared = dict(scope["headers"]).get(b"content-length")
+        try:
+            if declared is not None and int(declared) > self.limit:
+                await _too_large()(scope, receive, send)
+                return
+        except ValueError:
+            pass  # the server rejects a malformed Content-Length itself
+
+        received = 0
+        rejected = False
+
+        async def limited_receive():
+            nonlocal received, rejected
+            if rejected:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.limit:
+                    # Answer now; the route sees a disconnect and gives up.
+                    rejected = True
+                    await _too_large()(scope, receive, send)
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def guarded_send(message):
+            if not rejected:
+                await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            if not rejected:
+                raise
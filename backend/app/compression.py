@@ -0,0 +1,164 @@
+"""
+Transparent compression of stored objects.
+
+Uploads are compressed as they stream to storage when that pays off: types
+that are already compressed (images, video, archives...) are stored as-is,
+and for everything else a sample of the first chunk is compressed to check
+the saving. zstd is used when the zstandard package is installed, gzip
+otherwise. The File row keeps the logical size_bytes (quota, listings,
+Range requests) next to stored_size_bytes and content_encoding.
+
+Objects are decoded when served, or passed through with Content-Encoding
+to clients that accept it.
+"""
+
+import zlib
+from typing import Iterable, Iterator, Optional
+
+from app.config import (
+    UPLOAD_COMPRESSION,
+    UPLOAD_COMPRESSION_MIN_BYTES,
+    UPLOAD_COMPRESSION_SAMPLE_BYTES,
+    UPLOAD_COMPRESSION_MIN_SAVING,
+)
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Formats that are compressed already; never worth another pass.
+INCOMPRESSIBLE_PREFIXES = ("image/", "video/", "audio/", "font/woff")
+INCOMPRESSIBLE_TYPES = {
+    "application/zip",
+    "application/gzip",
+    "application/x-gzip",
+    "application/x-bzip2",
+    "application/x-xz",
+    "application/x-7z-compressed",
+    "application/x-rar-compressed",
+    "application/vnd.rar",
+    "application/zstd",
+    "application/pdf",
+    "application/epub+zip",
+    "application/java-archive",
+    "application/vnd.android.package-archive",
+    # OOXML / ODF documents are ZIP containers.
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "application/vnd.openxmlformats-officedocument.presentationml.presentation",
+    "application/vnd.oasis.opendocument.text",
+    "application/vnd.oasis.opendocument.spreadsheet",
+}
+# SVG is text, whatever its "image/" prefix says.
+COMPRESSIBLE_EXCEPTIONS = {"image/svg+xml", "image/bmp", "image/x-ms-bmp", "image/tiff"}
+
+
+def upload_encoding() -> Optional[str]:
+    """The Content-Encoding new uploads are compressed with, or None (off)."""
+    if UPLOAD_COMPRESSION == "off":
+        return None
+    if UPLOAD_COMPRESSION == "zstd" and zstandard is not None:
+        return "zstd"
+    return "gzip"
+
+
+def worth_trying(mime_type: Optional[str]) -> bool:
+    mime = (mime_type or "").split(";")[0].strip().lower()
+    if mime in COMPRESSIBLE_EXCEPTIONS:
+        return True
+    return mime not in INCOMPRESSIBLE_TYPES and not mime.startswith(INCOMPRESSIBLE_PREFIXES)
+
+
+def _compressor(encoding: str):
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=3).compressobj()
+    return zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # gzip framing
+
+
+def _decompressor(encoding: str):
+    if encoding == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstd-compressed object, but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompressobj()
+    if encoding == "gzip":
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    raise ValueError(f"Unknown content encoding: {encoding}")
+
+
+def _saving(sample: bytes, encoding: str) -> float:
+    c = _compressor(encoding)
+    return 1 - len(c.compress(sample) + c.flush()) / len(sample)
+
+
+class Encoder:
+    """
+    One upload attempt: `encode` passes the chunks through, compressed if
+    the first chunk says it is worth it. Afterwards `encoding` is the
+    Content-Encoding used (None = stored as-is) and `logical_size` /
+    `stored_size` the bytes read and the bytes produced.
+    """
+
+    def __init__(self, mime_type: Optional[str]):
+        self.mime_type = mime_type
+        self.encoding: Optional[str] = None
+        self.logical_size = 0
+        self.stored_size = 0
+
+    def _choose(self, first: bytes) -> Optional[str]:
+        encoding = upload_encoding()
+        if encoding is None or not worth_trying(self.mime_type):
+            return None
+        if len(first) < UPLOAD_COMPRESSION_MIN_BYTES:
+            return None
+        sample = first[:UPLOAD_COMPRESSION_SAMPLE_BYTES]
+        return encoding if _saving(sample, encoding) >= UPLOAD_COMPRESSION_MIN_SAVING else None
+
+    def encode(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        compressor = None
+        for chunk in chunks:
+            if not self.logical_size and chunk:
+                self.encoding = self._choose(chunk)
+                if self.encoding:
+                    compressor = _compressor(self.encoding)
+            self.logical_size += len(chunk)
+            out = compressor.compress(chunk) if compressor else chunk
+            if out:
+                self.stored_size += len(out)
+                yield out
+        if compressor:
+            out = compressor.flush()
+            self.stored_size += len(out)
+            yield out
+
+
+def decode(chunks: Iterable[bytes], encoding: Optional[str]) -> Iterator[bytes]:
+    """The logical content of a stored object's chunks."""
+    if not encoding:
+        yield from chunks
+        return
+    d = _decompressor(encoding)
+    for chunk in chunks:
+        out = d.decompress(chunk)
+        if out:
+            yield out
+    if encoding == "gzip":
+        out = d.flush()
+        if out:
+            yield out
+
+
+def accepts_encoding(header: Optional[str], encoding: str) -> bool:
+    """Whether an Accept-Encoding header allows `encoding` (q > 0)."""
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        if name.strip().lower() not in (encoding, "*"):
+            continue
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                return float(q[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
@@ -0,0 +1,89 @@
+"""
+Conditional GETs for per-user listings.
+
+Every change a user's listings can show bumps one of two versions on
+their user_usage row, in the same transaction as the change: `version`
+for files and usage (upload, delete, preview), `history_version` for
+activity (new events, history clear, archival). Activity alone, such as a
+download, therefore leaves the files and usage ETags valid. A listing's
+ETag is its version plus the request's path and query, so revalidating
+costs one primary-key read: when If-None-Match matches, the route answers
+304 without running the listing query.
+
+The version is read before the listing, so a change racing with the request
+can only label newer data with an older ETag, which the next request then
+fails to match; it never labels stale data as current.
+"""
+
+import hashlib
+from typing import Any, Callable, Optional, Tuple
+
+from fastapi import Request, Response
+from sqlalchemy.orm import Session
+
+from app.database import DBRunner
+from app.models import UserUsage
+from app.usage import get_version
+
+NOT_MODIFIED = object()
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    tags = [t.strip() for t in header.split(",")]
+    return "*" in tags or etag in (t[2:] if t.startswith("W/") else t for t in tags)
+
+
+def listing_etag(user_id: int, version: int, url: str) -> str:
+    """
+    The user id is part of the tag so a shared cache keyed on the URL can
+    never answer one user's revalidation with another's listing.
+    """
+    query = hashlib.sha256(url.encode()).hexdigest()[:16]
+    return f'"{user_id}-{version}-{query}"'
+
+
+def _versioned(
+    db: Session,
+    user_id: int,
+    version,
+    if_none_match: Optional[str],
+    url: str,
+    fn: Callable[..., Any],
+    *args,
+) -> Tuple[str, Any]:
+    etag = listing_etag(user_id, get_version(db, user_id, version), url)
+    if etag_matches(if_none_match, etag):
+        return etag, NOT_MODIFIED
+    return etag, fn(db, *args)
+
+
+async def conditional_listing(
+    request: Request,
+    db: DBRunner,
+    user_id: int,
+    fn: Callable[..., Any],
+    *args,
+    version=UserUsage.version,
+) -> Tuple[str, Any]:
+    """
+    (etag, fn(session, *args)), or (etag, NOT_MODIFIED) without calling fn
+    when the request's If-None-Match is current. `version` is the
+    user_usage column the listing's content follows.
+    """
+    url = request.url.path + ("?" + request.url.query if request.url.query else "")
+    return await db.run(
+        _versioned, user_id, version, request.headers.get("if-none-match"), url, fn, *args
+    )
+
+
+def not_modified(etag: str) -> Response:
+    return with_etag(Response(status_code=304), etag)
+
+
+def with_etag(response: Response, etag: str) -> Response:
+    """Tag a listing; browsers must revalidate before reusing it."""
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
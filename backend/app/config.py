@@ -4,6 +4,11 @@ ALL keys, URLs, and environment configuration in ONE place.
 
 import os
 
+from dotenv import load_dotenv
+
+# Load backend/.env before anything reads the environment (app or CLI tools).
+load_dotenv()
+
 # ---------------------------------------------------------------------------
 # Database (Supabase PostgreSQL)
 # ---------------------------------------------------------------------------
@@ -12,6 +17,29 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise RuntimeError("DATABASE_URL is not set. Check backend/.env")
 
+# Connection pool. DB_POOL_TIMEOUT_SECONDS is the longest a request waits for
+# a free connection; connections older than DB_POOL_RECYCLE_SECONDS are
+# replaced (-1 = never).
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", 30))
+DB_POOL_RECYCLE_SECONDS = int(os.getenv("DB_POOL_RECYCLE_SECONDS", 1800))
+# SQLAlchemy's compiled-statement cache (per engine).
+DB_QUERY_CACHE_SIZE = int(os.getenv("DB_QUERY_CACHE_SIZE", 500))
+
+# DB_ASYNC=true serves the hot read paths (file list, storage, history, auth
+# lookup) from an async engine (asyncpg / aiosqlite) instead of the
+# threadpool. DB_STATEMENT_CACHE_SIZE is asyncpg's per-connection prepared
+# statement cache; set it to 0 behind PgBouncer in transaction mode.
+DB_ASYNC = os.getenv("DB_ASYNC", "false").lower() == "true"
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", 100))
+
+# The schema is created and upgraded by `python -m app.migrate`, run once per
+# deploy (Render: the pre-deploy command; see Readme). /readyz answers 503
+# until it has run. DB_AUTO_MIGRATE=true runs it at startup instead
+# (local/offline use).
+DB_AUTO_MIGRATE = os.getenv("DB_AUTO_MIGRATE", "false").lower() == "true"
+
 # ---------------------------------------------------------------------------
 # JWT Authentication
 # ---------------------------------------------------------------------------
@@ -20,6 +48,34 @@ JWT_SECRET = os.getenv("JWT_SECRET", "change-this-in-production")
 JWT_ALGORITHM = "HS256"
 JWT_EXPIRE_MINUTES = 60 * 24
 
+# Password hashing (bcrypt) runs on its own process pool. BCRYPT_ROUNDS is
+# the cost factor; stored hashes with a different cost are rehashed on login.
+# Once BCRYPT_MAX_PENDING hashes are queued, login/register answer 503.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+BCRYPT_WORKERS = int(os.getenv("BCRYPT_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+BCRYPT_MAX_PENDING = int(os.getenv("BCRYPT_MAX_PENDING", BCRYPT_WORKERS * 8))
+
+# Decoded tokens and user principals are cached per process so authenticated
+# requests skip the users lookup. Changes to a user invalidate its entry.
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", 10000))
+AUTH_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", 60))
+
+# Activity events are queued and written in bulk by a background task, every
+# ACTIVITY_FLUSH_INTERVAL_SECONDS or as soon as ACTIVITY_BATCH_SIZE are queued.
+# At most ACTIVITY_MAX_PENDING are queued (the oldest are dropped past that),
+# and a batch that fails ACTIVITY_FLUSH_ATTEMPTS writes in a row is dropped.
+ACTIVITY_BATCH_SIZE = int(os.getenv("ACTIVITY_BATCH_SIZE", 500))
+ACTIVITY_FLUSH_INTERVAL_SECONDS = float(os.getenv("ACTIVITY_FLUSH_INTERVAL_SECONDS", 1.0))
+ACTIVITY_MAX_PENDING = int(os.getenv("ACTIVITY_MAX_PENDING", 10000))
+ACTIVITY_FLUSH_ATTEMPTS = int(os.getenv("ACTIVITY_FLUSH_ATTEMPTS", 3))
+
+# Raw activity is kept ACTIVITY_RETENTION_DAYS, then compacted into per-user
+# daily counts by a job running every ACTIVITY_ARCHIVE_INTERVAL_SECONDS.
+# Admin "recent activities" counts the last ACTIVITY_RECENT_DAYS.
+ACTIVITY_RETENTION_DAYS = int(os.getenv("ACTIVITY_RETENTION_DAYS", 90))
+ACTIVITY_ARCHIVE_INTERVAL_SECONDS = int(os.getenv("ACTIVITY_ARCHIVE_INTERVAL_SECONDS", 3600))
+ACTIVITY_RECENT_DAYS = int(os.getenv("ACTIVITY_RECENT_DAYS", 7))
+
 # ---------------------------------------------------------------------------
 # Supabase Storage
 # ---------------------------------------------------------------------------
@@ -28,21 +84,173 @@ SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
 SUPABASE_BUCKET = os.getenv("SUPABASE_BUCKET", "cloud-files")
 
-if not SUPABASE_URL or not SUPABASE_SERVICE_KEY:
+# "supabase" (default) or "local" (files kept under LOCAL_STORAGE_DIR, for
+# offline development and testing).
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "supabase").lower()
+LOCAL_STORAGE_DIR = os.getenv("LOCAL_STORAGE_DIR", "./storage")
+
+if STORAGE_BACKEND == "supabase" and (not SUPABASE_URL or not SUPABASE_SERVICE_KEY):
     raise RuntimeError("Supabase credentials missing in .env")
 
+# Storage calls from async routes run on their own thread pool (one pooled
+# keep-alive connection per worker), with a timeout and retries per call.
+STORAGE_MAX_WORKERS = int(os.getenv("STORAGE_MAX_WORKERS", 16))
+STORAGE_TIMEOUT_SECONDS = float(os.getenv("STORAGE_TIMEOUT_SECONDS", 20))
+STORAGE_UPLOAD_TIMEOUT_SECONDS = float(os.getenv("STORAGE_UPLOAD_TIMEOUT_SECONDS", 300))
+STORAGE_RETRIES = int(os.getenv("STORAGE_RETRIES", 2))
+STORAGE_RETRY_BACKOFF_SECONDS = float(os.getenv("STORAGE_RETRY_BACKOFF_SECONDS", 0.25))
+
+# Download links: how long a signed URL is valid, and how much validity a
+# cached URL must have left to be handed out again.
+SIGNED_URL_EXPIRES_SECONDS = int(os.getenv("SIGNED_URL_EXPIRES_SECONDS", 300))
+SIGNED_URL_MIN_REMAINING_SECONDS = int(os.getenv("SIGNED_URL_MIN_REMAINING_SECONDS", 60))
+SIGNED_URL_CACHE_SIZE = int(os.getenv("SIGNED_URL_CACHE_SIZE", 10000))
+SIGNED_URL_BATCH_LIMIT = int(os.getenv("SIGNED_URL_BATCH_LIMIT", 200))
+
+# DOWNLOAD_MODE "signed" (default) hands out storage signed URLs; "proxy"
+# hands out /api/files/{id}/content links (Range/ETag support, valid
+# DOWNLOAD_TOKEN_EXPIRES_SECONDS) served through a local disk cache of at
+# most DOWNLOAD_CACHE_MAX_BYTES. Objects larger than
+# DOWNLOAD_CACHE_MAX_OBJECT_BYTES are streamed through without caching.
+DOWNLOAD_MODE = os.getenv("DOWNLOAD_MODE", "signed").lower()
+DOWNLOAD_TOKEN_EXPIRES_SECONDS = int(os.getenv("DOWNLOAD_TOKEN_EXPIRES_SECONDS", 3600))
+DOWNLOAD_CACHE_DIR = os.getenv("DOWNLOAD_CACHE_DIR", "./download-cache")
+DOWNLOAD_CACHE_MAX_BYTES = int(os.getenv("DOWNLOAD_CACHE_MAX_BYTES", 1024 ** 3))
+DOWNLOAD_CACHE_MAX_OBJECT_BYTES = int(
+    os.getenv("DOWNLOAD_CACHE_MAX_OBJECT_BYTES", DOWNLOAD_CACHE_MAX_BYTES // 4)
+)
+
+# Bulk endpoints accept up to BULK_OPERATION_LIMIT file ids per request;
+# storage objects are removed STORAGE_REMOVE_BATCH_SIZE paths per call.
+BULK_OPERATION_LIMIT = int(os.getenv("BULK_OPERATION_LIMIT", 1000))
+STORAGE_REMOVE_BATCH_SIZE = int(os.getenv("STORAGE_REMOVE_BATCH_SIZE", 500))
+
+# ZIP export: objects fetched ARCHIVE_CONCURRENCY at a time, each buffering
+# at most ARCHIVE_READAHEAD_CHUNKS chunks of ARCHIVE_CHUNK_SIZE bytes.
+# ARCHIVE_COMPRESSION is "stored" (no CPU cost) or "deflated".
+ARCHIVE_CONCURRENCY = int(os.getenv("ARCHIVE_CONCURRENCY", 4))
+ARCHIVE_READAHEAD_CHUNKS = int(os.getenv("ARCHIVE_READAHEAD_CHUNKS", 4))
+ARCHIVE_CHUNK_SIZE = int(os.getenv("ARCHIVE_CHUNK_SIZE", 1024 * 1024))
+ARCHIVE_COMPRESSION = os.getenv("ARCHIVE_COMPRESSION", "stored").lower()
+
+# Previews (thumbnails, text snippets) are made after upload by
+# PREVIEW_WORKERS threads fed from a queue of at most PREVIEW_QUEUE_SIZE
+# files. Files that did not fit are picked up by a sweep every
+# PREVIEW_SWEEP_SECONDS. Sources above PREVIEW_MAX_SOURCE_BYTES are skipped.
+PREVIEW_WORKERS = int(os.getenv("PREVIEW_WORKERS", max(1, (os.cpu_count() or 2) // 4)))
+PREVIEW_QUEUE_SIZE = int(os.getenv("PREVIEW_QUEUE_SIZE", 100))
+PREVIEW_SWEEP_SECONDS = int(os.getenv("PREVIEW_SWEEP_SECONDS", 60))
+PREVIEW_MAX_SOURCE_BYTES = int(os.getenv("PREVIEW_MAX_SOURCE_BYTES", 20 * 1024 * 1024))
+PREVIEW_IMAGE_SIZE = int(os.getenv("PREVIEW_IMAGE_SIZE", 256))
+PREVIEW_TEXT_LINES = int(os.getenv("PREVIEW_TEXT_LINES", 20))
+
 # ---------------------------------------------------------------------------
 # File rules
 # ---------------------------------------------------------------------------
 
 MAX_FILE_SIZE_BYTES = int(os.getenv("MAX_FILE_SIZE_BYTES", 50 * 1024 * 1024))
 
+# Default per-user storage quota (logical bytes); can be overridden per user
+# in user_usage.quota_bytes.
+STORAGE_QUOTA_BYTES = int(os.getenv("STORAGE_QUOTA_BYTES", 5 * 1024 * 1024 * 1024))
+
+# Uploads are read and forwarded to storage in chunks of this size, so memory
+# per upload stays bounded regardless of file size.
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 1024 * 1024))
+
+# Uploads are compressed on their way to storage (see app.compression) with
+# UPLOAD_COMPRESSION: "zstd" (needs the zstandard package; gzip without it),
+# "gzip" or "off". Only when the type is not compressed already, the file is
+# at least UPLOAD_COMPRESSION_MIN_BYTES and a sample of its first
+# UPLOAD_COMPRESSION_SAMPLE_BYTES shrinks by UPLOAD_COMPRESSION_MIN_SAVING.
+UPLOAD_COMPRESSION = os.getenv("UPLOAD_COMPRESSION", "zstd").lower()
+UPLOAD_COMPRESSION_MIN_BYTES = int(os.getenv("UPLOAD_COMPRESSION_MIN_BYTES", 4096))
+UPLOAD_COMPRESSION_SAMPLE_BYTES = int(os.getenv("UPLOAD_COMPRESSION_SAMPLE_BYTES", 64 * 1024))
+UPLOAD_COMPRESSION_MIN_SAVING = float(os.getenv("UPLOAD_COMPRESSION_MIN_SAVING", 0.1))
+
+# Multipart upload sessions: part size handed to clients, how long an idle
+# session is kept before its parts are deleted, and how often to sweep.
+UPLOAD_PART_SIZE = int(os.getenv("UPLOAD_PART_SIZE", 8 * 1024 * 1024))
+UPLOAD_SESSION_TTL_SECONDS = int(os.getenv("UPLOAD_SESSION_TTL_SECONDS", 24 * 60 * 60))
+UPLOAD_SESSION_SWEEP_SECONDS = int(os.getenv("UPLOAD_SESSION_SWEEP_SECONDS", 15 * 60))
+
+# Direct uploads (see app.direct_uploads): the client PUTs the bytes to a
+# signed storage URL and the API only records the result. A reservation can
+# be finalized for DIRECT_UPLOAD_TTL_SECONDS. Unfinalized ones, and any
+# object uploaded for them, are purged DIRECT_UPLOAD_PURGE_DELAY_SECONDS
+# after that (swept with the upload sessions): Supabase keeps signed upload
+# URLs valid for two hours whatever we ask for.
+DIRECT_UPLOADS_ENABLED = os.getenv("DIRECT_UPLOADS_ENABLED", "true").lower() == "true"
+DIRECT_UPLOAD_TTL_SECONDS = int(os.getenv("DIRECT_UPLOAD_TTL_SECONDS", 15 * 60))
+DIRECT_UPLOAD_PURGE_DELAY_SECONDS = int(os.getenv("DIRECT_UPLOAD_PURGE_DELAY_SECONDS", 2 * 60 * 60))
+
 _raw_ext = os.getenv("ALLOWED_EXTENSIONS", "")
 ALLOWED_EXTENSIONS = (
     [e.strip().lower() for e in _raw_ext.split(",") if e.strip()]
     or None
 )
 
+# ---------------------------------------------------------------------------
+# Admission control / rate limits
+# ---------------------------------------------------------------------------
+
+# Token buckets per user and route class: each allows PER_MINUTE requests a
+# minute on average and bursts of up to BURST. Login/register have no user
+# yet and are limited per client address. Over the limit, the API answers
+# 429 with Retry-After before reading the body or taking a DB connection.
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_AUTH_PER_MINUTE = float(os.getenv("RATE_LIMIT_AUTH_PER_MINUTE", 20))
+RATE_LIMIT_AUTH_BURST = int(os.getenv("RATE_LIMIT_AUTH_BURST", 10))
+RATE_LIMIT_UPLOAD_PER_MINUTE = float(os.getenv("RATE_LIMIT_UPLOAD_PER_MINUTE", 120))
+RATE_LIMIT_UPLOAD_BURST = int(os.getenv("RATE_LIMIT_UPLOAD_BURST", 30))
+RATE_LIMIT_DOWNLOAD_LINK_PER_MINUTE = float(os.getenv("RATE_LIMIT_DOWNLOAD_LINK_PER_MINUTE", 600))
+RATE_LIMIT_DOWNLOAD_LINK_BURST = int(os.getenv("RATE_LIMIT_DOWNLOAD_LINK_BURST", 100))
+RATE_LIMIT_LISTING_PER_MINUTE = float(os.getenv("RATE_LIMIT_LISTING_PER_MINUTE", 600))
+RATE_LIMIT_LISTING_BURST = int(os.getenv("RATE_LIMIT_LISTING_BURST", 120))
+# Client addresses come from X-Forwarded-For when the peer is one of
+# TRUSTED_PROXIES (addresses or networks): behind nginx (docker-compose) or
+# Render's load balancer every request arrives from the proxy, which would
+# otherwise put all clients in one bucket. The default trusts loopback and
+# private networks; set it to "" if the API is reachable directly from a
+# private network whose hosts should not choose their own address.
+TRUSTED_PROXIES = [
+    p.strip()
+    for p in os.getenv(
+        "TRUSTED_PROXIES", "127.0.0.0/8,::1,10.0.0.0/8,172.16.0.0/12,192.168.0.0/16"
+    ).split(",")
+    if p.strip()
+]
+# Buckets kept in memory; the least recently used (i.e. refilled) go first.
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", 100000))
+
+# Uploads (single-request uploads and multipart parts/commits) a user may
+# run at once, and the request bytes (Content-Length) they may have in
+# flight, per user and in the whole process.
+UPLOADS_MAX_CONCURRENT_PER_USER = int(os.getenv("UPLOADS_MAX_CONCURRENT_PER_USER", 3))
+UPLOAD_BYTES_IN_FLIGHT_PER_USER = int(
+    os.getenv("UPLOAD_BYTES_IN_FLIGHT_PER_USER", 2 * MAX_FILE_SIZE_BYTES + 1024 * 1024)
+)
+UPLOAD_BYTES_IN_FLIGHT_MAX = int(
+    os.getenv("UPLOAD_BYTES_IN_FLIGHT_MAX", 8 * MAX_FILE_SIZE_BYTES)
+)
+
+# ---------------------------------------------------------------------------
+# Metrics / profiling
+# ---------------------------------------------------------------------------
+
+# GET /metrics (Prometheus text format) takes "Bearer METRICS_TOKEN" from
+# scrapers, or an admin's session token; it is never public.
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+# A fraction PROFILE_SAMPLE_RATE of requests runs under cProfile; profiles of
+# those slower than PROFILE_SLOW_MS are kept (the last PROFILE_KEEP) for
+# /api/admin/profiles. PROFILE_HEADER_ENABLED=true also profiles any request
+# sent with "X-Profile: 1" (staging only: anyone can trigger it).
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", 500))
+PROFILE_HEADER_ENABLED = os.getenv("PROFILE_HEADER_ENABLED", "false").lower() == "true"
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", 50))
+
 # ---------------------------------------------------------------------------
 # App / CORS
 # ---------------------------------------------------------------------------
@@ -54,5 +262,5 @@ CORS_ORIGINS = os.getenv(
     "http://localhost:5173,http://localhost:3000"
 ).split(",")
 
-print("SUPABASE_URL:", bool(SUPABASE_URL))
-print("SUPABASE_SERVICE_KEY:", bool(SUPABASE_SERVICE_KEY))
+# /readyz gives the database and storage this long to answer.
+READY_TIMEOUT_SECONDS = float(os.getenv("READY_TIMEOUT_SECONDS", 2))
@@ -1,13 +1,35 @@
 """
 Database connection and session management.
 Supabase PostgreSQL compatible.
+
+Routes either take a sync Session (get_db) or a DBRunner (get_runner). A
+DBRunner runs ordinary blocking ORM code: on the threadpool by default, or,
+with DB_ASYNC=true, through AsyncSession.run_sync on an async engine so the
+connection I/O happens on the event loop.
 """
 
+import threading
+import time
+from typing import Callable, TypeVar
+
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy import create_engine
 from sqlalchemy.engine.url import make_url
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import QueuePool
+
+from app.config import (
+    DATABASE_URL,
+    DB_POOL_SIZE,
+    DB_MAX_OVERFLOW,
+    DB_POOL_TIMEOUT_SECONDS,
+    DB_POOL_RECYCLE_SECONDS,
+    DB_QUERY_CACHE_SIZE,
+    DB_ASYNC,
+    DB_STATEMENT_CACHE_SIZE,
+)
 
-from app.config import DATABASE_URL
+T = TypeVar("T")
 
 
 def _ensure_sslmode_require(url: str) -> str:
@@ -28,17 +50,83 @@ def _ensure_sslmode_require(url: str) -> str:
   return str(url_obj)
 
 
-engine = create_engine(
-    DATABASE_URL,
-    pool_pre_ping=True,
-    pool_size=5,
-    max_overflow=10,
-    connect_args={
-        "connect_timeout": 10
-    }
+# ---------------- POOL METRICS ----------------
+
+class PoolWaitStats:
+    """How long requests waited to check a connection out of the pool."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.total_seconds += seconds
+            self.max_seconds = max(self.max_seconds, seconds)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "wait_avg_ms": round(1000 * self.total_seconds / self.checkouts, 3)
+                if self.checkouts else 0.0,
+                "wait_max_ms": round(1000 * self.max_seconds, 3),
+                "wait_total_seconds": round(self.total_seconds, 3),
+            }
+
+
+pool_wait = PoolWaitStats()
+
+
+def _timed(pool_class):
+    """Subclass of `pool_class` that records checkout wait in pool_wait."""
+
+    class TimedPool(pool_class):
+        def connect(self):
+            start = time.perf_counter()
+            try:
+                return super().connect()
+            finally:
+                pool_wait.observe(time.perf_counter() - start)
+
+    TimedPool.__name__ = f"Timed{pool_class.__name__}"
+    return TimedPool
+
+
+_pool_args = dict(
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT_SECONDS,
+    pool_recycle=DB_POOL_RECYCLE_SECONDS,
+    query_cache_size=DB_QUERY_CACHE_SIZE,
 )
 
 
+# ---------------- SYNC ENGINE ----------------
+
+if DATABASE_URL.startswith("sqlite"):
+    # Local/offline runs (e.g. with STORAGE_BACKEND=local).
+    engine = create_engine(
+        DATABASE_URL,
+        poolclass=_timed(QueuePool),
+        connect_args={"check_same_thread": False},
+        **_pool_args,
+    )
+else:
+    engine = create_engine(
+        DATABASE_URL,
+        pool_pre_ping=True,
+        poolclass=_timed(QueuePool),
+        connect_args={
+            "connect_timeout": 10
+        },
+        **_pool_args,
+    )
+
+
 SessionLocal = sessionmaker(
     autocommit=False,
     autoflush=False,
@@ -54,3 +142,102 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+# ---------------- ASYNC ENGINE (optional) ----------------
+
+def _async_url(url: str):
+    """Same database through its asyncio driver, plus connect args."""
+    url_obj = make_url(url)
+    backend = url_obj.get_backend_name()
+    if backend == "sqlite":
+        return url_obj.set(drivername="sqlite+aiosqlite"), {}
+    if backend != "postgresql":
+        raise RuntimeError(f"DB_ASYNC is not supported for {backend}")
+    query = dict(url_obj.query)
+    connect_args = {"timeout": 10, "statement_cache_size": DB_STATEMENT_CACHE_SIZE}
+    # asyncpg takes ssl=<mode> rather than libpq's sslmode.
+    sslmode = query.pop("sslmode", None)
+    if sslmode:
+        connect_args["ssl"] = sslmode
+    query["prepared_statement_cache_size"] = str(DB_STATEMENT_CACHE_SIZE)
+    url_obj = url_obj.set(drivername="postgresql+asyncpg", query=query)
+    return url_obj, connect_args
+
+
+async_engine = None
+AsyncSessionLocal = None
+
+if DB_ASYNC:
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+    from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+    _url, _connect_args = _async_url(DATABASE_URL)
+    async_engine = create_async_engine(
+        _url,
+        pool_pre_ping=_url.get_backend_name() == "postgresql",
+        poolclass=_timed(AsyncAdaptedQueuePool),
+        connect_args=_connect_args,
+        **_pool_args,
+    )
+    AsyncSessionLocal = async_sessionmaker(
+        async_engine, autoflush=False, expire_on_commit=False
+    )
+
+
+class DBRunner:
+    """
+    Runs `fn(session, *args)` without blocking the event loop. `fn` is plain
+    sync ORM code and must finish with the objects it returns (e.g. convert
+    rows to dicts inside it).
+    """
+
+    def __init__(self, session):
+        self.session = session
+
+    async def run(self, fn: Callable[..., T], *args) -> T:
+        raise NotImplementedError
+
+
+class ThreadRunner(DBRunner):
+    async def run(self, fn, *args):
+        return await run_in_threadpool(fn, self.session, *args)
+
+
+class AsyncRunner(DBRunner):
+    async def run(self, fn, *args):
+        return await self.session.run_sync(fn, *args)
+
+
+async def get_runner():
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as session:
+            yield AsyncRunner(session)
+    else:
+        db = SessionLocal()
+        try:
+            yield ThreadRunner(db)
+        finally:
+            await run_in_threadpool(db.close)
+
+
+def _occupancy(pool) -> dict:
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+    }
+
+
+def pool_stats() -> dict:
+    """Pool occupancy per engine, plus checkout waits across both."""
+    stats = {"sync": _occupancy(engine.pool), **pool_wait.stats()}
+    if async_engine is not None:
+        stats["async"] = _occupancy(async_engine.sync_engine.pool)
+    return stats
+
+
+async def dispose_engines() -> None:
+    if async_engine is not None:
+        await async_engine.dispose()
+    engine.dispose()
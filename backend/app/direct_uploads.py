@@ -0,0 +1,233 @@
+"""
+Direct-to-storage uploads: the bytes skip the API.
+
+    POST   /api/files/direct/                  reserve; returns a signed upload URL
+    PUT    <upload_url>                        the client sends the bytes to storage
+    POST   /api/files/direct/{id}/finalize     check the object, record the File
+    DELETE /api/files/direct/{id}              give up
+
+Reserving checks the size limit and quota and picks the object path; the
+signed URL only allows creating that one object. Finalizing checks that the
+object exists with exactly the announced size, then records the File and
+"upload" activity like any other upload (charging the quota atomically).
+Storage sees the bytes, not the API, so direct uploads are neither hashed
+(no deduplication) nor compressed: they are meant for large files, where
+keeping the bytes off the API matters more. The web client sends smaller
+files through POST /api/files/upload.
+
+With local storage, signed URLs point at PUT /api/storage/local/{path}
+below, which stands in for Supabase's signed upload endpoint.
+"""
+
+import tempfile
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel
+from sqlalchemy.orm import Session
+
+from app.database import get_db, SessionLocal
+from app.models import DirectUpload
+from app.auth import Principal, get_current_user
+from app.usage import check_quota
+from app.config import (
+    MAX_FILE_SIZE_BYTES,
+    UPLOAD_CHUNK_SIZE,
+    DIRECT_UPLOADS_ENABLED,
+    DIRECT_UPLOAD_TTL_SECONDS,
+    DIRECT_UPLOAD_PURGE_DELAY_SECONDS,
+)
+from app.files import storage, record_upload, file_to_dict
+from app.metrics import track_upload
+from app.storage import StorageError
+
+router = APIRouter(prefix="/api/files/direct", tags=["uploads"])
+local_router = APIRouter(prefix="/api/storage/local", tags=["uploads"])
+
+
+# ---------------- Schemas ----------------
+
+class ReserveBody(BaseModel):
+    filename: str
+    size_bytes: int
+    mime_type: Optional[str] = None
+
+
+# ---------------- Helpers ----------------
+
+def _get_reservation(db: Session, upload_id: str, user: Principal) -> DirectUpload:
+    r = (
+        db.query(DirectUpload)
+        .filter(DirectUpload.id == upload_id, DirectUpload.user_id == user.id)
+        .first()
+    )
+    if not r:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return r
+
+
+def _discard_reservation(db: Session, r: DirectUpload) -> None:
+    """Delete the reserved object, if it was uploaded (ignore failure), and the row."""
+    try:
+        storage.remove([r.stored_filename])
+    except Exception:
+        pass
+    db.delete(r)
+    db.commit()
+
+
+def purge_expired_reservations(db: Optional[Session] = None) -> int:
+    """Remove reservations nobody finalized, and their objects. Returns how many were purged."""
+    own_session = db is None
+    db = db or SessionLocal()
+    try:
+        cutoff = datetime.utcnow() - timedelta(seconds=DIRECT_UPLOAD_PURGE_DELAY_SECONDS)
+        expired = db.query(DirectUpload).filter(DirectUpload.expires_at < cutoff).all()
+        for r in expired:
+            _discard_reservation(db, r)
+        return len(expired)
+    finally:
+        if own_session:
+            db.close()
+
+
+# ---------------- Routes ----------------
+
+@router.post("/")
+def reserve_upload(
+    body: ReserveBody,
+    db: Session = Depends(get_db),
+    user: Principal = Depends(get_current_user),
+):
+    if not DIRECT_UPLOADS_ENABLED:
+        raise HTTPException(status_code=404, detail="Direct uploads are disabled")
+    if not body.filename:
+        raise HTTPException(status_code=400, detail="No filename")
+    if body.size_bytes < 0:
+        raise HTTPException(status_code=400, detail="Invalid size")
+    if body.size_bytes > MAX_FILE_SIZE_BYTES:
+        raise HTTPException(status_code=413, detail="File too large")
+    check_quota(db, user.id, body.size_bytes)
+
+    ext = Path(body.filename).suffix
+    stored_name = f"{user.id}/{uuid.uuid4().hex}{ext}"
+    try:
+        url = storage.create_signed_upload_url(
+            stored_name, DIRECT_UPLOAD_TTL_SECONDS, body.size_bytes
+        )
+    except StorageError as e:
+        raise HTTPException(status_code=500, detail=f"Upload failed: {e}")
+
+    r = DirectUpload(
+        id=uuid.uuid4().hex,
+        user_id=user.id,
+        stored_filename=stored_name,
+        original_filename=body.filename,
+        mime_type=body.mime_type,
+        size_bytes=body.size_bytes,
+        expires_at=datetime.utcnow() + timedelta(seconds=DIRECT_UPLOAD_TTL_SECONDS),
+    )
+    db.add(r)
+    db.commit()
+    return {
+        "upload_id": r.id,
+        "upload_url": url,
+        "method": "PUT",
+        "headers": {"Content-Type": body.mime_type or "application/octet-stream"},
+        "expires_at": r.expires_at.isoformat(),
+    }
+
+
+@router.post("/{upload_id}/finalize")
+def finalize_upload(
+    upload_id: str,
+    db: Session = Depends(get_db),
+    user: Principal = Depends(get_current_user),
+):
+    r = _get_reservation(db, upload_id, user)
+    if r.expires_at < datetime.utcnow():
+        _discard_reservation(db, r)
+        raise HTTPException(status_code=410, detail="Upload reservation expired")
+    try:
+        size = storage.stat(r.stored_filename)
+    except StorageError as e:
+        raise HTTPException(status_code=500, detail=f"Finalize failed: {e}")
+    if size is None:
+        raise HTTPException(status_code=409, detail="Nothing has been uploaded yet")
+    if size != r.size_bytes:
+        _discard_reservation(db, r)
+        raise HTTPException(
+            status_code=400,
+            detail=f"Uploaded {size} bytes, expected {r.size_bytes}",
+        )
+
+    filename, stored_name, mime_type = r.original_filename, r.stored_filename, r.mime_type
+    # Claim the reservation in the File row's transaction, so a concurrent
+    # finalize cannot record the object twice.
+    claimed = db.query(DirectUpload).filter(DirectUpload.id == r.id).delete(
+        synchronize_session=False
+    )
+    if not claimed:
+        raise HTTPException(status_code=409, detail="Upload already finalized")
+    db_file = record_upload(db, user.id, filename, stored_name, size, mime_type)
+    return file_to_dict(db_file)
+
+
+@router.delete("/{upload_id}")
+def abort_upload(
+    upload_id: str,
+    db: Session = Depends(get_db),
+    user: Principal = Depends(get_current_user),
+):
+    r = _get_reservation(db, upload_id, user)
+    _discard_reservation(db, r)
+    return {"aborted": upload_id}
+
+
+# ---------------- Local storage stand-in ----------------
+
+@local_router.put("/{path:path}")
+async def local_signed_upload(
+    path: str,
+    request: Request,
+    expires: int,
+    max_bytes: int,
+    token: str,
+):
+    """
+    Signed upload endpoint for LocalStorage, with Supabase's contract: the
+    raw body is the object, the path may be written once, and the token
+    must be live. The body is spooled (to disk past UPLOAD_CHUNK_SIZE)
+    before it is stored.
+    """
+    check = getattr(storage, "check_upload_token", None)
+    if check is None:
+        raise HTTPException(status_code=404, detail="Not found")
+    if not check(path, expires, max_bytes, token):
+        raise HTTPException(status_code=403, detail="Invalid or expired upload token")
+    if await run_in_threadpool(storage.stat, path) is not None:
+        raise HTTPException(status_code=409, detail="The resource already exists")
+
+    spool = tempfile.SpooledTemporaryFile(max_size=UPLOAD_CHUNK_SIZE)
+    try:
+        received = 0
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > max_bytes:
+                raise HTTPException(status_code=413, detail="File too large")
+            await run_in_threadpool(spool.write, chunk)
+        spool.seek(0)
+        chunks = iter(lambda: spool.read(UPLOAD_CHUNK_SIZE), b"")
+        await run_in_threadpool(
+            storage.upload_stream,
+            path,
+            track_upload(chunks),
+            request.headers.get("content-type", "application/octet-stream"),
+        )
+    finally:
+        spool.close()
+    return {"Key": path}
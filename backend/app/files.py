@@ -1,11 +1,17 @@
 """
-File upload, download, storage usage calculation (Supabase Storage).
+File upload, download, storage usage calculation (Supabase Storage or local).
 """
 
+import hashlib
+import itertools
 import os
+import threading
 import uuid
+import zipfile
+from collections import Counter
 from pathlib import Path
-from typing import List, Optional
+from urllib.parse import quote
+from typing import Dict, Iterable, Iterator, List, Literal, Optional, Tuple
 
 # --------------------------------------------------
 # 🔥 CRITICAL FIX: Disable Render / Docker proxy vars
@@ -13,32 +19,153 @@ from typing import List, Optional
 for k in ("HTTP_PROXY", "HTTPS_PROXY", "http_proxy", "https_proxy"):
     os.environ.pop(k, None)
 
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File as FastAPIFile
+from fastapi import (
+    APIRouter, Depends, HTTPException, Query, Request, Response, UploadFile,
+    File as FastAPIFile,
+)
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from sqlalchemy import case
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from supabase import create_client
 
-from app.database import get_db
-from app.models import User, File as FileModel, Activity
-from app.auth import get_current_user
+from app.database import DBRunner, get_db, get_runner
+from app.models import File as FileModel, Blob, Activity
+from app.activity import activity_log
+from app.auth import (
+    Principal,
+    get_current_user,
+    get_current_user_optional,
+    create_file_token,
+    user_id_from_file_token,
+)
+from app.pagination import encode_cursor, decode_cursor, keyset_page, set_next_cursor
+from app.conditional import (
+    NOT_MODIFIED, conditional_listing, etag_matches, not_modified, with_etag,
+)
+from app.usage import get_usage, quota_for, check_quota, charge_usage, release_usage
 from app.config import (
     MAX_FILE_SIZE_BYTES,
+    UPLOAD_CHUNK_SIZE,
     SUPABASE_URL,
     SUPABASE_SERVICE_KEY,
     SUPABASE_BUCKET,
+    STORAGE_BACKEND,
+    LOCAL_STORAGE_DIR,
+    STORAGE_MAX_WORKERS,
+    STORAGE_TIMEOUT_SECONDS,
+    STORAGE_UPLOAD_TIMEOUT_SECONDS,
+    STORAGE_RETRIES,
+    STORAGE_RETRY_BACKOFF_SECONDS,
+    SIGNED_URL_EXPIRES_SECONDS,
+    SIGNED_URL_MIN_REMAINING_SECONDS,
+    SIGNED_URL_CACHE_SIZE,
+    SIGNED_URL_BATCH_LIMIT,
+    BULK_OPERATION_LIMIT,
+    STORAGE_REMOVE_BATCH_SIZE,
+    ARCHIVE_CONCURRENCY,
+    ARCHIVE_READAHEAD_CHUNKS,
+    ARCHIVE_CHUNK_SIZE,
+    ARCHIVE_COMPRESSION,
+    DOWNLOAD_MODE,
+    DOWNLOAD_TOKEN_EXPIRES_SECONDS,
+    DOWNLOAD_CACHE_DIR,
+    DOWNLOAD_CACHE_MAX_BYTES,
+    DOWNLOAD_CACHE_MAX_OBJECT_BYTES,
+    PREVIEW_WORKERS,
+    PREVIEW_QUEUE_SIZE,
+    JWT_SECRET,
+)
+from app.archive import ArchiveEntry, ZipStream
+from app.compression import Encoder, accepts_encoding, decode
+from app.previews import PreviewWorkers
+from app.responses import FastJSONResponse
+from app.storage import (
+    StorageBackend,
+    SupabaseStorage,
+    LocalStorage,
+    LazyStorage,
+    AsyncStorage,
+    SignedURLCache,
+    ObjectDiskCache,
+    MeteredStorage,
+    StorageError,
 )
+from app.metrics import observe_storage, track_upload
 
 # --------------------------------------------------
-# ✅ SUPABASE CLIENT (STABLE INIT)
+# ✅ STORAGE BACKEND (LAZY INIT)
 # --------------------------------------------------
-if not SUPABASE_URL or not SUPABASE_SERVICE_KEY:
-    raise RuntimeError("Supabase credentials missing")
+def connect_storage() -> StorageBackend:
+    if STORAGE_BACKEND == "local":
+        # Signed upload URLs are checked by the API's stand-in route.
+        return LocalStorage(LOCAL_STORAGE_DIR, secret=JWT_SECRET)
+    try:
+        return SupabaseStorage.connect(
+            SUPABASE_URL,
+            SUPABASE_SERVICE_KEY,
+            SUPABASE_BUCKET,
+            pool_size=STORAGE_MAX_WORKERS,
+            timeout=STORAGE_TIMEOUT_SECONDS,
+        )
+    except Exception as e:
+        print(f"CRITICAL: Failed to initialize Supabase client: {e}")
+        raise RuntimeError("Supabase client failed to initialize") from e
+
+
+# Built on first use (the first request or /readyz), not at import.
+storage: StorageBackend = LazyStorage(connect_storage)
+
+# Every backend call is timed for /metrics.
+storage = MeteredStorage(storage, observe_storage)
+
+# Async routes must use this, never `storage` directly (it blocks).
+async_storage = AsyncStorage(
+    storage,
+    max_workers=STORAGE_MAX_WORKERS,
+    timeout=STORAGE_TIMEOUT_SECONDS,
+    upload_timeout=STORAGE_UPLOAD_TIMEOUT_SECONDS,
+    retries=STORAGE_RETRIES,
+    backoff=STORAGE_RETRY_BACKOFF_SECONDS,
+)
+
+signed_urls = SignedURLCache(
+    max_entries=SIGNED_URL_CACHE_SIZE,
+    min_remaining=SIGNED_URL_MIN_REMAINING_SECONDS,
+)
+
+# Local copies of hot objects for proxied (/content) downloads; see
+# download_cache(). Only proxy mode has one, built on first use.
+_download_cache: Optional[ObjectDiskCache] = None
+_download_cache_lock = threading.Lock()
+
+# Thumbnails / text snippets, made in the background after upload.
+preview_workers = PreviewWorkers(
+    storage, workers=PREVIEW_WORKERS, queue_size=PREVIEW_QUEUE_SIZE
+)
+
+
+def download_cache(create: bool = True) -> Optional[ObjectDiskCache]:
+    """
+    The disk cache of proxied downloads, or None unless DOWNLOAD_MODE is
+    "proxy". Built (its directory created and scanned) by the first call
+    with `create`, so importing the app, or a deploy in signed mode, never
+    touches DOWNLOAD_CACHE_DIR.
+    """
+    global _download_cache
+    if DOWNLOAD_MODE != "proxy":
+        return None
+    if _download_cache is None and create:
+        with _download_cache_lock:
+            if _download_cache is None:
+                _download_cache = ObjectDiskCache(
+                    DOWNLOAD_CACHE_DIR,
+                    max_bytes=DOWNLOAD_CACHE_MAX_BYTES,
+                    max_object_bytes=DOWNLOAD_CACHE_MAX_OBJECT_BYTES,
+                )
+    return _download_cache
 
-try:
-    supabase = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
-except Exception as e:
-    print(f"CRITICAL: Failed to initialize Supabase client: {e}")
-    raise RuntimeError("Supabase client failed to initialize")
 
 # --------------------------------------------------
 
@@ -48,186 +175,921 @@ router = APIRouter(prefix="/api/files", tags=["files"])
 # ---------------- ACTIVITY LOGGER ----------------
 
 def log_activity(
-    db: Session,
     user_id: int,
     action: str,
     filename: Optional[str] = None,
     file_id: Optional[int] = None,
 ):
-    db.add(
-        Activity(
-            user_id=user_id,
-            action=action,
-            filename=filename,
-            file_id=file_id,
-        )
+    """Queue an activity event; it is written in bulk by app.activity."""
+    activity_log.log(user_id, action, filename, file_id)
+
+
+def get_owned_file(db: Session, user_id: int, file_id: int) -> Optional[FileModel]:
+    return (
+        db.query(FileModel)
+        .filter(FileModel.id == file_id, FileModel.user_id == user_id)
+        .first()
     )
-    db.commit()
+
+
+def file_to_dict(f: FileModel) -> dict:
+    """API shape of a file (an entity or a FILE_LIST_COLUMNS row); dates are left to the encoder."""
+    return {
+        "id": f.id,
+        "original_filename": f.original_filename,
+        "size_bytes": f.size_bytes,
+        "uploaded_at": f.uploaded_at,
+        "preview": (
+            {"kind": f.preview_kind, "url": f"/api/files/{f.id}/preview"}
+            if f.preview_path
+            else None
+        ),
+    }
 
 
 # ---------------- LIST FILES ----------------
 
+# What file_to_dict reads: listings fetch these as plain rows, not entities.
+FILE_LIST_COLUMNS = (
+    FileModel.id,
+    FileModel.original_filename,
+    FileModel.size_bytes,
+    FileModel.uploaded_at,
+    FileModel.preview_kind,
+    FileModel.preview_path,
+)
+
+FILE_SORT_COLUMNS = {
+    "uploaded_at": FileModel.uploaded_at,
+    "name": FileModel.original_filename,
+    "size": FileModel.size_bytes,
+}
+
+
+def files_page(
+    db: Session, user_id: int, sort: str, order: str, limit: int, cursor: Optional[str]
+) -> Tuple[List[dict], Optional[str]]:
+    """One page of a user's files as dicts, plus the next page's cursor."""
+    column = FILE_SORT_COLUMNS[sort]
+    files, has_more = keyset_page(
+        db.query(*FILE_LIST_COLUMNS).filter(FileModel.user_id == user_id),
+        column,
+        FileModel.id,
+        order,
+        limit,
+        after=decode_cursor(cursor, sort, order) if cursor else None,
+    )
+
+    next_cursor = None
+    if has_more:
+        last = files[-1]
+        next_cursor = encode_cursor(sort, order, getattr(last, column.key), last.id)
+    return [file_to_dict(f) for f in files], next_cursor
+
+
 @router.get("/")
-def list_files(
-    db: Session = Depends(get_db),
-    user: User = Depends(get_current_user),
-) -> List[dict]:
-    files = (
-        db.query(FileModel)
-        .filter(FileModel.user_id == user.id)
-        .order_by(FileModel.uploaded_at.desc())
-        .all()
+async def list_files(
+    request: Request,
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = None,
+    sort: Literal["uploaded_at", "name", "size"] = "uploaded_at",
+    order: Literal["asc", "desc"] = "desc",
+    db: DBRunner = Depends(get_runner),
+    user: Principal = Depends(get_current_user),
+) -> Response:
+    """
+    One page of the user's files; the next page's cursor is in X-Next-Cursor.
+    Answers 304 to a current If-None-Match (see app.conditional).
+    """
+    etag, page = await conditional_listing(
+        request, db, user.id, files_page, user.id, sort, order, limit, cursor
+    )
+    if page is NOT_MODIFIED:
+        return not_modified(etag)
+    files, next_cursor = page
+    response = FastJSONResponse(files)
+    set_next_cursor(response, next_cursor)
+    return with_etag(response, etag)
+
+
+# ---------------- BLOBS (DEDUP) ----------------
+
+def hash_chunks(chunks: Iterable[bytes], digest) -> Iterator[bytes]:
+    """Pass chunks through unchanged, feeding each one to `digest`."""
+    for chunk in chunks:
+        digest.update(chunk)
+        yield chunk
+
+
+def acquire_blob(
+    db: Session,
+    sha256: str,
+    stored_name: str,
+    size: int,
+    content_encoding: Optional[str] = None,
+    stored_size: Optional[int] = None,
+) -> Tuple[str, Optional[str], Optional[int]]:
+    """
+    Take a reference on the blob holding this content (not committed).
+    A new blob adopts the just-uploaded `stored_name`; for existing content
+    the blob's own object is used and `stored_name` is a duplicate.
+    Returns the blob's (object path, content encoding, stored size).
+    """
+    hit = reference_blob(db, sha256)
+    if hit:
+        return hit
+
+    try:
+        # A savepoint, so losing the race below undoes the insert only, not
+        # what the caller has pending (such as an upload session's claim).
+        with db.begin_nested():
+            db.add(Blob(
+                sha256=sha256,
+                stored_filename=stored_name,
+                size_bytes=size,
+                content_encoding=content_encoding,
+                stored_size_bytes=stored_size,
+                ref_count=1,
+            ))
+    except IntegrityError:
+        # Another upload stored the same content first; reference theirs.
+        return acquire_blob(db, sha256, stored_name, size, content_encoding, stored_size)
+    return stored_name, content_encoding, stored_size
+
+
+def reference_blob(
+    db: Session, sha256: str
+) -> Optional[Tuple[str, Optional[str], Optional[int]]]:
+    """
+    Take a reference on existing content (not committed): the blob's
+    (object path, content encoding, stored size), or None if no blob holds
+    it. The increment locks the row, so a concurrent release cannot delete
+    the blob from under it.
+    """
+    hit = (
+        db.query(Blob)
+        .filter(Blob.sha256 == sha256, Blob.ref_count > 0)
+        .update({Blob.ref_count: Blob.ref_count + 1}, synchronize_session=False)
     )
+    if not hit:
+        return None
+    return tuple(
+        db.query(Blob.stored_filename, Blob.content_encoding, Blob.stored_size_bytes)
+        .filter(Blob.sha256 == sha256)
+        .one()
+    )
+
 
-    return [
-        {
-            "id": f.id,
-            "original_filename": f.original_filename,
-            "size_bytes": f.size_bytes,
-            "uploaded_at": f.uploaded_at.isoformat(),
-        }
-        for f in files
-    ]
+def release_blobs(db: Session, refs: Dict[str, int]) -> List[str]:
+    """
+    Drop refs[sha256] references from each blob in one UPDATE (not
+    committed). Returns the object paths whose last reference is gone.
+    """
+    if not refs:
+        return []
+    db.query(Blob).filter(Blob.sha256.in_(refs)).update(
+        {Blob.ref_count: Blob.ref_count - case(refs, value=Blob.sha256)},
+        synchronize_session=False,
+    )
+    orphans = (
+        db.query(Blob)
+        .filter(Blob.sha256.in_(refs), Blob.ref_count <= 0)
+        .all()
+    )
+    for blob in orphans:
+        db.delete(blob)
+    return [blob.stored_filename for blob in orphans]
 
 
 # ---------------- UPLOAD ----------------
 
+def record_upload(
+    db: Session,
+    user_id: int,
+    filename: str,
+    stored_name: str,
+    size: int,
+    mime_type: Optional[str],
+    sha256: Optional[str] = None,
+    content_encoding: Optional[str] = None,
+    stored_size: Optional[int] = None,
+) -> FileModel:
+    """
+    Create the File row and "upload" activity for an object already in
+    storage, charging the user's usage counters in the same transaction.
+    `size` is the logical size; a compressed object also gives its
+    `content_encoding` and `stored_size`. With a content hash, the File
+    points at the shared blob and a duplicate object is removed again.
+    Over quota, the object is removed and 413 raised.
+    """
+    object_path = stored_name
+    if not content_encoding:
+        stored_size = None
+    if sha256:
+        object_path, content_encoding, stored_size = acquire_blob(
+            db, sha256, stored_name, size, content_encoding, stored_size
+        )
+
+    db_file = _add_file(
+        db, user_id, filename, object_path, size, mime_type,
+        sha256, content_encoding, stored_size, uploaded=stored_name,
+    )
+    if object_path != stored_name:
+        try:
+            storage.remove([stored_name])
+        except Exception:
+            pass
+    return db_file
+
+
+def record_duplicate(
+    db: Session,
+    user_id: int,
+    filename: str,
+    size: int,
+    mime_type: Optional[str],
+    sha256: str,
+) -> Optional[FileModel]:
+    """
+    Like record_upload, for content hashed before it was sent anywhere: if
+    a blob already holds it, the File references that blob and nothing is
+    stored. Returns None when there is no such blob (upload it instead).
+    """
+    hit = reference_blob(db, sha256)
+    if hit is None:
+        db.rollback()
+        return None
+    object_path, content_encoding, stored_size = hit
+    return _add_file(
+        db, user_id, filename, object_path, size, mime_type,
+        sha256, content_encoding, stored_size, uploaded=None,
+    )
+
+
+def _add_file(
+    db: Session,
+    user_id: int,
+    filename: str,
+    object_path: str,
+    size: int,
+    mime_type: Optional[str],
+    sha256: Optional[str],
+    content_encoding: Optional[str],
+    stored_size: Optional[int],
+    uploaded: Optional[str],
+) -> FileModel:
+    """
+    Charge usage, add the File row and commit, then log the upload and
+    queue its preview. Over quota, the object this request `uploaded` (if
+    any) is removed and 413 raised.
+    """
+    if not charge_usage(db, user_id, size):
+        db.rollback()
+        if uploaded:
+            try:
+                storage.remove([uploaded])
+            except Exception:
+                pass
+        raise HTTPException(status_code=413, detail="Storage quota exceeded")
+
+    db_file = FileModel(
+        user_id=user_id,
+        original_filename=filename,
+        stored_filename=object_path,
+        size_bytes=size,
+        mime_type=mime_type,
+        blob_sha256=sha256,
+        content_encoding=content_encoding,
+        stored_size_bytes=stored_size,
+    )
+
+    db.add(db_file)
+    db.commit()
+    db.refresh(db_file)
+
+    log_activity(user_id, "upload", filename, db_file.id)
+    preview_workers.submit(db_file.id)
+    return db_file
+
+
+def iter_upload_chunks(
+    file: UploadFile, limit: int = MAX_FILE_SIZE_BYTES
+) -> Iterator[bytes]:
+    """
+    Yield the upload in UPLOAD_CHUNK_SIZE pieces, failing with 413 as soon as
+    more than `limit` bytes have been read. Starts from the beginning of the
+    file each time, so a failed storage attempt can be retried.
+    """
+    return track_upload(_read_upload(file, limit))
+
+
+def _read_upload(file: UploadFile, limit: int) -> Iterator[bytes]:
+    file.file.seek(0)
+    read = 0
+    while True:
+        chunk = file.file.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            return
+        read += len(chunk)
+        if read > limit:
+            raise HTTPException(status_code=413, detail="File too large")
+        yield chunk
+
+
+def hash_upload(file: UploadFile) -> Tuple[str, int]:
+    """(sha256, size) of a spooled upload; 413 past MAX_FILE_SIZE_BYTES."""
+    digest, size = hashlib.sha256(), 0
+    for chunk in _read_upload(file, MAX_FILE_SIZE_BYTES):
+        digest.update(chunk)
+        size += len(chunk)
+    return digest.hexdigest(), size
+
+
 @router.post("/upload")
 async def upload_file(
     file: UploadFile = FastAPIFile(...),
     db: Session = Depends(get_db),
-    user: User = Depends(get_current_user),
+    user: Principal = Depends(get_current_user),
 ):
     if not file.filename:
         raise HTTPException(status_code=400, detail="No filename")
 
-    content = await file.read()
-    size = len(content)
-
-    if size > MAX_FILE_SIZE_BYTES:
+    # Reject early when the client told us the size up front.
+    if file.size is not None and file.size > MAX_FILE_SIZE_BYTES:
         raise HTTPException(status_code=413, detail="File too large")
 
+    # Quota is checked before any bytes are sent to storage (and enforced
+    # again atomically when the File row is recorded).
+    await run_in_threadpool(check_quota, db, user.id, file.size or 0)
+
+    # The body is already spooled here: hash it first, and when the content
+    # is stored already, don't send it to storage at all.
+    sha256, size = await run_in_threadpool(hash_upload, file)
+    db_file = await run_in_threadpool(
+        record_duplicate, db, user.id, file.filename, size, file.content_type, sha256
+    )
+    if db_file is not None:
+        return file_to_dict(db_file)
+
     ext = Path(file.filename).suffix
     stored_name = f"{user.id}/{uuid.uuid4().hex}{ext}"
 
+    encoders = []
+
+    def open_chunks():
+        # Fresh encoder per attempt, since storage retries restart the stream.
+        encoders.append(Encoder(file.content_type))
+        return encoders[-1].encode(iter_upload_chunks(file))
+
     try:
-        supabase.storage.from_(SUPABASE_BUCKET).upload(
+        await async_storage.upload_stream(
             stored_name,
-            content,
-            {
-                "content-type": file.content_type
-                or "application/octet-stream"
-            },
+            open_chunks,
+            file.content_type or "application/octet-stream",
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Upload failed: {e}")
 
-    db_file = FileModel(
-        user_id=user.id,
-        original_filename=file.filename,
-        stored_filename=stored_name,
-        size_bytes=size,
-        mime_type=file.content_type,
+    encoder = encoders[-1]
+    db_file = await run_in_threadpool(
+        record_upload,
+        db,
+        user.id,
+        file.filename,
+        stored_name,
+        encoder.logical_size,
+        file.content_type,
+        sha256,
+        encoder.encoding,
+        encoder.stored_size,
     )
+    return file_to_dict(db_file)
 
-    db.add(db_file)
-    db.commit()
-    db.refresh(db_file)
 
-    log_activity(db, user.id, "upload", file.filename, db_file.id)
+# ---------------- STORAGE USAGE ----------------
+
+def storage_summary(db: Session, user_id: int) -> dict:
+    usage = get_usage(db, user_id)
 
     return {
-        "id": db_file.id,
-        "original_filename": db_file.original_filename,
-        "size_bytes": db_file.size_bytes,
-        "uploaded_at": db_file.uploaded_at.isoformat(),
+        "total_bytes": usage.bytes_used,
+        "total_mb": round(usage.bytes_used / (1024 * 1024), 2),
+        "file_count": usage.file_count,
+        "quota_bytes": quota_for(usage),
     }
 
 
-# ---------------- STORAGE USAGE ----------------
-
 @router.get("/storage")
-def storage_usage(
-    db: Session = Depends(get_db),
-    user: User = Depends(get_current_user),
+async def storage_usage(
+    request: Request,
+    db: DBRunner = Depends(get_runner),
+    user: Principal = Depends(get_current_user),
 ):
-    total = (
-        db.query(func.sum(FileModel.size_bytes))
-        .filter(FileModel.user_id == user.id)
-        .scalar()
-        or 0
-    )
+    etag, summary = await conditional_listing(request, db, user.id, storage_summary, user.id)
+    if summary is NOT_MODIFIED:
+        return not_modified(etag)
+    return with_etag(FastJSONResponse(summary), etag)
 
-    return {
-        "total_bytes": total,
-        "total_mb": round(total / (1024 * 1024), 2),
+
+# ---------------- DOWNLOAD ----------------
+
+def content_link(user_id: int, file_id: int) -> str:
+    """A /content link whose token stands in for the Authorization header."""
+    token = create_file_token(user_id, file_id, DOWNLOAD_TOKEN_EXPIRES_SECONDS)
+    return f"/api/files/{file_id}/content?token={token}"
+
+
+async def get_signed_urls(paths: List[str]) -> Dict[str, Optional[str]]:
+    """Signed URLs for storage paths: cached where possible, the rest signed in one batch."""
+    urls = {p: signed_urls.get(p) for p in paths}
+    missing = [p for p, url in urls.items() if url is None]
+    if missing:
+        fresh = await async_storage.create_signed_urls(
+            missing, SIGNED_URL_EXPIRES_SECONDS
+        )
+        for p, url in fresh.items():
+            if url:
+                signed_urls.put(p, url, SIGNED_URL_EXPIRES_SECONDS)
+            urls[p] = url
+    return urls
+
+
+class FileIdsBody(BaseModel):
+    file_ids: List[int]
+
+
+def unique_ids(ids: List[int], limit: int) -> List[int]:
+    ids = list(dict.fromkeys(ids))
+    if len(ids) > limit:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {limit} files per request",
+        )
+    return ids
+
+
+async def signed_urls_for_files(
+    db: Session, user_id: int, ids: List[int]
+) -> Tuple[List[tuple], Dict[int, Optional[str]]]:
+    """
+    Sign the user's files among `ids` (one ownership query, one signing
+    batch). Compressed files get /content links instead, since storage
+    would hand out the encoded bytes. Returns the owned (id,
+    stored_filename, original_filename, content_encoding) rows and
+    {id: url or None}.
+    """
+    def owned_rows():
+        return (
+            db.query(
+                FileModel.id,
+                FileModel.stored_filename,
+                FileModel.original_filename,
+                FileModel.content_encoding,
+            )
+            .filter(FileModel.user_id == user_id, FileModel.id.in_(ids))
+            .all()
+        )
+
+    rows = await run_in_threadpool(owned_rows) if ids else []
+
+    try:
+        urls = await get_signed_urls([path for _, path, _, enc in rows if not enc])
+    except Exception:
+        raise HTTPException(status_code=502, detail="Storage unavailable")
+
+    return rows, {
+        file_id: content_link(user_id, file_id) if enc else urls.get(path)
+        for file_id, path, _, enc in rows
     }
 
 
-# ---------------- DOWNLOAD ----------------
+@router.post("/signed-urls")
+async def batch_signed_urls(
+    body: FileIdsBody,
+    db: Session = Depends(get_db),
+    user: Principal = Depends(get_current_user),
+):
+    """Download URLs for many files at once (e.g. a gallery view)."""
+    ids = unique_ids(body.file_ids, SIGNED_URL_BATCH_LIMIT)
+    _, found = await signed_urls_for_files(db, user.id, ids)
+    return {
+        "urls": {str(i): url for i, url in found.items() if url},
+        "missing": [i for i in ids if not found.get(i)],
+    }
+
 
 @router.get("/{file_id}/download")
-def download_file(
+async def download_file(
     file_id: int,
     db: Session = Depends(get_db),
-    user: User = Depends(get_current_user),
+    user: Principal = Depends(get_current_user),
 ):
-    f = (
-        db.query(FileModel)
-        .filter(FileModel.id == file_id, FileModel.user_id == user.id)
-        .first()
-    )
+    f = await run_in_threadpool(get_owned_file, db, user.id, file_id)
 
     if not f:
         raise HTTPException(status_code=404, detail="File not found")
 
+    if DOWNLOAD_MODE == "proxy" or f.content_encoding:
+        # Served (and logged) by download_content, which the browser can
+        # fetch directly. Compressed objects always are: it decodes them.
+        return {"url": content_link(user.id, f.id)}
+
     try:
-        res = supabase.storage.from_(SUPABASE_BUCKET).create_signed_url(
-            f.stored_filename, 60
-        )
-        url = res.get("signedURL") or res.get("signedUrl")
+        url = (await get_signed_urls([f.stored_filename]))[f.stored_filename]
     except Exception:
         url = None
 
     if not url:
         raise HTTPException(status_code=404, detail="File missing in storage")
 
-    log_activity(db, user.id, "download", f.original_filename, f.id)
+    await run_in_threadpool(
+        log_activity, user.id, "download", f.original_filename, f.id
+    )
 
     return {"url": url}
 
 
-# ---------------- DELETE ----------------
+# ---------------- PROXIED DOWNLOAD ----------------
 
-@router.delete("/{file_id}")
-def delete_file(
-    file_id: int,
-    db: Session = Depends(get_db),
-    user: User = Depends(get_current_user),
-):
-    f = (
-        db.query(FileModel)
-        .filter(FileModel.id == file_id, FileModel.user_id == user.id)
+def file_meta(db: Session, user_id: int, file_id: int):
+    return (
+        db.query(
+            FileModel.stored_filename,
+            FileModel.original_filename,
+            FileModel.size_bytes,
+            FileModel.mime_type,
+            FileModel.blob_sha256,
+            FileModel.content_encoding,
+            FileModel.stored_size_bytes,
+        )
+        .filter(FileModel.id == file_id, FileModel.user_id == user_id)
         .first()
     )
 
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    (start, end) inclusive for a single "bytes=" range; None to send the
+    whole file (no header, several ranges, or a header we don't understand).
+    """
+    if not header or not header.startswith("bytes=") or "," in header or size == 0:
+        return None
+    first, _, last = header[len("bytes="):].strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+        else:
+            start, end = max(0, size - int(last)), size - 1  # suffix: last N bytes
+    except ValueError:
+        return None
+    end = min(end, size - 1)
+    if start > end:
+        raise HTTPException(
+            status_code=416,
+            detail="Range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"},
+        )
+    return start, end
+
+
+def read_file_range(
+    f, start: int, length: int, chunk_size: int = 1024 * 1024
+) -> Iterator[bytes]:
+    """Bytes [start, start + length) of an open file, which is closed afterwards."""
+    with f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(chunk_size, length))
+            if not chunk:
+                return
+            length -= len(chunk)
+            yield chunk
+
+
+def slice_chunks(chunks: Iterable[bytes], start: int, length: int) -> Iterator[bytes]:
+    """Bytes [start, start + length) of a chunk stream."""
+    pos = 0
+    for chunk in chunks:
+        lo, hi = max(start - pos, 0), min(start + length - pos, len(chunk))
+        pos += len(chunk)
+        if lo < hi:
+            yield chunk[lo:hi]
+        if pos >= start + length:
+            return
+
+
+async def primed(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Pull the first chunk now, so a missing object is a 404 rather than a cut-off body."""
+    it = iter(chunks)
+    try:
+        first = await run_in_threadpool(next, it, None)
+    except StorageError:
+        raise HTTPException(status_code=404, detail="File missing in storage")
+    return itertools.chain([] if first is None else [first], it)
+
+
+@router.get("/{file_id}/content")
+async def download_content(
+    file_id: int,
+    request: Request,
+    token: Optional[str] = None,
+    db: DBRunner = Depends(get_runner),
+    user: Optional[Principal] = Depends(get_current_user_optional),
+):
+    """
+    File bytes proxied through the API, with Range / If-Range and
+    ETag / If-None-Match support. Authorized by a Bearer token or by the
+    `token` of a link from /download. In proxy mode hot objects are served
+    from the local disk cache; misses stream from storage while filling it.
+    Compressed objects go out as stored, with Content-Encoding, to clients
+    that accept it and ask for the whole file; otherwise they are decoded
+    here (Ranges are over the decoded content).
+    """
+    user_id = user_id_from_file_token(token, file_id) if token else (user and user.id)
+    if user_id is None:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    f = await db.run(file_meta, user_id, file_id)
     if not f:
         raise HTTPException(status_code=404, detail="File not found")
 
-    # Remove from Supabase (ignore failure)
-    try:
-        supabase.storage.from_(SUPABASE_BUCKET).remove([f.stored_filename])
-    except Exception:
-        pass
+    stored, size, encoding = f.stored_filename, f.size_bytes or 0, f.content_encoding
+    stored_size = f.stored_size_bytes if encoding else size
+    passthrough = bool(encoding) and not request.headers.get("range") and accepts_encoding(
+        request.headers.get("accept-encoding"), encoding
+    )
+    content_id = f.blob_sha256 or hashlib.sha256(stored.encode()).hexdigest()
+    etag = f'"{content_id[:32]}"'
+    headers = {
+        "ETag": f'"{content_id[:32]}-{encoding}"' if passthrough else etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, no-cache",
+    }
+    if encoding:
+        headers["Vary"] = "Accept-Encoding"
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    if_range = request.headers.get("if-range")
+    byte_range = None
+    if not if_range or if_range == etag:
+        byte_range = parse_range(request.headers.get("range"), size)
+    start, end = byte_range or (0, size - 1)
+    length = end - start + 1 if size else 0
 
-    # Clear activity FK
-    db.query(Activity).filter(Activity.file_id == f.id).update(
-        {Activity.file_id: None}
+    cache = download_cache()
+    cacheable = cache is not None and cache.cacheable(stored_size)
+    cached = cache.lookup(stored) if cache else None
+    if cached is None and byte_range is not None and cacheable:
+        try:
+            cached = await run_in_threadpool(cache.fill, storage, stored)
+        except StorageError:
+            raise HTTPException(status_code=404, detail="File missing in storage")
+    handle = None
+    if cached is not None:
+        try:
+            handle = open(cached, "rb")
+        except FileNotFoundError:
+            pass  # evicted in the meantime; stream from storage instead
+
+    # The cache holds objects as stored; encoded ones are decoded from the start.
+    if handle is not None and (passthrough or not encoding):
+        body = read_file_range(handle, 0 if passthrough else start, stored_size if passthrough else length)
+    elif handle is not None:
+        body = slice_chunks(decode(read_file_range(handle, 0, stored_size), encoding), start, length)
+    elif byte_range is None and cacheable:
+        body = await primed(cache.tee(storage.open_stream(stored), stored))
+        if encoding and not passthrough:
+            body = decode(body, encoding)
+    elif passthrough:
+        body = await primed(storage.open_stream(stored))
+    else:
+        body = await primed(
+            slice_chunks(decode(storage.open_stream(stored), encoding), start, length)
+        )
+
+    if start == 0:
+        await run_in_threadpool(
+            log_activity, user_id, "download", f.original_filename, file_id
+        )
+
+    headers["Content-Length"] = str(stored_size if passthrough else length)
+    headers["Content-Disposition"] = (
+        f"attachment; filename*=UTF-8''{quote(f.original_filename)}"
+    )
+    if passthrough:
+        headers["Content-Encoding"] = encoding
+    if byte_range:
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    if cache is not None:
+        body = cache.counted(body, from_cache=handle is not None)
+    return StreamingResponse(
+        body,
+        status_code=206 if byte_range else 200,
+        media_type=f.mime_type or "application/octet-stream",
+        headers=headers,
     )
 
-    log_activity(db, user.id, "delete", f.original_filename)
 
-    db.delete(f)
+# ---------------- PREVIEW ----------------
+
+def preview_meta(db: Session, user_id: int, file_id: int):
+    return (
+        db.query(FileModel.preview_kind, FileModel.preview_path)
+        .filter(FileModel.id == file_id, FileModel.user_id == user_id)
+        .first()
+    )
+
+
+@router.get("/{file_id}/preview")
+async def get_preview(
+    file_id: int,
+    db: DBRunner = Depends(get_runner),
+    user: Principal = Depends(get_current_user),
+):
+    """The file's thumbnail (JPEG) or text snippet; 404 until one is ready."""
+    p = await db.run(preview_meta, user.id, file_id)
+    if not p or not p.preview_path:
+        raise HTTPException(status_code=404, detail="No preview")
+    try:
+        data = await run_in_threadpool(
+            lambda: b"".join(storage.open_stream(p.preview_path))
+        )
+    except StorageError:
+        raise HTTPException(status_code=404, detail="No preview")
+    return Response(
+        data,
+        media_type="image/jpeg" if p.preview_kind == "image" else "text/plain; charset=utf-8",
+        # A preview never changes for a given file id.
+        headers={"Cache-Control": "private, max-age=86400"},
+    )
+
+
+# ---------------- DELETE ----------------
+
+def delete_file_rows(db: Session, user_id: int, files: List[FileModel]) -> List[str]:
+    """
+    Drop the File rows in one transaction: detach their activities with a
+    single UPDATE, log the deletes, release usage and blob references.
+    Returns the storage paths that are no longer referenced.
+    """
+    if not files:
+        return []
+    ids = [f.id for f in files]
+    direct = [f.stored_filename for f in files if not f.blob_sha256]
+    previews = [f.preview_path for f in files if f.preview_path]
+    refs = Counter(f.blob_sha256 for f in files if f.blob_sha256)
+    total = sum(f.size_bytes or 0 for f in files)
+    get_usage(db, user_id)  # make sure the counters row exists first
+
+    # Clear activity FK, both written and still queued
+    db.query(Activity).filter(Activity.file_id.in_(ids)).update(
+        {Activity.file_id: None}, synchronize_session=False
+    )
+    activity_log.detach_files(ids)
+    for f in files:
+        log_activity(user_id, "delete", f.original_filename)
+
+    db.query(FileModel).filter(FileModel.id.in_(ids)).delete(synchronize_session=False)
+    release_usage(db, user_id, total, files=len(files))
+    unreferenced = direct + previews + release_blobs(db, refs)
     db.commit()
+    return unreferenced
+
+
+async def remove_objects(paths: List[str]) -> None:
+    """Forget cached URLs and copies, and remove objects in batches (ignore failure)."""
+    signed_urls.discard(paths)
+    cache = download_cache()
+    if cache is not None:
+        cache.discard(paths)
+    for i in range(0, len(paths), STORAGE_REMOVE_BATCH_SIZE):
+        try:
+            await async_storage.remove(paths[i:i + STORAGE_REMOVE_BATCH_SIZE])
+        except Exception as e:
+            print("⚠️ Storage remove failed:", e)
+
+
+@router.delete("/{file_id}")
+async def delete_file(
+    file_id: int,
+    db: Session = Depends(get_db),
+    user: Principal = Depends(get_current_user),
+):
+    f = await run_in_threadpool(get_owned_file, db, user.id, file_id)
+
+    if not f:
+        raise HTTPException(status_code=404, detail="File not found")
+
+    unreferenced = await run_in_threadpool(delete_file_rows, db, user.id, [f])
+
+    # Remove from storage once nothing points at it
+    await remove_objects(unreferenced)
 
     return {"deleted": file_id}
+
+
+# ---------------- BULK ----------------
+
+@router.post("/bulk-delete")
+async def bulk_delete(
+    body: FileIdsBody,
+    db: Session = Depends(get_db),
+    user: Principal = Depends(get_current_user),
+):
+    """
+    Delete many files with one ownership query and one commit. Ids that are
+    not the user's files are reported in `failed`; the rest are deleted.
+    """
+    ids = unique_ids(body.file_ids, BULK_OPERATION_LIMIT)
+
+    def delete_owned():
+        files = (
+            db.query(FileModel)
+            .filter(FileModel.user_id == user.id, FileModel.id.in_(ids))
+            .all()
+        ) if ids else []
+        return [f.id for f in files], delete_file_rows(db, user.id, files)
+
+    deleted, unreferenced = await run_in_threadpool(delete_owned)
+    await remove_objects(unreferenced)
+
+    found = set(deleted)
+    return {
+        "deleted": [i for i in ids if i in found],
+        "failed": [{"id": i, "error": "File not found"} for i in ids if i not in found],
+    }
+
+
+@router.post("/bulk-download")
+async def bulk_download(
+    body: FileIdsBody,
+    db: Session = Depends(get_db),
+    user: Principal = Depends(get_current_user),
+):
+    """
+    Download links for many files, logged as downloads like the single
+    endpoint. Same response shape as /signed-urls.
+    """
+    ids = unique_ids(body.file_ids, BULK_OPERATION_LIMIT)
+    rows, found = await signed_urls_for_files(db, user.id, ids)
+
+    def log_downloads():
+        for file_id, _, filename, _ in rows:
+            if found.get(file_id):
+                log_activity(user.id, "download", filename, file_id)
+
+    await run_in_threadpool(log_downloads)
+    return {
+        "urls": {str(i): url for i, url in found.items() if url},
+        "missing": [i for i in ids if not found.get(i)],
+    }
+
+
+# ---------------- ARCHIVE ----------------
+
+@router.get("/archive")
+def download_archive(
+    ids: str = Query(..., description='Comma-separated file ids, or "all"'),
+    db: Session = Depends(get_db),
+    user: Principal = Depends(get_current_user),
+):
+    """
+    Stream a ZIP of the selected files (or all of them), built on the fly
+    from storage. Unreadable objects are left out and listed in
+    _export_errors.txt inside the archive.
+    """
+    query = db.query(
+        FileModel.stored_filename,
+        FileModel.original_filename,
+        FileModel.size_bytes,
+        FileModel.uploaded_at,
+        FileModel.content_encoding,
+    ).filter(FileModel.user_id == user.id)
+    if ids != "all":
+        try:
+            wanted = unique_ids([int(i) for i in ids.split(",") if i.strip()], BULK_OPERATION_LIMIT)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid file ids")
+        query = query.filter(FileModel.id.in_(wanted))
+    rows = query.order_by(FileModel.id).all()
+    if not rows:
+        raise HTTPException(status_code=404, detail="No files to export")
+
+    log_activity(user.id, "download", f"archive ({len(rows)} files)")
+
+    stream = ZipStream(
+        storage,
+        [ArchiveEntry(path, name, size or 0, at, enc) for path, name, size, at, enc in rows],
+        concurrency=ARCHIVE_CONCURRENCY,
+        readahead=ARCHIVE_READAHEAD_CHUNKS,
+        chunk_size=ARCHIVE_CHUNK_SIZE,
+        compression=zipfile.ZIP_DEFLATED if ARCHIVE_COMPRESSION == "deflated" else zipfile.ZIP_STORED,
+    )
+    return StreamingResponse(
+        stream,
+        media_type="application/zip",
+        headers={"Content-Disposition": 'attachment; filename="skyvault-export.zip"'},
+    )
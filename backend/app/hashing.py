@@ -0,0 +1,100 @@
+"""
+Password hashing on a dedicated, bounded process pool.
+
+bcrypt releases the GIL, but each hash still takes a core for hundreds of
+milliseconds, and on Starlette's shared threadpool a login burst takes the
+threads (and cores) every other sync route needs. PasswordHasher runs it
+in its own worker processes instead, so hashing uses at most `workers`
+cores per API process whatever the load, and it refuses new work
+(PoolSaturated) once `max_pending` hashes are queued or running, so
+callers can fail fast.
+
+Only passlib is imported here: this module is loaded by the worker processes.
+"""
+
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+
+from passlib.context import CryptContext
+
+_contexts = {}
+
+
+def _context(rounds: int) -> CryptContext:
+    # min == max == default rounds: any hash with a different cost "needs update".
+    ctx = _contexts.get(rounds)
+    if ctx is None:
+        ctx = _contexts[rounds] = CryptContext(
+            schemes=["bcrypt"],
+            deprecated="auto",
+            bcrypt__default_rounds=rounds,
+            bcrypt__min_rounds=rounds,
+            bcrypt__max_rounds=rounds,
+        )
+    return ctx
+
+
+def hash_secret(secret: str, rounds: int) -> str:
+    return _context(rounds).hash(secret)
+
+
+def verify_secret(secret: str, hashed: str, rounds: int) -> Tuple[bool, Optional[str]]:
+    """(matches, new hash if the stored one uses a different cost)."""
+    return _context(rounds).verify_and_update(secret, hashed)
+
+
+class PoolSaturated(Exception):
+    """Too many hashes already queued; the caller should back off."""
+
+
+class PasswordHasher:
+    def __init__(self, workers: int, max_pending: int, rounds: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.rounds = rounds
+        self.pending = 0
+        self.rejected = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _pool(self) -> ProcessPoolExecutor:
+        # Created on first use; "spawn" avoids forking a threaded server.
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    async def _run(self, fn, *args):
+        # Only touched from the event loop thread, so a plain counter is safe.
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise PoolSaturated()
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._pool(), fn, *args)
+        finally:
+            self.pending -= 1
+
+    async def hash(self, secret: str) -> str:
+        return await self._run(hash_secret, secret, self.rounds)
+
+    async def verify(self, secret: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        return await self._run(verify_secret, secret, hashed, self.rounds)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "rejected": self.rejected,
+            "rounds": self.rounds,
+        }
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
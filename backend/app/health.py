@@ -0,0 +1,86 @@
+"""
+Probes for the orchestrator / load balancer.
+
+- GET /healthz (liveness): the process is up and its event loop answers.
+  Nothing else is touched, so a slow database never gets instances killed.
+- GET /readyz (readiness): a database connection can be checked out and
+  used, the schema has been migrated (python -m app.migrate), and the
+  storage backend answers, each within READY_TIMEOUT_SECONDS. Answers 503
+  otherwise, so no traffic is routed to the instance yet. The first probe
+  is also what builds the (lazy) storage client. The schema is inspected
+  until it is first found current, not on every probe after that.
+"""
+
+import asyncio
+import time
+
+from fastapi import APIRouter
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+from sqlalchemy import text
+
+from app.config import READY_TIMEOUT_SECONDS
+from app.database import engine, async_engine, pool_stats
+from app.files import async_storage
+from app.migrate import check_schema
+
+router = APIRouter(tags=["health"])
+
+# Set once the schema has been found current; it never goes back.
+_schema_current = False
+
+
+def _ping_db() -> None:
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+
+
+def _check_schema() -> None:
+    global _schema_current
+    if not _schema_current:
+        check_schema()
+        _schema_current = True
+
+
+async def _ping_async_db() -> None:
+    async with async_engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+
+
+async def _check(name: str, probe) -> dict:
+    start = time.perf_counter()
+    try:
+        await asyncio.wait_for(probe, READY_TIMEOUT_SECONDS)
+        error = None
+    except asyncio.TimeoutError:
+        error = f"timed out after {READY_TIMEOUT_SECONDS}s"
+    except Exception as e:
+        print(f"⚠️ Readiness check '{name}' failed:", e)
+        error = type(e).__name__
+    result = {"ok": error is None, "ms": round((time.perf_counter() - start) * 1000, 2)}
+    if error:
+        result["error"] = error
+    return result
+
+
+@router.get("/healthz")
+async def healthz():
+    return {"status": "ok"}
+
+
+@router.get("/readyz")
+async def readyz():
+    probes = {
+        "database": run_in_threadpool(_ping_db),
+        "schema": run_in_threadpool(_check_schema),
+        "storage": async_storage.ping(READY_TIMEOUT_SECONDS),
+    }
+    if async_engine is not None:
+        probes["database_async"] = _ping_async_db()
+    results = await asyncio.gather(*(_check(n, p) for n, p in probes.items()))
+    checks = dict(zip(probes, results))
+    ready = all(c["ok"] for c in checks.values())
+    return JSONResponse(
+        {"status": "ready" if ready else "unavailable", "checks": checks, "pool": pool_stats()},
+        status_code=200 if ready else 503,
+    )
@@ -1,47 +1,122 @@
 """
-FastAPI app: CORS, include routers, create tables on startup.
-"""
-from dotenv import load_dotenv
-import os
+FastAPI app: CORS, include routers, background tasks.
 
-load_dotenv() 
+The schema is managed by app.migrate, not at startup (see DB_AUTO_MIGRATE).
+"""
+import asyncio
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.config import APP_NAME, CORS_ORIGINS, DEBUG
-from app.database import engine, Base
+from app.config import (
+    APP_NAME,
+    CORS_ORIGINS,
+    DEBUG,
+    UPLOAD_SESSION_SWEEP_SECONDS,
+    ACTIVITY_ARCHIVE_INTERVAL_SECONDS,
+    PREVIEW_SWEEP_SECONDS,
+    DB_AUTO_MIGRATE,
+)
+from app.database import dispose_engines
+from app.auth import password_hasher
+from app.activity import activity_log, archive_activity
 from app.routes import router as auth_router
-from app.files import router as files_router
+from app.files import router as files_router, async_storage, preview_workers
+from app.previews import enqueue_missing_previews
+from app.pagination import NEXT_CURSOR_HEADER
+from app.responses import FastJSONResponse
+from app.uploads import router as uploads_router, purge_expired_sessions
+from app.direct_uploads import (
+    router as direct_uploads_router,
+    local_router as local_storage_router,
+    purge_expired_reservations,
+)
 from app.admin import router as admin_router
+from app.search import router as search_router
+from app.health import router as health_router
+from app.metrics import MetricsMiddleware, router as metrics_router
+from app.admission import AdmissionMiddleware
+from app.body_limit import BodyLimitMiddleware
+
+
+async def run_periodically(fn, interval: float, name: str):
+    """Run blocking housekeeping `fn` off the event loop every `interval` seconds."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(fn)
+        except Exception as e:
+            print(f"⚠️ {name} failed:", e)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Create DB tables on startup
-    try:
-        Base.metadata.create_all(bind=engine)
-    except Exception as e:
-        print("⚠️ DB not ready yet:", e)
+    if DB_AUTO_MIGRATE:
+        from app.migrate import migrate
+
+        try:
+            await asyncio.to_thread(migrate)
+        except Exception as e:
+            print("⚠️ DB not ready yet:", e)
+    sweepers = [
+        asyncio.create_task(run_periodically(
+            purge_expired_sessions, UPLOAD_SESSION_SWEEP_SECONDS, "Upload session sweep"
+        )),
+        asyncio.create_task(run_periodically(
+            purge_expired_reservations, UPLOAD_SESSION_SWEEP_SECONDS, "Direct upload sweep"
+        )),
+        asyncio.create_task(run_periodically(
+            archive_activity, ACTIVITY_ARCHIVE_INTERVAL_SECONDS, "Activity archival"
+        )),
+        asyncio.create_task(run_periodically(
+            lambda: enqueue_missing_previews(preview_workers),
+            PREVIEW_SWEEP_SECONDS,
+            "Preview sweep",
+        )),
+    ]
+    activity_log.start()
+    preview_workers.start()
     yield
-    # shutdown if needed
-    pass
+    # shutdown
+    for task in sweepers:
+        task.cancel()
+    await asyncio.to_thread(preview_workers.stop)
+    await activity_log.stop()  # write queued activity before exiting
+    async_storage.close()
+    password_hasher.close()
+    await dispose_engines()
 
 
-app = FastAPI(title=APP_NAME, debug=DEBUG, lifespan=lifespan)
+# orjson rendering for every route; hot listings return their responses directly.
+app = FastAPI(
+    title=APP_NAME, debug=DEBUG, lifespan=lifespan, default_response_class=FastJSONResponse
+)
 
+# Inside admission, so an upload is only read once it has been admitted.
+app.add_middleware(BodyLimitMiddleware)
+# 429s still carry CORS headers and are timed.
+app.add_middleware(AdmissionMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=CORS_ORIGINS,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag", "Server-Timing", "X-Profile-Id", "Retry-After"],
 )
+# Outermost, so its timings include CORS handling.
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(auth_router)
+app.include_router(uploads_router)
+app.include_router(direct_uploads_router)
+app.include_router(local_storage_router)
+app.include_router(search_router)
 app.include_router(files_router)
 app.include_router(admin_router)
+app.include_router(metrics_router)
+app.include_router(health_router)
 
 
 @app.get("/")
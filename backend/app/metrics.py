@@ -0,0 +1,426 @@
+"""
+Prometheus metrics (GET /metrics) and per-request profiling.
+
+MetricsMiddleware times every request by route template and, through a
+context variable, collects what the request did: SQL statements (counted
+by SQLAlchemy cursor events on every engine) and storage calls (reported
+by MeteredStorage). The context variable is copied into threadpool calls,
+so work done there is attributed to the request that started it. Each
+response carries a Server-Timing header with the totals.
+
+Profiling is opt-in: a fraction PROFILE_SAMPLE_RATE of requests (or those
+sending "X-Profile: 1" when PROFILE_HEADER_ENABLED) run under cProfile.
+Profiles of requests slower than PROFILE_SLOW_MS, and all requested ones,
+are kept in memory for GET /api/admin/profiles. cProfile only sees the
+event loop thread, and everything else the loop ran meanwhile, so this is
+for finding hot spots, not exact accounting. One request is profiled at a
+time.
+"""
+
+import contextvars
+import cProfile
+import hmac
+import io
+import pstats
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.auth import Principal, get_current_user_optional
+from app.database import pool_stats
+from app.config import (
+    METRICS_TOKEN,
+    PROFILE_SAMPLE_RATE,
+    PROFILE_SLOW_MS,
+    PROFILE_HEADER_ENABLED,
+    PROFILE_KEEP,
+)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+# ---------------- METRIC TYPES ----------------
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _num(v: float) -> str:
+    return str(int(v)) if float(v).is_integer() else repr(float(v))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], object] = {}
+        if not self.label_names:
+            self._values[()] = self._initial()
+
+    def _initial(self):
+        return 0
+
+    def _key(self, labels: dict) -> Tuple[str, ...]:
+        return tuple(str(labels[n]) for n in self.label_names)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_one(key, value))
+        return lines
+
+    def _render_one(self, key, value) -> List[str]:
+        return [f"{self.name}{_labels(self.label_names, key)} {_num(value)}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        super().__init__(name, help, labels)
+
+    def _initial(self):
+        # [count per bucket..., +Inf count, sum]
+        return [0] * (len(self.buckets) + 1) + [0.0]
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = self._initial()
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def _render_one(self, key, series) -> List[str]:
+        lines = []
+        for bound, n in zip(self.buckets, series):
+            le = _labels(self.label_names, key, f'le="{_num(bound)}"')
+            lines.append(f"{self.name}_bucket{le} {n}")
+        inf = _labels(self.label_names, key, 'le="+Inf"')
+        plain = _labels(self.label_names, key)
+        lines.append(f"{self.name}_bucket{inf} {series[-2]}")
+        lines.append(f"{self.name}_sum{plain} {_num(series[-1])}")
+        lines.append(f"{self.name}_count{plain} {series[-2]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], List[str]]] = []
+
+    def add(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, fn: Callable[[], List[str]]) -> Callable[[], List[str]]:
+        """Register `fn` to produce extra exposition lines at scrape time."""
+        self._collectors.append(fn)
+        return fn
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for m in self._metrics:
+            lines.extend(m.render())
+        for fn in self._collectors:
+            try:
+                lines.extend(fn())
+            except Exception as e:
+                lines.append(f"# collector {fn.__name__} failed: {e}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.add(Counter(
+    "http_requests_total", "Requests handled.", ("method", "route", "status")
+))
+http_latency = registry.add(Histogram(
+    "http_request_duration_seconds", "Request latency, until the body is sent.",
+    ("method", "route"),
+))
+http_sql_queries = registry.add(Histogram(
+    "http_request_sql_queries", "SQL statements per request.", ("route",), COUNT_BUCKETS
+))
+http_sql_seconds = registry.add(Histogram(
+    "http_request_sql_seconds", "Time in SQL statements per request.", ("route",)
+))
+sql_statements = registry.add(Histogram(
+    "db_statement_duration_seconds", "SQL statement latency (all callers)."
+))
+storage_latency = registry.add(Histogram(
+    "storage_call_duration_seconds",
+    "Storage backend call latency (open_stream: until the first chunk).", ("op",),
+))
+storage_errors = registry.add(Counter(
+    "storage_call_errors_total", "Failed storage backend calls.", ("op",)
+))
+upload_bytes_in_flight = registry.add(Gauge(
+    "upload_bytes_in_flight", "Bytes of uploads read but not yet finished."
+))
+upload_bytes = registry.add(Counter(
+    "upload_bytes_total", "Upload bytes read from clients."
+))
+
+
+@registry.collector
+def _db_pool() -> List[str]:
+    stats = pool_stats()
+    lines = [
+        "# HELP db_pool_connections Pool connections by engine and state.",
+        "# TYPE db_pool_connections gauge",
+    ]
+    for engine in ("sync", "async"):
+        if engine in stats:
+            for state in ("size", "checked_out", "overflow"):
+                lines.append(
+                    f'db_pool_connections{{engine="{engine}",state="{state}"}} '
+                    f"{stats[engine][state]}"
+                )
+    lines += [
+        "# HELP db_pool_checkout_wait_seconds Time spent waiting for a pool connection.",
+        "# TYPE db_pool_checkout_wait_seconds summary",
+        f"db_pool_checkout_wait_seconds_sum {_num(stats['wait_total_seconds'])}",
+        f"db_pool_checkout_wait_seconds_count {stats['checkouts']}",
+        "# HELP db_pool_checkout_wait_max_seconds Longest pool checkout wait so far.",
+        "# TYPE db_pool_checkout_wait_max_seconds gauge",
+        f"db_pool_checkout_wait_max_seconds {_num(stats['wait_max_ms'] / 1000)}",
+    ]
+    return lines
+
+
+# ---------------- PER-REQUEST ACCOUNTING ----------------
+
+class RequestStats:
+    __slots__ = ("sql_count", "sql_seconds", "storage_calls", "storage_seconds")
+
+    def __init__(self):
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.storage_calls = 0
+        self.storage_seconds = 0.0
+
+
+_current: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar(
+    "request_stats", default=None
+)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    _finish_statement(conn)
+
+
+@event.listens_for(Engine, "handle_error")
+def _failed_execute(ctx):
+    if ctx.connection is not None and ctx.connection.info.get("query_start"):
+        _finish_statement(ctx.connection)
+
+
+def _finish_statement(conn) -> None:
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    sql_statements.observe(elapsed)
+    stats = _current.get()
+    if stats is not None:
+        stats.sql_count += 1
+        stats.sql_seconds += elapsed
+
+
+def observe_storage(op: str, seconds: float, failed: bool) -> None:
+    """MeteredStorage callback."""
+    storage_latency.observe(seconds, op=op)
+    if failed:
+        storage_errors.inc(op=op)
+    stats = _current.get()
+    if stats is not None:
+        stats.storage_calls += 1
+        stats.storage_seconds += seconds
+
+
+def track_upload(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Pass upload chunks through, counting them as in flight until done."""
+    held = 0
+    try:
+        for chunk in chunks:
+            n = len(chunk)
+            held += n
+            upload_bytes_in_flight.inc(n)
+            upload_bytes.inc(n)
+            yield chunk
+    finally:
+        upload_bytes_in_flight.dec(held)
+
+
+# ---------------- PROFILES ----------------
+
+profiles: deque = deque(maxlen=PROFILE_KEEP)
+_profiler_lock = threading.Lock()
+
+
+def _profile_text(profiler: cProfile.Profile, limit: int = 30) -> str:
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(limit)
+    return out.getvalue()
+
+
+# ---------------- MIDDLEWARE ----------------
+
+def _route_of(scope) -> str:
+    route = scope.get("route")
+    # Route templates only: raw paths would give a series per file id.
+    return getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        requested = PROFILE_HEADER_ENABLED and (b"x-profile", b"1") in scope["headers"]
+        profiler = None
+        if (requested or random.random() < PROFILE_SAMPLE_RATE) and _profiler_lock.acquire(
+            blocking=False
+        ):
+            profiler = cProfile.Profile()
+        profile_id = uuid.uuid4().hex[:12] if profiler else None
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                timing = (
+                    f"app;dur={(time.perf_counter() - start) * 1000:.1f}, "
+                    f'db;dur={stats.sql_seconds * 1000:.1f};desc="{stats.sql_count} queries", '
+                    f"storage;dur={stats.storage_seconds * 1000:.1f}"
+                )
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", timing.encode()))
+                if profile_id and requested:
+                    headers.append((b"x-profile-id", profile_id.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            if profiler:
+                profiler.enable()
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            if profiler:
+                profiler.disable()
+                _profiler_lock.release()
+            elapsed = time.perf_counter() - start
+            _current.reset(token)
+            route = _route_of(scope)
+            method = scope["method"]
+            http_requests.inc(method=method, route=route, status=status)
+            http_latency.observe(elapsed, method=method, route=route)
+            http_sql_queries.observe(stats.sql_count, route=route)
+            http_sql_seconds.observe(stats.sql_seconds, route=route)
+            if profiler and (requested or elapsed * 1000 >= PROFILE_SLOW_MS):
+                profiles.appendleft({
+                    "id": profile_id,
+                    "at": datetime.utcnow().isoformat(),
+                    "method": method,
+                    "path": scope["path"],
+                    "route": route,
+                    "status": status,
+                    "duration_ms": round(elapsed * 1000, 1),
+                    "sql_queries": stats.sql_count,
+                    "sql_ms": round(stats.sql_seconds * 1000, 1),
+                    "storage_calls": stats.storage_calls,
+                    "storage_ms": round(stats.storage_seconds * 1000, 1),
+                    "profile": _profile_text(profiler),
+                })
+
+
+# ---------------- ENDPOINT ----------------
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics(
+    request: Request,
+    user: Optional[Principal] = Depends(get_current_user_optional),
+) -> Response:
+    """
+    Prometheus text format. Never public: scrapers send METRICS_TOKEN as a
+    Bearer token, or an admin's session token is accepted.
+    """
+    authorization = request.headers.get("authorization") or ""
+    scraper = bool(METRICS_TOKEN) and hmac.compare_digest(
+        authorization.encode(), f"Bearer {METRICS_TOKEN}".encode()
+    )
+    if not scraper:
+        if user is None:
+            raise HTTPException(status_code=401, detail="Not authenticated")
+        if not user.is_admin:
+            raise HTTPException(status_code=403, detail="Admin access required")
+    body = await run_in_threadpool(registry.render)
+    return Response(body, media_type="text/plain; version=0.0.4")
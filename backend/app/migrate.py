@@ -0,0 +1,125 @@
+"""
+Schema migration, run once per deploy before new instances start:
+
+    python -m app.migrate
+
+Creates missing tables, adds the columns (with their foreign keys) and
+indexes models gained after their table was created (create_all alone
+never alters a table), installs the filename search index, and creates
+the usage counters of users from before they existed. Every step checks
+first, so running it again is a no-op. The app does not touch the schema
+at startup unless DB_AUTO_MIGRATE=true; until it has been migrated,
+/readyz answers 503 (see check_schema).
+
+Other column-level constraints (UNIQUE, CHECK) are not added to existing
+tables: give a new column that needs one an explicit unique Index instead.
+"""
+
+from typing import List
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import AddConstraint, Column, CreateColumn
+
+from app.database import engine
+from app.models import Base  # via app.models, so every table is registered
+from app.search import install_search_index
+from app.usage import backfill_usage
+
+
+def _references(column: Column, dialect) -> str:
+    """Inline REFERENCES clause for the column's foreign key ("" if none)."""
+    preparer = dialect.identifier_preparer
+    clauses = []
+    for fk in column.foreign_keys:
+        clause = (
+            f" REFERENCES {preparer.format_table(fk.column.table)}"
+            f" ({preparer.quote(fk.column.name)})"
+        )
+        if fk.ondelete:
+            clause += f" ON DELETE {fk.ondelete}"
+        clauses.append(clause)
+    return "".join(clauses)
+
+
+class SchemaOutdated(RuntimeError):
+    pass
+
+
+def pending(bind: Engine = engine) -> List[str]:
+    """Tables, columns and indexes of the models that the database lacks."""
+    inspector = inspect(bind)
+    existing = set(inspector.get_table_names())
+    missing = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing:
+            missing.append(f"table {table.name}")
+            continue
+        have = {c["name"] for c in inspector.get_columns(table.name)}
+        missing += [f"column {table.name}.{c.name}" for c in table.columns if c.name not in have]
+        indexes = {i["name"] for i in inspector.get_indexes(table.name)}
+        missing += [f"index {i.name}" for i in table.indexes if i.name not in indexes]
+    return missing
+
+
+def check_schema(bind: Engine = engine) -> None:
+    """Raise SchemaOutdated unless migrate() has brought the schema up to date."""
+    missing = pending(bind)
+    if missing:
+        raise SchemaOutdated(
+            f"{len(missing)} pending change(s), e.g. {missing[0]}; run python -m app.migrate"
+        )
+
+
+def migrate(bind: Engine = engine) -> List[str]:
+    """Bring the schema up to date. Returns a line per change made."""
+    changes = []
+    existing = set(inspect(bind).get_table_names())
+
+    Base.metadata.create_all(bind=bind)
+    changes += [f"created table {t}" for t in Base.metadata.tables if t not in existing]
+
+    inspector = inspect(bind)
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing:
+                continue
+            have = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in have:
+                    continue
+                # New columns are nullable (or defaulted), so existing rows are valid.
+                ddl = str(CreateColumn(column).compile(dialect=bind.dialect))
+                if bind.dialect.name == "sqlite":
+                    # SQLite cannot add constraints later, only inline.
+                    ddl += _references(column, bind.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {ddl}"))
+                if bind.dialect.name != "sqlite":
+                    for fk in column.foreign_keys:
+                        conn.execute(AddConstraint(fk.constraint))
+                changes.append(f"added column {table.name}.{column.name}")
+
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing:
+            continue  # create_all made its indexes with it
+        have = {i["name"] for i in inspect(bind).get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in have:
+                index.create(bind, checkfirst=True)
+                changes.append(f"created index {index.name}")
+
+    install_search_index(bind)
+
+    with Session(bind) as db:
+        backfilled = backfill_usage(db)
+    if backfilled:
+        changes.append(f"created usage counters for {backfilled} user(s)")
+    return changes
+
+
+if __name__ == "__main__":
+    changes = migrate()
+    for change in changes:
+        print(change)
+    print(f"Schema up to date; {len(changes)} change(s) applied.")
@@ -1,9 +1,13 @@
 """
-SQLAlchemy models: User, File, Activity (history).
+SQLAlchemy models: User, UserUsage, File, Blob, Activity (history),
+ActivityDaily/HistoryClear, UploadSession/UploadPart.
 """
 
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Boolean
+from sqlalchemy import (
+    Column, Integer, BigInteger, String, Float, Date, DateTime, ForeignKey, Boolean,
+    UniqueConstraint, Index,
+)
 from sqlalchemy.orm import relationship
 
 from app.database import Base
@@ -23,6 +27,24 @@ class User(Base):
     activities = relationship("Activity", back_populates="user")
 
 
+class UserUsage(Base):
+    """
+    Materialized per-user totals, updated in the same transaction as the
+    File insert/delete. Recompute with `python -m app.usage`.
+    """
+    __tablename__ = "user_usage"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    bytes_used = Column(BigInteger, nullable=False, default=0)
+    file_count = Column(Integer, nullable=False, default=0)
+    quota_bytes = Column(BigInteger, nullable=True)  # NULL = STORAGE_QUOTA_BYTES
+    # Change versions behind listing ETags (see app.conditional): `version`
+    # for the files and usage listings, `history_version` for activity.
+    version = Column(BigInteger, nullable=False, default=0, server_default="0")
+    history_version = Column(BigInteger, nullable=False, default=0, server_default="0")
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
 class File(Base):
     __tablename__ = "files"
 
@@ -33,10 +55,43 @@ class File(Base):
     size_bytes = Column(Integer, default=0)
     mime_type = Column(String(128), nullable=True)
     uploaded_at = Column(DateTime, default=datetime.utcnow)
+    # Content hash; NULL for files uploaded before deduplication existed.
+    blob_sha256 = Column(String(64), ForeignKey("blobs.sha256"), nullable=True, index=True)
+    # Preview (see app.previews): status NULL = not generated yet, then
+    # "ready", "unsupported" or "failed"; kind is "image" or "text".
+    preview_status = Column(String(16), nullable=True, index=True)
+    preview_kind = Column(String(16), nullable=True)
+    preview_path = Column(String(512), nullable=True)
+    # Stored object compression (see app.compression): size_bytes stays the
+    # logical size; both are NULL when the object is stored as-is.
+    content_encoding = Column(String(16), nullable=True)
+    stored_size_bytes = Column(BigInteger, nullable=True)
 
     owner = relationship("User", back_populates="files")
 
 
+# Keyset pagination indexes: one per sort key of the file listing.
+Index("ix_files_user_uploaded", File.user_id, File.uploaded_at.desc(), File.id)
+Index("ix_files_user_name", File.user_id, File.original_filename, File.id)
+Index("ix_files_user_size", File.user_id, File.size_bytes, File.id)
+
+
+class Blob(Base):
+    """
+    One stored object, shared by every File with the same content.
+    The object is removed from storage when ref_count drops to zero.
+    """
+    __tablename__ = "blobs"
+
+    sha256 = Column(String(64), primary_key=True)
+    stored_filename = Column(String(512), nullable=False)
+    size_bytes = Column(Integer, nullable=False)  # logical
+    content_encoding = Column(String(16), nullable=True)
+    stored_size_bytes = Column(BigInteger, nullable=True)  # NULL = size_bytes
+    ref_count = Column(Integer, nullable=False, default=1)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
 class Activity(Base):
     """User activity history (upload, download, delete)."""
     __tablename__ = "activities"
@@ -49,3 +104,78 @@ class Activity(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
 
     user = relationship("User", back_populates="activities")
+
+
+Index("ix_activities_user_created", Activity.user_id, Activity.created_at.desc(), Activity.id)
+Index("ix_activities_created", Activity.created_at)
+
+
+class ActivityDaily(Base):
+    """Per-user daily action counts for activity older than the retention window."""
+    __tablename__ = "activity_daily"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    action = Column(String(64), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class HistoryClear(Base):
+    """
+    When a user last cleared their history. Activity up to `cleared_at` is
+    hidden at once and physically removed later by the archival job, which
+    records the `cleared_at` it has purged up to in `purged_at`.
+    """
+    __tablename__ = "history_clears"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    cleared_at = Column(DateTime, nullable=False)
+    purged_at = Column(DateTime, nullable=True)
+
+
+class UploadSession(Base):
+    """An in-progress multipart upload; parts live in storage until commit."""
+    __tablename__ = "upload_sessions"
+
+    id = Column(String(32), primary_key=True)  # uuid4 hex
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    original_filename = Column(String(512), nullable=False)
+    mime_type = Column(String(128), nullable=True)
+    size_bytes = Column(Integer, nullable=False)
+    part_size = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+    parts = relationship(
+        "UploadPart", back_populates="session", cascade="all, delete-orphan"
+    )
+
+
+class UploadPart(Base):
+    __tablename__ = "upload_parts"
+    __table_args__ = (UniqueConstraint("session_id", "part_number"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    session_id = Column(String(32), ForeignKey("upload_sessions.id"), nullable=False)
+    part_number = Column(Integer, nullable=False)  # 0-based
+    size_bytes = Column(Integer, nullable=False)
+    uploaded_at = Column(DateTime, default=datetime.utcnow)
+
+    session = relationship("UploadSession", back_populates="parts")
+
+
+class DirectUpload(Base):
+    """
+    A reserved object path the client uploads to directly (signed URL);
+    becomes a File when finalized, or is purged with its object.
+    """
+    __tablename__ = "direct_uploads"
+
+    id = Column(String(32), primary_key=True)  # uuid4 hex
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    stored_filename = Column(String(512), nullable=False, unique=True)
+    original_filename = Column(String(512), nullable=False)
+    mime_type = Column(String(128), nullable=True)
+    size_bytes = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False, index=True)
@@ -0,0 +1,68 @@
+"""
+Keyset (cursor) pagination helpers.
+
+A page is ordered by (sort column, id) and the cursor records the last row's
+values, so the next page is a single index range scan instead of an OFFSET.
+Cursors are opaque to clients (base64url JSON) and the next one is returned
+in the X-Next-Cursor response header.
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Any, Optional, Tuple
+
+from fastapi import HTTPException, Response
+from sqlalchemy import tuple_
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(sort: str, order: str, value: Any, row_id: int) -> str:
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([sort, order, value, row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str, order: str) -> Tuple[Any, int]:
+    """
+    Return (value, id) from a cursor issued for the same sort and order.
+    `sort` may carry a digest of the query (see app.search), so a cursor
+    is also refused on a different search.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        c_sort, c_order, value, row_id = json.loads(raw)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if (c_sort, c_order) != (sort, order):
+        raise HTTPException(status_code=400, detail="Cursor does not match this sort order or search")
+    return value, int(row_id)
+
+
+def keyset_page(query, column, id_column, order: str, limit: int, after=None):
+    """
+    Order `query` by (column, id) in `order` and fetch one page after the
+    `after` = (value, id) position. Fetches one extra row to detect whether
+    another page follows; returns (rows, has_more).
+    """
+    if after is not None:
+        value, row_id = after
+        if column.type.python_type is datetime:
+            value = datetime.fromisoformat(value)
+        position = tuple_(column, id_column)
+        query = query.filter(
+            position < (value, row_id) if order == "desc" else position > (value, row_id)
+        )
+    if order == "desc":
+        query = query.order_by(column.desc(), id_column.desc())
+    else:
+        query = query.order_by(column.asc(), id_column.asc())
+    rows = query.limit(limit + 1).all()
+    return rows[:limit], len(rows) > limit
+
+
+def set_next_cursor(response: Response, cursor: Optional[str]) -> None:
+    if cursor:
+        response.headers[NEXT_CURSOR_HEADER] = cursor
@@ -0,0 +1,251 @@
+"""
+Background previews: image thumbnails and text snippets.
+
+Uploads only queue the file id; a few worker threads read the object,
+render a small preview and store it next to the user's files under
+"{user_id}/.previews/". The queue is bounded: when it is full new jobs are
+dropped and left to the periodic sweep (enqueue_missing_previews), which
+only ever fills the free slots. Generating is idempotent — a file whose
+preview_status is already set is skipped — so a file queued twice, or
+picked up by the sweep while its upload job is still pending, costs one
+row lookup.
+
+Pillow is optional; without it images are marked "unsupported".
+"""
+
+import importlib.util
+import io
+import queue
+import threading
+from pathlib import PurePosixPath
+from typing import List, Optional, Tuple
+
+from app.config import (
+    PREVIEW_MAX_SOURCE_BYTES,
+    PREVIEW_IMAGE_SIZE,
+    PREVIEW_TEXT_LINES,
+)
+from app.compression import decode
+from app.database import SessionLocal
+from app.models import File as FileModel
+from app.usage import bump_version
+from app.storage import StorageBackend
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp", ".bmp", ".tif", ".tiff"}
+TEXT_EXTENSIONS = {
+    ".txt", ".md", ".csv", ".tsv", ".log", ".json", ".xml", ".yaml", ".yml",
+    ".ini", ".cfg", ".toml", ".html", ".css", ".js", ".ts", ".py", ".sql", ".sh",
+}
+# Text previews never read more than this from the source object.
+TEXT_READ_BYTES = 16 * 1024
+HAVE_PILLOW = importlib.util.find_spec("PIL") is not None
+
+
+def preview_kind(filename: str, mime_type: Optional[str]) -> Optional[str]:
+    """"image", "text" or None (no preview for this type)."""
+    mime = (mime_type or "").lower()
+    ext = PurePosixPath(filename or "").suffix.lower()
+    if mime.startswith("image/") or ext in IMAGE_EXTENSIONS:
+        return "image"
+    if mime.startswith("text/") or ext in TEXT_EXTENSIONS:
+        return "text"
+    return None
+
+
+def preview_path(f: FileModel, kind: str) -> str:
+    return f"{f.user_id}/.previews/{f.id}.{'jpg' if kind == 'image' else 'txt'}"
+
+
+def render_image(data: bytes, size: int = PREVIEW_IMAGE_SIZE) -> bytes:
+    """JPEG thumbnail fitting in size x size (needs Pillow)."""
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(data)) as img:
+        img.draft("RGB", (size, size))  # JPEG: decode at reduced scale
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((size, size))
+        out = io.BytesIO()
+        img.convert("RGB").save(out, "JPEG", quality=80, optimize=True)
+        return out.getvalue()
+
+
+def render_text(data: bytes, lines: int = PREVIEW_TEXT_LINES) -> Optional[bytes]:
+    """The first `lines` lines as UTF-8, or None if the data looks binary."""
+    if b"\0" in data:
+        return None
+    text = data.decode("utf-8", errors="replace")
+    return "\n".join(text.splitlines()[:lines]).encode("utf-8")
+
+
+def _read(backend: StorageBackend, path: str, limit: int, encoding: Optional[str]) -> bytes:
+    buf = bytearray()
+    for chunk in decode(backend.open_stream(path, min(limit, 1024 * 1024)), encoding):
+        buf += chunk
+        if len(buf) >= limit:
+            break
+    return bytes(buf[:limit])
+
+
+def _render(
+    backend: StorageBackend, source: str, size: int, kind: str, encoding: Optional[str]
+) -> Tuple[str, Optional[bytes]]:
+    """(status, preview bytes) for one stored object."""
+    if kind == "image":
+        if not HAVE_PILLOW or size > PREVIEW_MAX_SOURCE_BYTES:
+            return "unsupported", None
+        return "ready", render_image(_read(backend, source, PREVIEW_MAX_SOURCE_BYTES, encoding))
+    data = render_text(_read(backend, source, TEXT_READ_BYTES, encoding))
+    return ("ready", data) if data is not None else ("unsupported", None)
+
+
+def generate_preview(backend: StorageBackend, file_id: int) -> Optional[str]:
+    """
+    Make the preview of one file and record the outcome on its row.
+    Returns the new preview_status, or None when there was nothing to do.
+    """
+    db = SessionLocal()
+    try:
+        f = db.get(FileModel, file_id)
+        if f is None or f.preview_status is not None:
+            return None
+        kind = preview_kind(f.original_filename, f.mime_type)
+        source, size, encoding = f.stored_filename, f.size_bytes or 0, f.content_encoding
+        user_id = f.user_id
+        target = preview_path(f, kind) if kind else None
+        db.rollback()  # don't hold a pooled connection while rendering
+
+        path = None
+        if kind is None:
+            status = "unsupported"
+        else:
+            try:
+                status, data = _render(backend, source, size, kind, encoding)
+            except Exception as e:
+                print(f"⚠️ Preview of file {file_id} failed:", e)
+                status, data = "failed", None
+            if data is not None:
+                path = target
+                backend.upload_stream(
+                    path, [data], "image/jpeg" if kind == "image" else "text/plain"
+                )
+
+        # The file may have been deleted meanwhile; never recreate it.
+        updated = (
+            db.query(FileModel)
+            .filter(FileModel.id == file_id, FileModel.preview_status.is_(None))
+            .update(
+                {
+                    FileModel.preview_status: status,
+                    FileModel.preview_kind: kind if path else None,
+                    FileModel.preview_path: path,
+                },
+                synchronize_session=False,
+            )
+        )
+        if updated:
+            bump_version(db, [user_id])
+        db.commit()
+        if not updated and path:
+            backend.remove([path])
+            return None
+        return status
+    finally:
+        db.close()
+
+
+class PreviewWorkers:
+    def __init__(self, backend: StorageBackend, workers: int, queue_size: int):
+        self.backend = backend
+        self.workers = max(1, workers)
+        self._queue: queue.Queue = queue.Queue(maxsize=max(1, queue_size))
+        self._queued = set()  # ids waiting or being processed
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+        self.generated = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def submit(self, file_id: int) -> bool:
+        """Queue a file without blocking. False if the queue is full (job dropped)."""
+        with self._lock:
+            if file_id in self._queued:
+                return True
+            try:
+                self._queue.put_nowait(file_id)
+            except queue.Full:
+                self.dropped += 1
+                return False
+            self._queued.add(file_id)
+            return True
+
+    def free_slots(self) -> int:
+        return self._queue.maxsize - self._queue.qsize()
+
+    def _work(self) -> None:
+        while True:
+            file_id = self._queue.get()
+            if file_id is None:
+                return
+            try:
+                status = generate_preview(self.backend, file_id)
+                if status == "ready":
+                    self.generated += 1
+                elif status == "failed":
+                    self.failed += 1
+            except Exception as e:
+                # Row left untouched; the sweep retries it later.
+                self.failed += 1
+                print(f"⚠️ Preview job for file {file_id} failed:", e)
+            finally:
+                with self._lock:
+                    self._queued.discard(file_id)
+
+    def start(self) -> None:
+        self._threads = [
+            threading.Thread(target=self._work, name=f"preview-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for t in self._threads:
+            t.start()
+
+    def stop(self, timeout: float = 5) -> None:
+        """Drop waiting jobs (the sweep finds them again) and stop the workers."""
+        with self._lock:
+            while True:
+                try:
+                    self._queued.discard(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+        for _ in self._threads:
+            self._queue.put(None)
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "workers": len(self._threads),
+            "generated": self.generated,
+            "failed": self.failed,
+            "dropped": self.dropped,
+        }
+
+
+def enqueue_missing_previews(workers: PreviewWorkers) -> int:
+    """Queue files that have no preview yet, as many as fit. Returns how many."""
+    free = workers.free_slots()
+    if free <= 0:
+        return 0
+    db = SessionLocal()
+    try:
+        ids = [
+            i
+            for (i,) in db.query(FileModel.id)
+            .filter(FileModel.preview_status.is_(None))
+            .order_by(FileModel.id)
+            .limit(free)
+        ]
+    finally:
+        db.close()
+    return sum(1 for i in ids if workers.submit(i))
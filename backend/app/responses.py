@@ -0,0 +1,58 @@
+"""
+Fast JSON responses.
+
+orjson encodes dicts, lists and datetimes several times faster than the
+json module and needs no jsonable_encoder pass first; without it installed
+the json module is used. Hot read routes return FastJSONResponse (or a
+stream from json_array_stream) themselves, which also skips FastAPI's own
+encoding and response-model validation of the result.
+"""
+
+import json
+from datetime import date, datetime
+from typing import Any, Iterable, Iterator
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(obj: Any):
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    raise TypeError(f"{type(obj).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """JSON bytes for `content`; datetimes become ISO 8601 strings."""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(
+        content, ensure_ascii=False, allow_nan=False, separators=(",", ":"), default=_default
+    ).encode()
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def json_array_stream(items: Iterable[Any], batch_size: int = 1000) -> Iterator[bytes]:
+    """
+    Encode `items` as one JSON array, `batch_size` items per chunk, so the
+    body is never held in memory whole.
+    """
+    yield b"["
+    batch = []
+    first = True
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield (b"" if first else b",") + dumps(batch)[1:-1]
+            batch, first = [], False
+    if batch:
+        yield (b"" if first else b",") + dumps(batch)[1:-1]
+    yield b"]"
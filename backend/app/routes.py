@@ -2,20 +2,26 @@
 Auth routes: register, login, me, history.
 """
 
-from typing import Optional, List
+from typing import Optional, List, Tuple
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel, EmailStr
 from sqlalchemy.orm import Session
 
-from app.database import get_db
-from app.models import User, Activity
+from app.database import DBRunner, get_db, get_runner
+from app.models import User, Activity, UserUsage
+from app.activity import activity_log, visible_activity, clear_history as hide_history
 from app.auth import (
-    hash_password,
-    verify_password,
+    hash_password_pooled,
+    verify_password_pooled,
     create_access_token,
     get_current_user,
+    Principal,
 )
+from app.pagination import encode_cursor, decode_cursor, keyset_page, set_next_cursor
+from app.conditional import NOT_MODIFIED, conditional_listing, not_modified, with_etag
+from app.responses import FastJSONResponse
 
 router = APIRouter(prefix="/api/auth", tags=["auth"])
 
@@ -48,9 +54,33 @@ class TokenResponse(BaseModel):
 
 # ---------------- Routes ----------------
 
+# register/login are async so bcrypt can be awaited on its own process pool;
+# their DB work runs on the threadpool.
+
+def _user_by_email(db: Session, email: str) -> Optional[User]:
+    return db.query(User).filter(User.email == email).first()
+
+
+def _save(db: Session, user: User) -> User:
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    return user
+
+
+def _create(db: Session, user: User) -> User:
+    """Add a new account with its (empty) usage counters."""
+    db.add(user)
+    db.flush()
+    db.add(UserUsage(user_id=user.id))
+    db.commit()
+    db.refresh(user)
+    return user
+
+
 @router.post("/register", response_model=TokenResponse)
-def register(body: RegisterBody, db: Session = Depends(get_db)):
-    if db.query(User).filter(User.email == body.email).first():
+async def register(body: RegisterBody, db: Session = Depends(get_db)):
+    if await run_in_threadpool(_user_by_email, db, body.email):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered",
@@ -58,13 +88,11 @@ def register(body: RegisterBody, db: Session = Depends(get_db)):
 
     user = User(
         email=body.email,
-        hashed_password=hash_password(body.password),
+        hashed_password=await hash_password_pooled(body.password),
         full_name=body.full_name,
     )
 
-    db.add(user)
-    db.commit()
-    db.refresh(user)
+    user = await run_in_threadpool(_create, db, user)
 
     token = create_access_token({"sub": str(user.id)})
 
@@ -81,15 +109,25 @@ def register(body: RegisterBody, db: Session = Depends(get_db)):
 
 
 @router.post("/login", response_model=TokenResponse)
-def login(body: LoginBody, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == body.email).first()
+async def login(body: LoginBody, db: Session = Depends(get_db)):
+    user = await run_in_threadpool(_user_by_email, db, body.email)
 
-    if not user or not verify_password(body.password, user.hashed_password):
+    ok, new_hash = (
+        await verify_password_pooled(body.password, user.hashed_password)
+        if user
+        else (False, None)
+    )
+    if not ok:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid email or password",
         )
 
+    # BCRYPT_ROUNDS changed since this hash was made: store it at the new cost.
+    if new_hash:
+        user.hashed_password = new_hash
+        user = await run_in_threadpool(_save, db, user)
+
     token = create_access_token({"sub": str(user.id)})
 
     return {
@@ -105,7 +143,7 @@ def login(body: LoginBody, db: Session = Depends(get_db)):
 
 
 @router.get("/me", response_model=UserResponse)
-def me(user: User = Depends(get_current_user)):
+def me(user: Principal = Depends(get_current_user)):
     return {
         "id": user.id,
         "email": user.email,
@@ -114,36 +152,69 @@ def me(user: User = Depends(get_current_user)):
     }
 
 
-@router.get("/history")
-def history(
-    limit: int = 50,
-    db: Session = Depends(get_db),
-    user: User = Depends(get_current_user),
-):
-    activities = (
-        db.query(Activity)
-        .filter(Activity.user_id == user.id)
-        .order_by(Activity.created_at.desc())
-        .limit(limit)
-        .all()
+def history_page(
+    db: Session, user_id: int, limit: int, cursor: Optional[str]
+) -> Tuple[List[dict], Optional[str]]:
+    activities, has_more = keyset_page(
+        visible_activity(
+            db, user_id, Activity.id, Activity.action, Activity.filename, Activity.created_at
+        ),
+        Activity.created_at,
+        Activity.id,
+        "desc",
+        limit,
+        after=decode_cursor(cursor, "created_at", "desc") if cursor else None,
     )
 
+    next_cursor = None
+    if has_more:
+        last = activities[-1]
+        next_cursor = encode_cursor("created_at", "desc", last.created_at, last.id)
+
     return [
         {
             "id": a.id,
             "action": a.action,
             "filename": a.filename,
-            "created_at": a.created_at.isoformat() if a.created_at else None,
+            "created_at": a.created_at,
         }
         for a in activities
-    ]
+    ], next_cursor
+
+
+@router.get("/history")
+async def history(
+    request: Request,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    flush: bool = False,
+    db: DBRunner = Depends(get_runner),
+    user: Principal = Depends(get_current_user),
+) -> Response:
+    """
+    Newest activity first; the next page's cursor is in X-Next-Cursor.
+    Activity is written in the background; flush=true writes queued events
+    first so the caller sees its own latest actions. Answers 304 to a
+    current If-None-Match (see app.conditional).
+    """
+    if flush:
+        await run_in_threadpool(activity_log.flush)
+    etag, page = await conditional_listing(
+        request, db, user.id, history_page, user.id, limit, cursor,
+        version=UserUsage.history_version,
+    )
+    if page is NOT_MODIFIED:
+        return not_modified(etag)
+    items, next_cursor = page
+    response = FastJSONResponse(items)
+    set_next_cursor(response, next_cursor)
+    return with_etag(response, etag)
 
 
 @router.delete("/history/clear")
 def clear_history(
     db: Session = Depends(get_db),
-    user: User = Depends(get_current_user),
+    user: Principal = Depends(get_current_user),
 ):
-    db.query(Activity).filter(Activity.user_id == user.id).delete()
-    db.commit()
+    hide_history(db, user.id)
     return {"cleared": True}
@@ -0,0 +1,210 @@
+"""
+Filename search: GET /api/files/search.
+
+Matching runs against a trigram index on files.original_filename, so the
+cost follows the number of candidate names, not the size of the table:
+
+- PostgreSQL: a pg_trgm GIN index; ILIKE '%term%' uses it directly.
+- SQLite: an FTS5 table with the trigram tokenizer, kept in sync with
+  `files` by triggers; its LIKE narrows the candidates by rowid.
+
+On SQLite the index is asked for the longest term only and every filter
+is re-checked with a plain ILIKE on those candidates, so the index just
+has to produce a superset. Terms shorter than three characters have no
+trigram and fall back to scanning the user's files.
+
+Results are ranked exact name > name prefix > substring, then shorter
+names first, and paginated with a keyset cursor over that order. The rank
+depends on the query, so cursors carry a digest of it and are refused for
+any other q, prefix or ext.
+"""
+
+import hashlib
+import json
+from typing import List, Optional, Tuple
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import case, column, func, or_, select, table, text, tuple_
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.auth import Principal, get_current_user
+from app.database import DBRunner, get_runner
+from app.files import file_to_dict
+from app.models import File as FileModel
+from app.pagination import encode_cursor, decode_cursor, set_next_cursor
+
+router = APIRouter(prefix="/api/files", tags=["files"])
+
+# Shortest term a trigram index can narrow down.
+MIN_INDEXED_TERM = 3
+
+_fts = table("files_name_fts", column("rowid"), column("original_filename"))
+
+_SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS files_name_fts USING fts5("
+    "original_filename, content='files', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS files_name_fts_ai AFTER INSERT ON files BEGIN "
+    "INSERT INTO files_name_fts(rowid, original_filename) "
+    "VALUES (new.id, new.original_filename); END",
+    "CREATE TRIGGER IF NOT EXISTS files_name_fts_ad AFTER DELETE ON files BEGIN "
+    "INSERT INTO files_name_fts(files_name_fts, rowid, original_filename) "
+    "VALUES ('delete', old.id, old.original_filename); END",
+    "CREATE TRIGGER IF NOT EXISTS files_name_fts_au AFTER UPDATE OF original_filename "
+    "ON files BEGIN "
+    "INSERT INTO files_name_fts(files_name_fts, rowid, original_filename) "
+    "VALUES ('delete', old.id, old.original_filename); "
+    "INSERT INTO files_name_fts(rowid, original_filename) "
+    "VALUES (new.id, new.original_filename); END",
+]
+
+_POSTGRES_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_files_name_trgm "
+    "ON files USING gin (original_filename gin_trgm_ops)",
+]
+
+
+def install_search_index(engine: Engine) -> None:
+    """Create the filename index for this database if it is missing."""
+    with engine.begin() as conn:
+        if engine.dialect.name == "sqlite":
+            exists = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE name = 'files_name_fts'")
+            ).first()
+            for ddl in _SQLITE_DDL:
+                conn.execute(text(ddl))
+            if not exists:
+                # Index the names that were there before the table.
+                conn.execute(text("INSERT INTO files_name_fts(files_name_fts) VALUES ('rebuild')"))
+        elif engine.dialect.name == "postgresql":
+            for ddl in _POSTGRES_DDL:
+                conn.execute(text(ddl))
+
+
+def _escape_like(term: str) -> str:
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _ilike(pattern: str):
+    return FileModel.original_filename.ilike(pattern, escape="\\")
+
+
+def _fts_candidates(db: Session, user_id: int, loose: List[str]):
+    """
+    `files.id IN (the user's FTS rows LIKE any of `loose`)`, or None when
+    the index cannot help (not SQLite, or a pattern too short to have a
+    trigram). The patterns are unescaped: their wildcards only widen the
+    candidates.
+    """
+    if db.get_bind().dialect.name != "sqlite" or not loose:
+        return None
+    if any(sum(c not in "%_" for c in p) < MIN_INDEXED_TERM for p in loose):
+        return None
+    # The FTS table only has names; join back to files for the owner, so
+    # other users' matches never enter the candidate set. "+ 0" keeps the
+    # FTS match driving the join rather than the user's index.
+    owned = FileModel.__table__.alias("owned")
+    return or_(*(
+        FileModel.id.in_(
+            select(_fts.c.rowid)
+            .join(owned, owned.c.id == _fts.c.rowid)
+            .where(_fts.c.original_filename.like(p), owned.c.user_id + 0 == user_id)
+        )
+        for p in loose
+    ))
+
+
+def parse_extensions(ext: Optional[str]) -> List[str]:
+    return [e.strip().lstrip(".").lower() for e in (ext or "").split(",") if e.strip(" .")]
+
+
+def query_key(q: str, prefix: Optional[str], extensions: List[str]) -> str:
+    """Short digest identifying a search, bound into its cursors."""
+    raw = json.dumps([q, prefix or "", sorted(extensions)], separators=(",", ":"))
+    return hashlib.sha256(raw.encode()).hexdigest()[:16]
+
+
+def search_page(
+    db: Session,
+    user_id: int,
+    q: str,
+    prefix: Optional[str],
+    extensions: List[str],
+    limit: int,
+    cursor: Optional[str],
+) -> Tuple[List[dict], Optional[str]]:
+    """One page of ranked matches as dicts, plus the next page's cursor."""
+    name = FileModel.original_filename
+    terms = [(f"%{_escape_like(t)}%", f"%{t}%") for t in q.split()]
+    if prefix:
+        terms.append((f"{_escape_like(prefix)}%", f"{prefix}%"))
+    filters = [_ilike(pattern) for pattern, _ in terms]
+    if extensions:
+        filters.append(or_(*(_ilike(f"%.{_escape_like(e)}") for e in extensions)))
+
+    # The index supplies candidates for the longest (most selective) term
+    # only; every filter above re-checks them.
+    if terms:
+        candidates = _fts_candidates(db, user_id, [max(terms, key=lambda t: len(t[1]))[1]])
+    else:
+        candidates = _fts_candidates(db, user_id, [f"%.{e}" for e in extensions])
+    owner = FileModel.user_id == user_id
+    if candidates is not None:
+        # Keep SQLite from walking the user's index and probing candidates
+        # one by one: "+ 0" takes user_id out of index selection.
+        owner = FileModel.user_id + 0 == user_id
+        filters.append(candidates)
+    query = db.query(FileModel).filter(owner, *filters)
+
+    lead = (q.strip() or prefix or "").lower()
+    rank = case(
+        (func.lower(name) == lead, 0),
+        (name.ilike(f"{_escape_like(lead)}%", escape="\\"), 1),
+        else_=2,
+    )
+    length = func.length(name)
+
+    sort = f"rank:{query_key(q, prefix, extensions)}"
+    if cursor:
+        (r, n), row_id = decode_cursor(cursor, sort, "asc")
+        query = query.filter(tuple_(rank, length, FileModel.id) > (r, n, row_id))
+    rows = (
+        query.add_columns(rank, length)
+        .order_by(rank, length, FileModel.id)
+        .limit(limit + 1)
+        .all()
+    )
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last, r, n = rows[-1]
+        next_cursor = encode_cursor(sort, "asc", [r, n], last.id)
+    return [file_to_dict(f) for f, _, _ in rows], next_cursor
+
+
+@router.get("/search")
+async def search_files(
+    response: Response,
+    q: str = "",
+    prefix: Optional[str] = None,
+    ext: Optional[str] = Query(None, description="Comma-separated, e.g. pdf,docx"),
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    db: DBRunner = Depends(get_runner),
+    user: Principal = Depends(get_current_user),
+) -> List[dict]:
+    """
+    The user's files whose name contains every word of `q`, starts with
+    `prefix` and has one of the `ext` extensions (any combination, at least
+    one). The next page's cursor is in X-Next-Cursor.
+    """
+    extensions = parse_extensions(ext)
+    if not q.strip() and not prefix and not extensions:
+        raise HTTPException(status_code=400, detail="Give q, prefix or ext")
+    files, next_cursor = await db.run(
+        search_page, user.id, q, prefix, extensions, limit, cursor
+    )
+    set_next_cursor(response, next_cursor)
+    return files
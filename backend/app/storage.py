@@ -0,0 +1,749 @@
+"""
+Storage backends: Supabase Storage bucket, or a local directory for offline use.
+
+Object paths are bucket-relative, e.g. "12/3f9c...e1.pdf". Uploads are passed
+around as iterables of byte chunks so no backend ever needs the whole file
+in memory.
+
+Backends are blocking. Async routes go through AsyncStorage, which runs them
+on a bounded thread pool with per-call timeouts and retries.
+"""
+
+import asyncio
+import hashlib
+import hmac
+import io
+import os
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import quote, urlencode
+
+
+class StorageError(Exception):
+    """A storage backend call failed."""
+
+
+class _ChunkReader(io.RawIOBase):
+    """
+    Read-only file object over an iterator of byte chunks.
+    Lets file-based clients (the Supabase SDK / httpx) stream a generator.
+    Counts bytes handed out and remembers any error raised by the producer.
+    """
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._pending = memoryview(b"")
+        self.written = 0
+        self.error: Optional[BaseException] = None
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        while not self._pending:
+            try:
+                self._pending = memoryview(next(self._chunks))
+            except StopIteration:
+                return 0
+            except Exception as e:
+                self.error = e
+                raise
+        n = min(len(b), len(self._pending))
+        b[:n] = self._pending[:n]
+        self._pending = self._pending[n:]
+        self.written += n
+        return n
+
+
+class StorageBackend:
+    """Interface every backend implements."""
+
+    def upload_stream(
+        self, path: str, chunks: Iterable[bytes], content_type: str
+    ) -> int:
+        """Store the chunks as one object at `path`. Returns bytes written."""
+        raise NotImplementedError
+
+    def open_stream(self, path: str, chunk_size: int = 1024 * 1024) -> Iterator[bytes]:
+        """Yield the object's content in chunks."""
+        raise NotImplementedError
+
+    def create_signed_url(self, path: str, expires_in: int) -> Optional[str]:
+        raise NotImplementedError
+
+    def create_signed_urls(
+        self, paths: List[str], expires_in: int
+    ) -> Dict[str, Optional[str]]:
+        """Sign many paths; backends with a batch API override this."""
+        return {p: self.create_signed_url(p, expires_in) for p in paths}
+
+    def create_signed_upload_url(self, path: str, expires_in: int, max_bytes: int) -> str:
+        """
+        URL a client can PUT the object's bytes to (raw body with its
+        Content-Type), once: the path must not exist yet.
+        """
+        raise NotImplementedError
+
+    def stat(self, path: str) -> Optional[int]:
+        """The object's size in bytes, or None if there is no such object."""
+        raise NotImplementedError
+
+    def remove(self, paths: List[str]) -> None:
+        raise NotImplementedError
+
+    def ping(self) -> None:
+        """Cheap call that raises StorageError unless the backend answers."""
+        raise NotImplementedError
+
+
+# ---------------- SUPABASE ----------------
+
+def _pooled_storage_client(
+    url: str, key: str, pool_size: int, timeout: float
+):
+    """
+    storage3 client whose httpx session keeps up to `pool_size` keep-alive
+    connections, so concurrent calls reuse TLS connections instead of
+    reconnecting.
+    """
+    import httpx
+    from storage3 import SyncStorageClient
+    from storage3.utils import SyncClient
+
+    class PooledStorageClient(SyncStorageClient):
+        def _create_session(self, base_url, headers, timeout):
+            return SyncClient(
+                base_url=base_url,
+                headers=headers,
+                timeout=timeout,
+                limits=httpx.Limits(
+                    max_connections=pool_size,
+                    max_keepalive_connections=pool_size,
+                    keepalive_expiry=60,
+                ),
+            )
+
+    return PooledStorageClient(
+        f"{url}/storage/v1",
+        {"apiKey": key, "Authorization": f"Bearer {key}"},
+        timeout,
+    )
+
+
+class SupabaseStorage(StorageBackend):
+    def __init__(self, storage_client, bucket: str):
+        self.storage_client = storage_client
+        self.bucket = bucket
+
+    @classmethod
+    def connect(
+        cls, url: str, key: str, bucket: str, pool_size: int = 10, timeout: float = 20
+    ) -> "SupabaseStorage":
+        return cls(_pooled_storage_client(url, key, pool_size, timeout), bucket)
+
+    def _bucket(self):
+        return self.storage_client.from_(self.bucket)
+
+    def upload_stream(self, path, chunks, content_type):
+        reader = _ChunkReader(chunks)
+        try:
+            self._bucket().upload(
+                path, io.BufferedReader(reader), {"content-type": content_type}
+            )
+        except Exception as e:
+            # Errors raised by the chunk producer (e.g. size limit) pass through.
+            if reader.error is not None:
+                raise reader.error
+            raise StorageError(str(e)) from e
+        return reader.written
+
+    def open_stream(self, path, chunk_size=1024 * 1024):
+        session = self.storage_client.session
+        with session.stream("GET", f"/object/{self.bucket}/{path}") as res:
+            if res.status_code >= 400:
+                raise StorageError(f"Download failed ({res.status_code})")
+            yield from res.iter_bytes(chunk_size)
+
+    def create_signed_url(self, path, expires_in):
+        try:
+            res = self._bucket().create_signed_url(path, expires_in)
+        except Exception as e:
+            raise StorageError(str(e)) from e
+        return res.get("signedURL") or res.get("signedUrl")
+
+    def create_signed_urls(self, paths, expires_in):
+        try:
+            items = self._bucket().create_signed_urls(list(paths), expires_in)
+        except Exception as e:
+            raise StorageError(str(e)) from e
+        urls = {p: None for p in paths}
+        for item in items:
+            if not item.get("error"):
+                urls[item.get("path")] = item.get("signedURL") or item.get("signedUrl")
+        return urls
+
+    def create_signed_upload_url(self, path, expires_in, max_bytes):
+        # Supabase fixes the URL's lifetime (two hours) and cannot cap the
+        # size; callers enforce both when the upload is finalized.
+        try:
+            return self._bucket().create_signed_upload_url(path)["signed_url"]
+        except Exception as e:
+            raise StorageError(str(e)) from e
+
+    def stat(self, path):
+        try:
+            res = self.storage_client.session.head(f"/object/{self.bucket}/{path}")
+        except Exception as e:
+            raise StorageError(str(e)) from e
+        if res.status_code in (400, 404):  # older Storage APIs answer 400 for missing objects
+            return None
+        if res.status_code >= 400:
+            raise StorageError(f"Stat failed ({res.status_code})")
+        return int(res.headers.get("content-length", 0))
+
+    def remove(self, paths):
+        try:
+            self._bucket().remove(list(paths))
+        except Exception as e:
+            raise StorageError(str(e)) from e
+
+    def ping(self):
+        try:
+            self.storage_client.get_bucket(self.bucket)
+        except Exception as e:
+            raise StorageError(str(e)) from e
+
+
+# ---------------- LOCAL FILESYSTEM ----------------
+
+class LocalStorage(StorageBackend):
+    """
+    Objects stored as files under `root`. Writes go to a temp file first.
+
+    Signed upload URLs point at `upload_url` (the API's stand-in route, see
+    app.direct_uploads) and carry an HMAC over path, expiry and size limit,
+    which that route checks with check_upload_token. The HMAC key is derived
+    from `secret` for this purpose only, so these tokens and anything else
+    signed with the same secret (session JWTs) can never stand in for each
+    other.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        secret: Optional[str] = None,
+        upload_url: str = "/api/storage/local",
+    ):
+        self.root = Path(root).resolve()
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.signing_key = (
+            hmac.new(secret.encode(), b"local-storage/signed-upload", hashlib.sha256).digest()
+            if secret
+            else None
+        )
+        self.upload_url = upload_url
+
+    def _resolve(self, path: str) -> Path:
+        full = (self.root / path).resolve()
+        if self.root not in full.parents:
+            raise StorageError(f"Invalid object path: {path}")
+        return full
+
+    def upload_stream(self, path, chunks, content_type):
+        target = self._resolve(path)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_name(f".{target.name}.{uuid.uuid4().hex}.part")
+        written = 0
+        try:
+            with open(tmp, "wb") as out:
+                for chunk in chunks:
+                    out.write(chunk)
+                    written += len(chunk)
+            os.replace(tmp, target)
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+        return written
+
+    def open_stream(self, path, chunk_size=1024 * 1024):
+        target = self._resolve(path)
+        if not target.is_file():
+            raise StorageError(f"Object not found: {path}")
+        with open(target, "rb") as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+
+    def create_signed_url(self, path, expires_in):
+        # Local files have no HTTP endpoint of their own; hand out the path.
+        target = self._resolve(path)
+        return target.as_uri() if target.is_file() else None
+
+    def _upload_signature(self, path: str, expires: int, max_bytes: int) -> str:
+        if not self.signing_key:
+            raise StorageError("Signed uploads need a signing key")
+        message = f"{path}\n{expires}\n{max_bytes}".encode()
+        return hmac.new(self.signing_key, message, hashlib.sha256).hexdigest()
+
+    def create_signed_upload_url(self, path, expires_in, max_bytes):
+        self._resolve(path)
+        expires = int(time.time() + expires_in)
+        query = urlencode({
+            "expires": expires,
+            "max_bytes": max_bytes,
+            "token": self._upload_signature(path, expires, max_bytes),
+        })
+        return f"{self.upload_url}/{quote(path)}?{query}"
+
+    def check_upload_token(self, path: str, expires: int, max_bytes: int, token: str) -> bool:
+        """Whether `token` is a live signature from create_signed_upload_url."""
+        if not self.signing_key or expires < time.time():
+            return False
+        return hmac.compare_digest(token, self._upload_signature(path, expires, max_bytes))
+
+    def stat(self, path):
+        target = self._resolve(path)
+        return target.stat().st_size if target.is_file() else None
+
+    def remove(self, paths):
+        for p in paths:
+            self._resolve(p).unlink(missing_ok=True)
+
+    def ping(self):
+        if not self.root.is_dir() or not os.access(self.root, os.W_OK):
+            raise StorageError(f"Storage directory not writable: {self.root}")
+
+
+# ---------------- LAZY CONSTRUCTION ----------------
+
+class LazyStorage(StorageBackend):
+    """
+    Backend built by `factory` on first use and shared from then on, so
+    importing the app neither imports a storage SDK nor opens its HTTP
+    session. Attributes other than the interface are passed through.
+    """
+
+    def __init__(self, factory: Callable[[], StorageBackend]):
+        self.factory = factory
+        self._backend: Optional[StorageBackend] = None
+        self._lock = threading.Lock()
+
+    @property
+    def backend(self) -> StorageBackend:
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    self._backend = self.factory()
+        return self._backend
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
+
+    def upload_stream(self, path, chunks, content_type):
+        return self.backend.upload_stream(path, chunks, content_type)
+
+    def open_stream(self, path, chunk_size=1024 * 1024):
+        return self.backend.open_stream(path, chunk_size)
+
+    def create_signed_url(self, path, expires_in):
+        return self.backend.create_signed_url(path, expires_in)
+
+    def create_signed_urls(self, paths, expires_in):
+        return self.backend.create_signed_urls(paths, expires_in)
+
+    def create_signed_upload_url(self, path, expires_in, max_bytes):
+        return self.backend.create_signed_upload_url(path, expires_in, max_bytes)
+
+    def stat(self, path):
+        return self.backend.stat(path)
+
+    def remove(self, paths):
+        return self.backend.remove(paths)
+
+    def ping(self):
+        return self.backend.ping()
+
+
+# ---------------- METERING ----------------
+
+class MeteredStorage(StorageBackend):
+    """
+    Times every call of the wrapped backend and reports it to
+    `observe(op, seconds, failed)`. open_stream is timed until its first
+    chunk, since the rest depends on how fast the consumer reads.
+    Attributes other than the interface are passed through.
+    """
+
+    def __init__(self, backend: StorageBackend, observe: Callable[[str, float, bool], None]):
+        self.backend = backend
+        self.observe = observe
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
+
+    def _timed(self, op: str, fn: Callable, *args):
+        start = time.perf_counter()
+        failed = True
+        try:
+            result = fn(*args)
+            failed = False
+            return result
+        finally:
+            self.observe(op, time.perf_counter() - start, failed)
+
+    def upload_stream(self, path, chunks, content_type):
+        return self._timed("upload", self.backend.upload_stream, path, chunks, content_type)
+
+    def open_stream(self, path, chunk_size=1024 * 1024):
+        start = time.perf_counter()
+        observed = False
+        try:
+            for chunk in self.backend.open_stream(path, chunk_size):
+                if not observed:
+                    observed = True
+                    self.observe("download", time.perf_counter() - start, False)
+                yield chunk
+        except Exception:
+            if not observed:
+                observed = True
+                self.observe("download", time.perf_counter() - start, True)
+            raise
+        finally:
+            if not observed:  # empty object
+                self.observe("download", time.perf_counter() - start, False)
+
+    def create_signed_url(self, path, expires_in):
+        return self._timed("sign", self.backend.create_signed_url, path, expires_in)
+
+    def create_signed_urls(self, paths, expires_in):
+        return self._timed("sign_batch", self.backend.create_signed_urls, paths, expires_in)
+
+    def create_signed_upload_url(self, path, expires_in, max_bytes):
+        return self._timed(
+            "sign_upload", self.backend.create_signed_upload_url, path, expires_in, max_bytes
+        )
+
+    def stat(self, path):
+        return self._timed("stat", self.backend.stat, path)
+
+    def remove(self, paths):
+        return self._timed("remove", self.backend.remove, paths)
+
+    def ping(self):
+        return self._timed("ping", self.backend.ping)
+
+
+# ---------------- ASYNC WRAPPER ----------------
+
+class AsyncStorage:
+    """
+    Awaitable facade over a blocking backend. Calls run on a dedicated,
+    bounded thread pool (not Starlette's), are cut off after a timeout and
+    retried with exponential backoff on StorageError / timeout.
+    """
+
+    def __init__(
+        self,
+        backend: StorageBackend,
+        max_workers: int = 10,
+        timeout: float = 20,
+        upload_timeout: float = 300,
+        retries: int = 2,
+        backoff: float = 0.25,
+    ):
+        self.backend = backend
+        self.timeout = timeout
+        self.upload_timeout = upload_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="storage"
+        )
+
+    async def _call(
+        self, timeout: float, fn: Callable, *args, retry_timeouts: bool = True
+    ):
+        loop = asyncio.get_running_loop()
+        attempt = 0
+        while True:
+            try:
+                return await asyncio.wait_for(
+                    loop.run_in_executor(self._executor, partial(fn, *args)),
+                    timeout,
+                )
+            except (StorageError, asyncio.TimeoutError) as e:
+                timed_out = isinstance(e, asyncio.TimeoutError)
+                if attempt >= self.retries or (timed_out and not retry_timeouts):
+                    if timed_out:
+                        raise StorageError(f"Storage call timed out after {timeout}s") from e
+                    raise
+            attempt += 1
+            delay = self.backoff * (2 ** (attempt - 1))
+            await asyncio.sleep(delay * random.uniform(0.5, 1.5))
+
+    async def upload_stream(
+        self, path: str, open_chunks: Callable[[], Iterable[bytes]], content_type: str
+    ) -> int:
+        """
+        `open_chunks` must return a fresh iterable each time it is called, so a
+        failed attempt can be retried from the start. A timed-out attempt is
+        not retried: its thread cannot be killed, only told to stop at the
+        next chunk, and a retry would race it on the same source and object.
+        """
+        abandoned = threading.Event()
+
+        def chunks() -> Iterator[bytes]:
+            for chunk in open_chunks():
+                if abandoned.is_set():
+                    raise StorageError("Upload abandoned after timeout")
+                yield chunk
+
+        try:
+            return await self._call(
+                self.upload_timeout,
+                lambda: self.backend.upload_stream(path, chunks(), content_type),
+                retry_timeouts=False,
+            )
+        except StorageError:
+            abandoned.set()
+            raise
+
+    async def create_signed_url(self, path: str, expires_in: int) -> Optional[str]:
+        return await self._call(
+            self.timeout, self.backend.create_signed_url, path, expires_in
+        )
+
+    async def create_signed_urls(
+        self, paths: List[str], expires_in: int
+    ) -> Dict[str, Optional[str]]:
+        return await self._call(
+            self.timeout, self.backend.create_signed_urls, list(paths), expires_in
+        )
+
+    async def remove(self, paths: List[str]) -> None:
+        await self._call(self.timeout, self.backend.remove, list(paths))
+
+    async def ping(self, timeout: float) -> None:
+        """Raise StorageError unless the backend answers within `timeout` (no retries)."""
+        loop = asyncio.get_running_loop()
+        try:
+            await asyncio.wait_for(
+                loop.run_in_executor(self._executor, self.backend.ping), timeout
+            )
+        except asyncio.TimeoutError as e:
+            raise StorageError(f"Storage call timed out after {timeout}s") from e
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
+
+
+# ---------------- SIGNED URL CACHE ----------------
+
+class SignedURLCache:
+    """
+    LRU cache of signed URLs keyed by object path. An entry is reused only
+    while it still has at least `min_remaining` seconds of validity, so
+    clients never get a URL that is about to expire.
+    """
+
+    def __init__(self, max_entries: int = 10000, min_remaining: float = 60):
+        self.max_entries = max_entries
+        self.min_remaining = min_remaining
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, path: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry and entry[1] - time.monotonic() >= self.min_remaining:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return entry[0]
+            if entry:
+                del self._entries[path]
+            self.misses += 1
+            return None
+
+    def put(self, path: str, url: str, expires_in: float) -> None:
+        with self._lock:
+            self._entries[path] = (url, time.monotonic() + expires_in)
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def discard(self, paths: Iterable[str]) -> None:
+        with self._lock:
+            for p in paths:
+                self._entries.pop(p, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+# ---------------- DOWNLOAD DISK CACHE ----------------
+
+class ObjectDiskCache:
+    """
+    Local copies of storage objects, bounded by total bytes, evicting the
+    least recently used. Object paths are never reused for other content,
+    so entries cannot go stale; they leave on eviction or when discarded
+    after a delete. The recency order survives restarts through file mtimes.
+    """
+
+    def __init__(self, root: str, max_bytes: int, max_object_bytes: int):
+        self.root = Path(root).resolve()
+        self.max_bytes = max_bytes
+        self.max_object_bytes = min(max_object_bytes, max_bytes)
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._total = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes_from_cache = 0
+        self.bytes_from_storage = 0
+        self._load()
+
+    def _load(self) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        found = []
+        for f in self.root.iterdir():
+            if f.name.endswith(".part"):
+                f.unlink(missing_ok=True)  # interrupted fill
+            elif f.is_file():
+                st = f.stat()
+                found.append((st.st_mtime, f.name, st.st_size))
+        for _, name, size in sorted(found):
+            self._entries[name] = size
+            self._total += size
+        with self._lock:
+            self._evict(0)
+
+    @staticmethod
+    def _key(path: str) -> str:
+        return hashlib.sha256(path.encode()).hexdigest()
+
+    def cacheable(self, size: int) -> bool:
+        return size <= self.max_object_bytes
+
+    def lookup(self, path: str) -> Optional[Path]:
+        """Cached file for `path` (marked most recently used), or None."""
+        key = self._key(path)
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        target = self.root / key
+        try:
+            os.utime(target)
+        except OSError:
+            pass
+        return target
+
+    def _evict(self, incoming: int) -> None:
+        # Caller holds the lock.
+        while self._entries and self._total + incoming > self.max_bytes:
+            key, size = self._entries.popitem(last=False)
+            (self.root / key).unlink(missing_ok=True)
+            self._total -= size
+            self.evictions += 1
+
+    def _admit(self, key: str, tmp: Path, size: int) -> Path:
+        target = self.root / key
+        with self._lock:
+            if key in self._entries:  # filled concurrently by another request
+                tmp.unlink(missing_ok=True)
+                return target
+            self._evict(size)
+            os.replace(tmp, target)
+            self._entries[key] = size
+            self._total += size
+        return target
+
+    def tee(self, chunks: Iterable[bytes], path: str) -> Iterator[bytes]:
+        """
+        Pass an object's chunks through while writing them to the cache.
+        The entry is only kept if the whole object went through.
+        """
+        key = self._key(path)
+        tmp = self.root / f"{key}.{uuid.uuid4().hex}.part"
+        size = 0
+        try:
+            with open(tmp, "wb") as out:
+                for chunk in chunks:
+                    out.write(chunk)
+                    size += len(chunk)
+                    yield chunk
+            self._admit(key, tmp, size)
+        finally:
+            tmp.unlink(missing_ok=True)
+
+    def fill(self, backend: StorageBackend, path: str) -> Path:
+        """
+        Copy the whole object into the cache (blocking). Returns its file.
+        The copy counts as bytes read from storage; what is then served
+        from the file counts as read from the cache.
+        """
+        size = 0
+        for chunk in self.tee(backend.open_stream(path), path):
+            size += len(chunk)
+        with self._lock:
+            self.bytes_from_storage += size
+        return self.root / self._key(path)
+
+    def discard(self, paths: Iterable[str]) -> None:
+        with self._lock:
+            for p in paths:
+                key = self._key(p)
+                size = self._entries.pop(key, None)
+                if size is not None:
+                    (self.root / key).unlink(missing_ok=True)
+                    self._total -= size
+
+    def counted(self, chunks: Iterable[bytes], from_cache: bool) -> Iterator[bytes]:
+        """Pass chunks through, adding them to the bytes-served counters."""
+        for chunk in chunks:
+            with self._lock:
+                if from_cache:
+                    self.bytes_from_cache += len(chunk)
+                else:
+                    self.bytes_from_storage += len(chunk)
+            yield chunk
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "bytes_from_cache": self.bytes_from_cache,
+                "bytes_from_storage": self.bytes_from_storage,
+            }
@@ -1,4 +1,22 @@
-from supabase import create_client
+"""
+The shared Supabase client, created on first use: importing `supabase`
+alone takes longer than the rest of the app's own modules.
+"""
+
+import threading
+
 from app.config import SUPABASE_URL, SUPABASE_SERVICE_KEY
 
-supabase = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
+_client = None
+_lock = threading.Lock()
+
+
+def get_supabase():
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                from supabase import create_client
+
+                _client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
+    return _client
@@ -0,0 +1,318 @@
+"""
+Resumable multipart uploads: create a session, PUT numbered parts (in any
+order, in parallel), check which parts arrived, then commit into a File.
+"""
+
+import hashlib
+import math
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File as FastAPIFile
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.database import get_db, SessionLocal
+from app.models import UploadSession, UploadPart
+from app.auth import Principal, get_current_user
+from app.usage import check_quota
+from app.compression import Encoder
+from app.config import (
+    MAX_FILE_SIZE_BYTES,
+    UPLOAD_PART_SIZE,
+    UPLOAD_SESSION_TTL_SECONDS,
+)
+from app.files import (
+    storage,
+    async_storage,
+    remove_objects,
+    iter_upload_chunks,
+    hash_chunks,
+    record_upload,
+    file_to_dict,
+)
+
+router = APIRouter(prefix="/api/files/uploads", tags=["uploads"])
+
+
+# ---------------- Schemas ----------------
+
+class CreateSessionBody(BaseModel):
+    filename: str
+    size_bytes: int
+    mime_type: Optional[str] = None
+
+
+# ---------------- Helpers ----------------
+
+def _expiry() -> datetime:
+    return datetime.utcnow() + timedelta(seconds=UPLOAD_SESSION_TTL_SECONDS)
+
+
+def _part_count(s: UploadSession) -> int:
+    return max(1, math.ceil(s.size_bytes / s.part_size))
+
+
+def _part_path(s: UploadSession, part_number: int) -> str:
+    return f"{s.user_id}/.parts/{s.id}/{part_number}"
+
+
+def _expected_part_size(s: UploadSession, part_number: int) -> int:
+    if part_number < _part_count(s) - 1:
+        return s.part_size
+    return s.size_bytes - s.part_size * (_part_count(s) - 1)
+
+
+def _get_session(db: Session, session_id: str, user: Principal) -> UploadSession:
+    s = (
+        db.query(UploadSession)
+        .filter(UploadSession.id == session_id, UploadSession.user_id == user.id)
+        .first()
+    )
+    if not s or s.expires_at < datetime.utcnow():
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    return s
+
+
+def _session_to_dict(s: UploadSession) -> dict:
+    return {
+        "session_id": s.id,
+        "filename": s.original_filename,
+        "size_bytes": s.size_bytes,
+        "part_size": s.part_size,
+        "part_count": _part_count(s),
+        "parts_done": sorted(p.part_number for p in s.parts),
+        "expires_at": s.expires_at.isoformat(),
+    }
+
+
+def _delete_session(db: Session, s: UploadSession) -> List[str]:
+    """Delete the session's rows. Returns its part objects' paths."""
+    paths = [_part_path(s, p.part_number) for p in s.parts]
+    db.delete(s)
+    db.commit()
+    return paths
+
+
+def _discard_session(db: Session, s: UploadSession) -> None:
+    """Delete the session's rows and part objects (ignore failure)."""
+    paths = _delete_session(db, s)
+    if paths:
+        try:
+            storage.remove(paths)
+        except Exception:
+            pass
+
+
+def _abort_session(db: Session, session_id: str, user: Principal) -> List[str]:
+    return _delete_session(db, _get_session(db, session_id, user))
+
+
+def purge_expired_sessions(db: Optional[Session] = None) -> int:
+    """Remove abandoned sessions and their parts. Returns how many were purged."""
+    own_session = db is None
+    db = db or SessionLocal()
+    try:
+        expired = (
+            db.query(UploadSession)
+            .filter(UploadSession.expires_at < datetime.utcnow())
+            .all()
+        )
+        for s in expired:
+            _discard_session(db, s)
+        return len(expired)
+    finally:
+        if own_session:
+            db.close()
+
+
+# ---------------- Routes ----------------
+
+@router.post("/")
+def create_session(
+    body: CreateSessionBody,
+    db: Session = Depends(get_db),
+    user: Principal = Depends(get_current_user),
+):
+    if not body.filename:
+        raise HTTPException(status_code=400, detail="No filename")
+    if body.size_bytes < 0:
+        raise HTTPException(status_code=400, detail="Invalid size")
+    if body.size_bytes > MAX_FILE_SIZE_BYTES:
+        raise HTTPException(status_code=413, detail="File too large")
+    check_quota(db, user.id, body.size_bytes)
+
+    s = UploadSession(
+        id=uuid.uuid4().hex,
+        user_id=user.id,
+        original_filename=body.filename,
+        mime_type=body.mime_type,
+        size_bytes=body.size_bytes,
+        part_size=UPLOAD_PART_SIZE,
+        expires_at=_expiry(),
+    )
+    db.add(s)
+    db.commit()
+    db.refresh(s)
+    return _session_to_dict(s)
+
+
+@router.get("/{session_id}")
+def get_session(
+    session_id: str,
+    db: Session = Depends(get_db),
+    user: Principal = Depends(get_current_user),
+):
+    return _session_to_dict(_get_session(db, session_id, user))
+
+
+@router.put("/{session_id}/parts/{part_number}")
+async def upload_part(
+    session_id: str,
+    part_number: int,
+    file: UploadFile = FastAPIFile(...),
+    db: Session = Depends(get_db),
+    user: Principal = Depends(get_current_user),
+):
+    s = await run_in_threadpool(_get_session, db, session_id, user)
+    if part_number < 0 or part_number >= _part_count(s):
+        raise HTTPException(status_code=400, detail="Invalid part number")
+
+    path, expected = _part_path(s, part_number), _expected_part_size(s, part_number)
+    try:
+        size = await async_storage.upload_stream(
+            path,
+            lambda: iter_upload_chunks(file, limit=expected),
+            "application/octet-stream",
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Upload failed: {e}")
+
+    if size != expected:
+        await remove_objects([path])
+        raise HTTPException(
+            status_code=400,
+            detail=f"Part {part_number} must be {expected} bytes, got {size}",
+        )
+
+    await run_in_threadpool(_record_part, db, s, part_number, size)
+    return {"part_number": part_number, "size_bytes": size}
+
+
+def _record_part(db: Session, s: UploadSession, part_number: int, size: int) -> None:
+    part = (
+        db.query(UploadPart)
+        .filter(UploadPart.session_id == s.id, UploadPart.part_number == part_number)
+        .first()
+    )
+    if part:
+        part.size_bytes = size
+        part.uploaded_at = datetime.utcnow()
+    else:
+        db.add(UploadPart(session_id=s.id, part_number=part_number, size_bytes=size))
+    s.expires_at = _expiry()
+    try:
+        db.commit()
+    except IntegrityError:
+        # The same part was retried concurrently and the other request won.
+        db.rollback()
+
+
+def _complete_session(db: Session, session_id: str, user: Principal) -> UploadSession:
+    """The session, once all of its parts have arrived (409 otherwise)."""
+    s = _get_session(db, session_id, user)
+    done = {p.part_number for p in s.parts}
+    missing = [n for n in range(_part_count(s)) if n not in done]
+    if missing:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Missing parts: {', '.join(map(str, missing))}",
+        )
+    return s
+
+
+@router.post("/{session_id}/commit")
+async def commit_session(
+    session_id: str,
+    db: Session = Depends(get_db),
+    user: Principal = Depends(get_current_user),
+):
+    s = await run_in_threadpool(_complete_session, db, session_id, user)
+    part_paths = [_part_path(s, n) for n in range(_part_count(s))]
+    ext = Path(s.original_filename).suffix
+    stored_name = f"{user.id}/{uuid.uuid4().hex}{ext}"
+
+    attempts = []
+
+    def open_chunks() -> Iterator[bytes]:
+        # Fresh digest and encoder per attempt, since retries restart the stream.
+        digest, encoder = hashlib.sha256(), Encoder(s.mime_type)
+        attempts.append((digest, encoder))
+        parts = (chunk for path in part_paths for chunk in storage.open_stream(path))
+        return encoder.encode(hash_chunks(parts, digest))
+
+    try:
+        await async_storage.upload_stream(
+            stored_name, open_chunks, s.mime_type or "application/octet-stream"
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Commit failed: {e}")
+
+    digest, encoder = attempts[-1]
+    db_file = await run_in_threadpool(
+        _claim_and_record, db, s, user.id, stored_name, digest.hexdigest(), encoder
+    )
+    if db_file is None:
+        await remove_objects([stored_name])
+        raise HTTPException(status_code=409, detail="Upload already committed")
+
+    await remove_objects(part_paths)
+    return file_to_dict(db_file)
+
+
+def _claim_and_record(
+    db: Session, s: UploadSession, user_id: int, stored_name: str, sha256: str, encoder: Encoder
+):
+    """
+    Claim the session in the File row's transaction, so a concurrent or
+    retried commit cannot record the upload twice. None if another commit
+    claimed it first.
+    """
+    session_id, filename, mime_type = s.id, s.original_filename, s.mime_type
+    db.query(UploadPart).filter(UploadPart.session_id == session_id).delete(
+        synchronize_session=False
+    )
+    claimed = db.query(UploadSession).filter(UploadSession.id == session_id).delete(
+        synchronize_session=False
+    )
+    if not claimed:
+        db.rollback()
+        return None
+    return record_upload(
+        db,
+        user_id,
+        filename,
+        stored_name,
+        encoder.logical_size,
+        mime_type,
+        sha256,
+        encoder.encoding,
+        encoder.stored_size,
+    )
+
+
+@router.delete("/{session_id}")
+async def abort_session(
+    session_id: str,
+    db: Session = Depends(get_db),
+    user: Principal = Depends(get_current_user),
+):
+    paths = await run_in_threadpool(_abort_session, db, session_id, user)
+    await remove_objects(paths)
+    return {"aborted": session_id}
@@ -0,0 +1,184 @@
+"""
+Per-user storage counters (bytes used, file count) and quota checks.
+
+The counters live in user_usage and are changed in the same transaction as
+the File rows they describe, so reads never aggregate over files. Run
+`python -m app.usage` to recompute them from the files table and fix drift.
+
+The same row carries the user's change versions, which listing ETags are
+built from (see app.conditional): `version` for files and usage,
+`history_version` for activity.
+"""
+
+from typing import Iterable, List
+
+from fastapi import HTTPException
+from sqlalchemy import exists, func, insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.config import STORAGE_QUOTA_BYTES
+from app.models import File, User, UserUsage
+
+
+def get_usage(db: Session, user_id: int) -> UserUsage:
+    """
+    The user's counters row, created from the files table on first use.
+    A created row is flushed in a savepoint, never committed: it becomes
+    part of the caller's transaction.
+    """
+    usage = db.query(UserUsage).filter(UserUsage.user_id == user_id).first()
+    if usage:
+        return usage
+
+    total, count = (
+        db.query(func.coalesce(func.sum(File.size_bytes), 0), func.count(File.id))
+        .filter(File.user_id == user_id)
+        .one()
+    )
+    try:
+        with db.begin_nested():
+            db.add(UserUsage(user_id=user_id, bytes_used=total, file_count=count))
+    except IntegrityError:
+        pass  # created concurrently
+    return db.query(UserUsage).filter(UserUsage.user_id == user_id).first()
+
+
+def quota_for(usage: UserUsage) -> int:
+    return usage.quota_bytes if usage.quota_bytes is not None else STORAGE_QUOTA_BYTES
+
+
+def check_quota(db: Session, user_id: int, incoming: int) -> None:
+    """Reject (413) an upload of `incoming` bytes that would exceed the quota."""
+    usage = get_usage(db, user_id)
+    if usage.bytes_used + incoming > quota_for(usage):
+        raise HTTPException(status_code=413, detail="Storage quota exceeded")
+
+
+def charge_usage(db: Session, user_id: int, size: int) -> bool:
+    """
+    Add one file of `size` bytes to the counters (not committed), unless that
+    would exceed the quota. The check and the update are a single statement,
+    so concurrent uploads cannot overshoot.
+    """
+    usage = get_usage(db, user_id)
+    return (
+        db.query(UserUsage)
+        .filter(
+            UserUsage.user_id == user_id,
+            UserUsage.bytes_used + size <= quota_for(usage),
+        )
+        .update(
+            {
+                UserUsage.bytes_used: UserUsage.bytes_used + size,
+                UserUsage.file_count: UserUsage.file_count + 1,
+                UserUsage.version: UserUsage.version + 1,
+            },
+            synchronize_session=False,
+        )
+        == 1
+    )
+
+
+def release_usage(db: Session, user_id: int, size: int, files: int = 1) -> None:
+    """Subtract deleted files from the counters (not committed)."""
+    db.query(UserUsage).filter(UserUsage.user_id == user_id).update(
+        {
+            UserUsage.bytes_used: UserUsage.bytes_used - size,
+            UserUsage.file_count: UserUsage.file_count - files,
+            UserUsage.version: UserUsage.version + 1,
+        },
+        synchronize_session=False,
+    )
+
+
+def get_version(db: Session, user_id: int, column=UserUsage.version) -> int:
+    """
+    One of the user's change versions (`column`). Bumps before their
+    counters row exists would be no-ops, which is why every user gets the
+    row when registering (and existing ones from the migrate backfill).
+    """
+    version = db.query(column).filter(UserUsage.user_id == user_id).scalar()
+    if version is None:
+        version = getattr(get_usage(db, user_id), column.key)
+    return version
+
+
+def bump_version(db: Session, user_ids: Iterable[int], column=UserUsage.version) -> None:
+    """Mark what these users' listings behind `column` show as changed (not committed)."""
+    user_ids = set(user_ids)
+    if user_ids:
+        db.query(UserUsage).filter(UserUsage.user_id.in_(user_ids)).update(
+            {column: column + 1}, synchronize_session=False
+        )
+
+
+def backfill_usage(db: Session) -> int:
+    """
+    Create the counters row of every user who has none yet (users from
+    before the counters existed), in one INSERT ... SELECT, so totals
+    summed over user_usage count them and their listing versions can be
+    bumped before they are next seen. Returns how many rows were created.
+    """
+    missing = (
+        select(
+            User.id,
+            func.coalesce(func.sum(File.size_bytes), 0),
+            func.count(File.id),
+        )
+        .select_from(User)
+        .outerjoin(File, File.user_id == User.id)
+        .where(~exists().where(UserUsage.user_id == User.id))
+        .group_by(User.id)
+    )
+    created = db.execute(
+        insert(UserUsage).from_select(["user_id", "bytes_used", "file_count"], missing)
+    ).rowcount
+    db.commit()
+    return created
+
+
+def reconcile_usage(db: Session) -> List[dict]:
+    """Recompute every user's counters from the files table. Returns the drift fixed."""
+    actual = {
+        user_id: (total, count)
+        for user_id, total, count in db.query(
+            File.user_id, func.coalesce(func.sum(File.size_bytes), 0), func.count(File.id)
+        ).group_by(File.user_id)
+    }
+    rows = {u.user_id: u for u in db.query(UserUsage).all()}
+
+    fixed = []
+    for user_id in set(actual) | set(rows):
+        total, count = actual.get(user_id, (0, 0))
+        usage = rows.get(user_id)
+        if usage is None:
+            usage = UserUsage(user_id=user_id, bytes_used=0, file_count=0)
+            db.add(usage)
+        if (usage.bytes_used, usage.file_count) != (total, count):
+            fixed.append({
+                "user_id": user_id,
+                "bytes_used": [usage.bytes_used, total],
+                "file_count": [usage.file_count, count],
+            })
+            usage.bytes_used = total
+            usage.file_count = count
+            usage.version = (usage.version or 0) + 1
+    db.commit()
+    return fixed
+
+
+if __name__ == "__main__":
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        drift = reconcile_usage(db)
+    finally:
+        db.close()
+    for d in drift:
+        print(
+            f"user {d['user_id']}: bytes {d['bytes_used'][0]} -> {d['bytes_used'][1]}, "
+            f"files {d['file_count'][0]} -> {d['file_count'][1]}"
+        )
+    print(f"Reconciled usage counters; {len(drift)} user(s) corrected.")
@@ -0,0 +1,121 @@
+"""
+Shared setup for benchmarks: point the app at throwaway local stand-ins
+(SQLite + local-filesystem storage, or SupabaseStorage over a fake client)
+before `app` is imported, and run it under a real uvicorn server in a
+background thread. Also latency percentiles and RSS sampling.
+"""
+
+import os
+import socket
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+
+
+def offline_env(**overrides) -> str:
+    """Set env vars for an offline run. Returns the scratch directory."""
+    workdir = tempfile.mkdtemp(prefix="skyvault-bench-")
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{workdir}/bench.db")
+    os.environ.setdefault("STORAGE_BACKEND", "local")
+    os.environ.setdefault("LOCAL_STORAGE_DIR", os.path.join(workdir, "storage"))
+    os.environ.setdefault("JWT_SECRET", "benchmark-secret-not-for-production-use")
+    os.environ.setdefault("DB_AUTO_MIGRATE", "true")
+    # Benchmarks drive many users from one address, faster than any real client.
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+    for k, v in overrides.items():
+        os.environ[k] = str(v)
+    return workdir
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(app) -> str:
+    """Serve `app` with uvicorn in a daemon thread. Returns the base URL."""
+    import uvicorn
+
+    port = _free_port()
+    server = uvicorn.Server(
+        uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+    )
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}"
+
+
+def percentiles(samples_ms) -> dict:
+    s = sorted(samples_ms)
+    if not s:
+        return {"n": 0}
+    if len(s) > 1:
+        q = statistics.quantiles(s, n=100, method="inclusive")
+    else:
+        q = [s[0]] * 99
+    return {
+        "n": len(s),
+        "p50": round(q[49], 2),
+        "p95": round(q[94], 2),
+        "p99": round(q[98], 2),
+        "max": round(s[-1], 2),
+    }
+
+
+def rss_bytes(pid="self") -> int:
+    """Resident set size of a process (Linux)."""
+    with open(f"/proc/{pid}/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+class RSSSampler(threading.Thread):
+    """Samples a process's RSS in the background; stop() returns the peak."""
+
+    def __init__(self, pid="self", interval: float = 0.02):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.peak = 0
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.is_set():
+            try:
+                self.peak = max(self.peak, rss_bytes(self.pid))
+            except OSError:
+                return  # process gone
+            time.sleep(self.interval)
+
+    def stop(self) -> int:
+        self._done.set()
+        self.join()
+        return self.peak
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def use_fake_supabase(root: str, latency: float = 0.0) -> None:
+    """
+    Serve storage through SupabaseStorage on a FakeStorageClient under
+    `root`, instead of LocalStorage. Call after importing app.main.
+    """
+    from app import files
+    from app.config import SUPABASE_BUCKET
+    from app.storage import SupabaseStorage
+    from benchmarks.fake_storage import FakeStorageClient
+
+    # files.storage is the metered wrapper every component shares.
+    files.storage.backend = SupabaseStorage(FakeStorageClient(root, latency), SUPABASE_BUCKET)
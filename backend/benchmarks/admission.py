@@ -0,0 +1,163 @@
+"""
+Noisy neighbour: what one greedy client does to everyone else, with
+admission control (RATE_LIMIT_ENABLED) off and on.
+
+Starts the API under uvicorn in a child process for each mode. One
+"greedy" user runs --greedy concurrent workers that poll the file list
+and upload 4-16 MB files as fast as they can (a sync script gone wild);
+meanwhile --polite users each list their files and upload a small file
+about once a second. Reports, per mode, the polite users' latency and
+errors, the greedy user's accepted and rejected (429) requests, and the
+server's peak RSS.
+
+    python -m benchmarks.admission
+    python -m benchmarks.admission --greedy 48 --seconds 20
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import time
+import uuid
+from collections import defaultdict
+from typing import Dict, List
+
+from benchmarks._env import RSSSampler, _free_port, offline_env, percentiles
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MB = 1024 * 1024
+_NOISE = os.urandom(16 * MB)
+
+
+def payload(size: int) -> bytes:
+    return uuid.uuid4().bytes * 4 + _NOISE[: max(0, size - 64)]
+
+
+class Tally:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.status: Dict[int, int] = defaultdict(int)
+        self.failures = 0
+
+    async def timed(self, op: str, request):
+        t0 = time.perf_counter()
+        try:
+            r = await request
+        except Exception:
+            self.failures += 1
+            return None
+        self.latencies[op].append((time.perf_counter() - t0) * 1000)
+        self.status[r.status_code] += 1
+        return r
+
+
+async def register(client) -> dict:
+    r = await client.post("/api/auth/register", json={
+        "email": f"adm-{uuid.uuid4().hex[:12]}@example.com", "password": "benchmark-pw",
+    })
+    r.raise_for_status()
+    return {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+
+async def greedy_worker(client, headers, tally: Tally, deadline: float, rng: random.Random):
+    while time.perf_counter() < deadline:
+        if rng.random() < 0.5:
+            r = await tally.timed("list", client.get("/api/files/", headers=headers))
+        else:
+            size = rng.randint(4 * MB, 16 * MB - 64)
+            r = await tally.timed("upload", client.post(
+                "/api/files/upload", headers=headers,
+                files={"file": ("sync.bin", payload(size), "application/octet-stream")},
+            ))
+        if r is not None and r.status_code == 429:
+            # A well-written client would honour Retry-After; this one barely does.
+            await asyncio.sleep(0.05)
+
+
+async def polite_worker(client, headers, tally: Tally, deadline: float, rng: random.Random):
+    while time.perf_counter() < deadline:
+        await tally.timed("list", client.get("/api/files/", headers=headers))
+        await tally.timed("upload", client.post(
+            "/api/files/upload", headers=headers,
+            files={"file": ("note.txt", payload(rng.randint(4096, 64 * 1024)), "text/plain")},
+        ))
+        await asyncio.sleep(rng.uniform(0.5, 1.5))
+
+
+async def drive(base: str, args, pid: int) -> dict:
+    import httpx
+
+    async with httpx.AsyncClient(
+        base_url=base, timeout=300, limits=httpx.Limits(max_connections=args.greedy + args.polite * 2 + 8)
+    ) as client:
+        for _ in range(600):
+            try:
+                if (await client.get("/")).status_code == 200:
+                    break
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.1)
+        else:
+            raise RuntimeError("server did not start")
+
+        greedy_headers = await register(client)
+        polite_headers = [await register(client) for _ in range(args.polite)]
+        rng = random.Random(args.seed)
+        greedy, polite = Tally(), Tally()
+        sampler = RSSSampler(pid, interval=0.05)
+        sampler.start()
+        deadline = time.perf_counter() + args.seconds
+        await asyncio.gather(
+            *(greedy_worker(client, greedy_headers, greedy, deadline, rng) for _ in range(args.greedy)),
+            *(polite_worker(client, h, polite, deadline, rng) for h in polite_headers),
+        )
+        return {"greedy": greedy, "polite": polite, "peak_rss_mb": sampler.stop() / MB}
+
+
+def run_mode(enabled: bool, args) -> dict:
+    port = _free_port()
+    env = dict(os.environ, RATE_LIMIT_ENABLED="true" if enabled else "false")
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port),
+         "--log-level", "warning"],
+        env=env, cwd=BACKEND,
+    )
+    try:
+        return asyncio.run(drive(f"http://127.0.0.1:{port}", args, proc.pid))
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--greedy", type=int, default=32, help="concurrent workers of the greedy user")
+    ap.add_argument("--polite", type=int, default=4, help="polite users, one worker each")
+    ap.add_argument("--seconds", type=float, default=15)
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+
+    # Each mode gets its own scratch database and storage.
+    for name in ("DATABASE_URL", "LOCAL_STORAGE_DIR"):
+        os.environ.pop(name, None)
+    print(f"{'':<10}{'polite ms p50':>14}{'p95':>9}{'p99':>9}{'errors':>8}"
+          f"{'greedy ok':>11}{'429':>7}{'peak MB':>9}")
+    for enabled in (False, True):
+        offline_env(BCRYPT_ROUNDS=4)
+        result = run_mode(enabled, args)
+        for name in ("DATABASE_URL", "LOCAL_STORAGE_DIR"):
+            os.environ.pop(name)
+        polite, greedy = result["polite"], result["greedy"]
+        p = percentiles([ms for s in polite.latencies.values() for ms in s])
+        polite_errors = polite.failures + sum(n for code, n in polite.status.items() if code >= 400)
+        greedy_ok = sum(n for code, n in greedy.status.items() if code < 400)
+        print(f"{'limits on' if enabled else 'limits off':<10}{p.get('p50', 0):>14}{p.get('p95', 0):>9}"
+              f"{p.get('p99', 0):>9}{polite_errors:>8}{greedy_ok:>11}{greedy.status.get(429, 0):>7}"
+              f"{result['peak_rss_mb']:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
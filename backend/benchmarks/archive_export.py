@@ -0,0 +1,89 @@
+"""
+Throughput and memory of GET /api/files/archive?ids=all.
+
+Fills local-filesystem storage with `--size-mb` of data split across
+`--files` objects, then streams the ZIP export over HTTP and reports MB/s
+and the process's resident memory while streaming (sampled from /proc; the
+server and the client share this process).
+
+    python -m benchmarks.archive_export --size-mb 1024 --files 64
+"""
+
+import argparse
+import os
+import time
+import uuid
+
+from benchmarks._env import offline_env, start_server, rss_bytes, RSSSampler
+
+offline_env()
+
+import httpx  # noqa: E402
+
+from app.database import SessionLocal  # noqa: E402
+from app.files import storage, record_upload  # noqa: E402
+from app.main import app  # noqa: E402
+
+MB = 1024 * 1024
+
+
+def fill_storage(user_id: int, total_mb: int, files: int) -> int:
+    block = os.urandom(MB)
+    per_file = total_mb * MB // files
+    db = SessionLocal()
+    try:
+        for i in range(files):
+            stored = f"{user_id}/{uuid.uuid4().hex}.bin"
+            chunks = (block for _ in range(per_file // MB))
+            size = storage.upload_stream(stored, chunks, "application/octet-stream")
+            record_upload(db, user_id, f"file-{i}.bin", stored, size, None)
+    finally:
+        db.close()
+    return per_file // MB * MB * files
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--size-mb", type=int, default=1024)
+    ap.add_argument("--files", type=int, default=64)
+    args = ap.parse_args()
+
+    base = start_server(app)
+    with httpx.Client(base_url=base, timeout=None) as client:
+        r = client.post(
+            "/api/auth/register",
+            json={"email": "bench@example.com", "password": "benchmark-pw"},
+        )
+        r.raise_for_status()
+        token = r.json()["access_token"]
+        user_id = r.json()["user"]["id"]
+
+        total = fill_storage(user_id, args.size_mb, args.files)
+        baseline = rss_bytes()
+        sampler = RSSSampler()
+        sampler.start()
+
+        received = 0
+        t0 = time.perf_counter()
+        with client.stream(
+            "GET",
+            "/api/files/archive",
+            params={"ids": "all"},
+            headers={"Authorization": f"Bearer {token}"},
+        ) as res:
+            res.raise_for_status()
+            for chunk in res.iter_bytes():
+                received += len(chunk)
+        elapsed = time.perf_counter() - t0
+        peak = sampler.stop()
+
+    print(f"exported {total / MB:.0f} MB in {args.files} files -> {received / MB:.1f} MB zip")
+    print(f"time {elapsed:.2f}s, {received / MB / elapsed:.1f} MB/s")
+    print(
+        f"RSS baseline {baseline / MB:.1f} MB, peak while streaming {peak / MB:.1f} MB "
+        f"(+{(peak - baseline) / MB:.1f} MB)"
+    )
+
+
+if __name__ == "__main__":
+    main()
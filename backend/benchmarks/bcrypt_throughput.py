@@ -0,0 +1,61 @@
+"""
+Login (bcrypt verify) throughput of the PasswordHasher process pool.
+
+Reports logins/sec overall and per worker process (~ per core) for each pool
+size, plus how many requests of an oversized burst get rejected by admission
+control instead of queueing.
+
+    python -m benchmarks.bcrypt_throughput --rounds 12 --workers 1 2 4
+"""
+
+import argparse
+import asyncio
+import time
+
+from app.hashing import PasswordHasher, PoolSaturated, hash_secret
+
+
+async def run(workers: int, rounds: int, logins: int, hashed: str) -> dict:
+    hasher = PasswordHasher(workers=workers, max_pending=logins, rounds=rounds)
+    await hasher.verify("warm-up", hashed)  # start the worker processes
+
+    t0 = time.perf_counter()
+    results = await asyncio.gather(
+        *(hasher.verify("benchmark-password", hashed) for _ in range(logins))
+    )
+    elapsed = time.perf_counter() - t0
+    assert all(ok for ok, _ in results)
+
+    # Burst of 4x the admission limit: the excess must be rejected at once.
+    hasher.max_pending = workers * 2
+    burst = await asyncio.gather(
+        *(hasher.verify("benchmark-password", hashed) for _ in range(workers * 8)),
+        return_exceptions=True,
+    )
+    hasher.close()
+
+    rate = logins / elapsed
+    return {
+        "workers": workers,
+        "logins_per_sec": round(rate, 1),
+        "per_worker": round(rate / workers, 1),
+        "burst_rejected": sum(isinstance(r, PoolSaturated) for r in burst),
+        "burst_size": len(burst),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rounds", type=int, default=12)
+    ap.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    ap.add_argument("--logins", type=int, default=64)
+    args = ap.parse_args()
+
+    hashed = hash_secret("benchmark-password", args.rounds)
+    print(f"bcrypt rounds={args.rounds}, {args.logins} logins per run")
+    for w in args.workers:
+        print(asyncio.run(run(w, args.rounds, args.logins, hashed)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Upload compression: stored bytes and throughput with UPLOAD_COMPRESSION
+off, gzip and zstd, over synthetic corpora (CSV export, JSON log lines,
+plain text, random bytes, and a ZIP that is skipped by type).
+
+For each corpus and mode, uploads --size MB through POST /api/files/upload
+and reports the stored/logical ratio, upload MB/s, and download MB/s for a
+client that decodes itself (Accept-Encoding passthrough) and one that needs
+identity bytes. Deduplication is sidestepped by salting every upload, and
+the download cache is off so every download reads (and decodes) the object.
+
+    python -m benchmarks.compression
+    python -m benchmarks.compression --size 32 --repeat 5
+"""
+
+import argparse
+import json
+import os
+import random
+import time
+
+from benchmarks._env import offline_env, start_server
+
+
+def corpora(size: int) -> dict:
+    rng = random.Random(7)
+    words = [("".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(2, 9))))
+             for _ in range(2000)]
+
+    def fill(line) -> bytes:
+        out, n, i = [], 0, 0
+        while n < size:
+            b = line(i)
+            out.append(b)
+            n += len(b)
+            i += 1
+        return b"".join(out)[:size]
+
+    return {
+        "csv": ("text/csv", fill(lambda i: b"%d,2024-%02d-%02d,%s,%d.%02d\n" % (
+            i, i % 12 + 1, i % 28 + 1, rng.choice(words).encode(), rng.randint(0, 9999), i % 100))),
+        "jsonl": ("application/x-ndjson", fill(lambda i: json.dumps({
+            "ts": 1700000000 + i, "level": rng.choice(["info", "warn", "error"]),
+            "msg": " ".join(rng.choices(words, k=8)), "user": rng.randint(1, 500)}).encode() + b"\n")),
+        "text": ("text/plain", fill(lambda i: (" ".join(rng.choices(words, k=12)) + "\n").encode())),
+        "random": ("application/octet-stream", rng.randbytes(size)),
+        "zip": ("application/zip", rng.randbytes(size)),
+    }
+
+
+def storage_bytes(root: str) -> int:
+    total = 0
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+        total += sum(os.path.getsize(os.path.join(dirpath, f)) for f in filenames)
+    return total
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--size", type=int, default=16, help="MB per upload")
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    workdir = offline_env(BCRYPT_ROUNDS=4, AUTH_CACHE_TTL_SECONDS=60, DOWNLOAD_CACHE_MAX_BYTES=0)
+    os.environ["DOWNLOAD_CACHE_DIR"] = os.path.join(workdir, "download-cache")
+    import httpx
+
+    from app import compression
+    from app.main import app
+
+    root = os.environ["LOCAL_STORAGE_DIR"]
+    base = start_server(app)
+    r = httpx.post(
+        f"{base}/api/auth/register",
+        json={"email": "bench@example.com", "password": "benchmark-pw"},
+    )
+    r.raise_for_status()
+    client = httpx.Client(
+        base_url=base, headers={"Authorization": f"Bearer {r.json()['access_token']}"}, timeout=300
+    )
+    size = args.size * 1024 * 1024
+    mb = size / (1024 * 1024) * args.repeat
+    print(f"scratch: {workdir}")
+    print(f"{'corpus':<9}{'mode':>6}{'ratio':>8}{'up MB/s':>10}{'down enc':>10}{'down id':>10}")
+    for name, (mime, data) in corpora(size).items():
+        for mode in ("off", "gzip", "zstd"):
+            if mode == "zstd" and compression.zstandard is None:
+                continue
+            compression.UPLOAD_COMPRESSION = mode
+            before = storage_bytes(root)
+            ids = []
+            start = time.perf_counter()
+            for i in range(args.repeat):
+                body = data + f"{mode}-{i}".encode()  # defeat dedup
+                up = client.post("/api/files/upload", files={"file": (f"{name}.bin", body, mime)})
+                up.raise_for_status()
+                ids.append(up.json()["id"])
+            up_rate = mb / (time.perf_counter() - start)
+            ratio = (storage_bytes(root) - before) / (size * args.repeat)
+
+            rates = []
+            for accept in ("gzip, zstd", "identity"):
+                start = time.perf_counter()
+                for fid in ids:
+                    with client.stream(
+                        "GET", f"/api/files/{fid}/content", headers={"Accept-Encoding": accept}
+                    ) as resp:
+                        resp.raise_for_status()
+                        for _ in resp.iter_raw():
+                            pass
+                rates.append(mb / (time.perf_counter() - start))
+            print(f"{name:<9}{mode:>6}{ratio:>8.3f}{up_rate:>10.1f}{rates[0]:>10.1f}{rates[1]:>10.1f}")
+            for fid in ids:
+                client.delete(f"/api/files/{fid}").raise_for_status()
+
+
+if __name__ == "__main__":
+    main()
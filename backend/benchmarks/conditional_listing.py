@@ -0,0 +1,72 @@
+"""
+Revalidating a listing: a full 200 against a 304 for a current
+If-None-Match, which skips the listing query and the body.
+
+Seeds --rows files and activity events for one user (json_listing's seed),
+then for each listing measures sequential requests/sec and bytes per
+response over HTTP, with and without the ETag of the previous response.
+
+    python -m benchmarks.conditional_listing
+    python -m benchmarks.conditional_listing --rows 10000 --seconds 5
+"""
+
+import argparse
+import time
+
+from benchmarks._env import offline_env, start_server
+from benchmarks.json_listing import PAGE, seed
+
+
+def measure(client, path: str, params: dict, etag, seconds: float):
+    """(requests/sec, bytes per response body)."""
+    headers = {"If-None-Match": etag} if etag else {}
+    n = size = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        r = client.get(path, params=params, headers=headers)
+        assert r.status_code == (304 if etag else 200), r.status_code
+        size += len(r.content)
+        n += 1
+    return n / (time.perf_counter() - start), size / n
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=10000)
+    ap.add_argument("--seconds", type=float, default=3)
+    args = ap.parse_args()
+
+    offline_env(BCRYPT_ROUNDS=4, AUTH_CACHE_TTL_SECONDS=60)
+
+    import httpx
+
+    from app.main import app
+
+    base = start_server(app)
+    r = httpx.post(
+        f"{base}/api/auth/register",
+        json={"email": "bench-etag@example.com", "password": "benchmark-pw"},
+    )
+    r.raise_for_status()
+    me = r.json()
+    seed(me["user"]["id"], args.rows)
+
+    client = httpx.Client(
+        base_url=base, headers={"Authorization": f"Bearer {me['access_token']}"}, timeout=120
+    )
+    listings = [
+        (f"files ({PAGE} rows)", "/api/files/", {"limit": PAGE}),
+        (f"history ({PAGE} rows)", "/api/auth/history", {"limit": PAGE}),
+        ("storage", "/api/files/storage", {}),
+    ]
+
+    print(f"{'listing':<22}{'':>6}{'req/s':>10}{'bytes':>10}")
+    for name, path, params in listings:
+        etag = client.get(path, params=params).headers["ETag"]
+        for label, tag in (("200", None), ("304", etag)):
+            rps, size = measure(client, path, params, tag, args.seconds)
+            print(f"{name:<22}{label:>6}{rps:>10.0f}{size:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Sync (threadpool) vs async (DB_ASYNC=true) database mode on the hot read
+endpoints: file list, storage summary, history and /me (auth lookup).
+
+Each mode runs in its own process, since the engine is chosen at import.
+Defaults to a throwaway SQLite database; pass --database-url to use a local
+Postgres instead. The auth cache is disabled unless --auth-cache is given,
+so every request performs the user lookup.
+
+    python -m benchmarks.db_modes --concurrency 32 --seconds 5
+    python -m benchmarks.db_modes --database-url postgresql://localhost/bench
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+import uuid
+
+from benchmarks._env import percentiles
+
+ENDPOINTS = ["/api/files/", "/api/files/storage", "/api/auth/history", "/api/auth/me"]
+
+
+async def _load(base: str, token: str, path: str, concurrency: int, seconds: float) -> dict:
+    import httpx
+
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + seconds
+
+    async with httpx.AsyncClient(
+        base_url=base,
+        headers={"Authorization": f"Bearer {token}"},
+        limits=httpx.Limits(max_connections=concurrency),
+        timeout=30,
+    ) as client:
+
+        async def worker():
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                t0 = time.perf_counter()
+                r = await client.get(path)
+                latencies.append((time.perf_counter() - t0) * 1000)
+                if r.status_code != 200:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    return {"rps": round(len(latencies) / elapsed, 1), "errors": errors, **percentiles(latencies)}
+
+
+def run_mode(args) -> None:
+    """Child process: serve the app in one mode and measure every endpoint."""
+    from benchmarks._env import offline_env, start_server
+
+    overrides = {"DB_ASYNC": args.mode == "async", "BCRYPT_ROUNDS": 4}
+    if not args.auth_cache:
+        overrides["AUTH_CACHE_TTL_SECONDS"] = 0
+    if args.database_url:
+        overrides["DATABASE_URL"] = args.database_url
+    offline_env(**overrides)
+
+    import httpx
+
+    from app.database import SessionLocal, pool_stats
+    from app.files import record_upload
+    from app.main import app
+
+    base = start_server(app)
+    r = httpx.post(
+        f"{base}/api/auth/register",
+        json={"email": f"bench-{uuid.uuid4().hex[:8]}@example.com", "password": "benchmark-pw"},
+    )
+    r.raise_for_status()
+    token, user_id = r.json()["access_token"], r.json()["user"]["id"]
+
+    db = SessionLocal()
+    for i in range(args.files):
+        record_upload(db, user_id, f"file-{i}.txt", f"{user_id}/bench-{i}", 1024, "text/plain")
+    db.close()
+
+    results = {
+        path: asyncio.run(_load(base, token, path, args.concurrency, args.seconds))
+        for path in ENDPOINTS
+    }
+    results["pool"] = pool_stats()
+    print(json.dumps(results))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--concurrency", type=int, default=32)
+    ap.add_argument("--seconds", type=float, default=5)
+    ap.add_argument("--files", type=int, default=200)
+    ap.add_argument("--database-url")
+    ap.add_argument("--auth-cache", action="store_true")
+    ap.add_argument("--mode", choices=["sync", "async"], help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.mode:
+        run_mode(args)
+        return
+
+    for mode in ("sync", "async"):
+        out = subprocess.run(
+            [sys.executable, "-m", "benchmarks.db_modes", "--mode", mode, *sys.argv[1:]],
+            capture_output=True,
+            text=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        )
+        if out.returncode != 0:
+            print(out.stderr, file=sys.stderr)
+            sys.exit(out.returncode)
+        results = json.loads(
+            [line for line in out.stdout.splitlines() if line.startswith("{")][-1]
+        )
+        print(f"== {mode} (concurrency {args.concurrency}) ==")
+        for path in ENDPOINTS:
+            r = results[path]
+            print(
+                f"  {path:<22} {r['rps']:>8} req/s  p50 {r['p50']:>7} ms  "
+                f"p99 {r['p99']:>7} ms  errors {r['errors']}"
+            )
+        pool = results["pool"]
+        print(
+            f"  pool checkout wait: avg {pool['wait_avg_ms']} ms, "
+            f"max {pool['wait_max_ms']} ms over {pool['checkouts']} checkouts"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+What an upload costs the API process: proxied (POST /api/files/upload)
+against direct (reserve, PUT to the signed URL, finalize).
+
+The API runs under uvicorn in a child process with SupabaseStorage over
+the filesystem fake (benchmarks.fake_storage), so in the direct flow this
+script plays the browser and hands the bytes to the fake "storage" itself,
+without the API in the path. For each flow, --count uploads of --size MB
+go up from --concurrency clients; reported are wall time, the API
+process's CPU seconds (user + system, from /proc), CPU ms per MB, and its
+peak RSS. Payloads are random, so proxied uploads are not compressed.
+
+    python -m benchmarks.direct_upload
+    python -m benchmarks.direct_upload --size 16 --count 40 --concurrency 8
+"""
+
+import argparse
+import asyncio
+import io
+import os
+import subprocess
+import sys
+import time
+import uuid
+from urllib.parse import parse_qs, urlparse
+
+from benchmarks._env import RSSSampler, _free_port, offline_env
+
+MB = 1024 * 1024
+
+
+def cpu_seconds(pid: int) -> float:
+    """User + system CPU time of a process so far (Linux)."""
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def serve(port: int, bucket_root: str) -> None:
+    offline_env()
+
+    import uvicorn
+
+    from app.main import app
+    from benchmarks._env import use_fake_supabase
+
+    use_fake_supabase(bucket_root)
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+
+async def proxied(client, headers, body: bytes) -> None:
+    r = await client.post(
+        "/api/files/upload", headers=headers,
+        files={"file": (f"{uuid.uuid4().hex}.bin", body, "application/octet-stream")},
+    )
+    r.raise_for_status()
+
+
+async def direct(client, headers, body: bytes, bucket) -> None:
+    r = await client.post("/api/files/direct/", headers=headers, json={
+        "filename": f"{uuid.uuid4().hex}.bin", "size_bytes": len(body),
+        "mime_type": "application/octet-stream",
+    })
+    r.raise_for_status()
+    target = urlparse(r.json()["upload_url"])
+    path = target.path.split(f"/object/upload/sign/{bucket.name}/", 1)[1]
+    token = parse_qs(target.query)["token"][0]
+    # The browser's PUT, straight to storage.
+    await asyncio.to_thread(bucket.upload_to_signed_url, path, token, io.BytesIO(body))
+    f = await client.post(f"/api/files/direct/{r.json()['upload_id']}/finalize", headers=headers)
+    f.raise_for_status()
+
+
+async def drive(base: str, args, pid: int, bucket_root: str) -> dict:
+    import httpx
+
+    from app.config import SUPABASE_BUCKET
+    from benchmarks.fake_storage import FakeStorageClient
+
+    bucket = FakeStorageClient(bucket_root).from_(SUPABASE_BUCKET)
+    async with httpx.AsyncClient(base_url=base, timeout=300) as client:
+        for _ in range(600):
+            try:
+                if (await client.get("/")).status_code == 200:
+                    break
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.1)
+        else:
+            raise RuntimeError("server did not start")
+        r = await client.post("/api/auth/register", json={
+            "email": f"du-{uuid.uuid4().hex[:12]}@example.com", "password": "benchmark-pw",
+        })
+        r.raise_for_status()
+        headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+        noise = os.urandom(args.size * MB)
+
+        results = {}
+        for flow in ("proxied", "direct"):
+            pending = list(range(args.count))
+
+            async def worker():
+                while pending:
+                    pending.pop()
+                    body = uuid.uuid4().bytes + noise[16:]
+                    if flow == "proxied":
+                        await proxied(client, headers, body)
+                    else:
+                        await direct(client, headers, body, bucket)
+
+            sampler = RSSSampler(pid, interval=0.05)
+            sampler.start()
+            cpu0, t0 = cpu_seconds(pid), time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+            results[flow] = {
+                "seconds": time.perf_counter() - t0,
+                "cpu": cpu_seconds(pid) - cpu0,
+                "peak_rss_mb": sampler.stop() / MB,
+            }
+        return results
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--size", type=int, default=8, help="MB per upload")
+    ap.add_argument("--count", type=int, default=24)
+    ap.add_argument("--concurrency", type=int, default=4)
+    ap.add_argument("--serve", type=int, help=argparse.SUPPRESS)  # child: port
+    ap.add_argument("--bucket-root", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    workdir = offline_env()
+    if args.serve:
+        serve(args.serve, args.bucket_root)
+        return
+
+    port = _free_port()
+    bucket_root = os.path.join(workdir, "bucket")
+    child = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.direct_upload", "--serve", str(port),
+         "--bucket-root", bucket_root],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    try:
+        results = asyncio.run(drive(f"http://127.0.0.1:{port}", args, child.pid, bucket_root))
+    finally:
+        child.terminate()
+        child.wait()
+
+    total_mb = args.size * args.count
+    print(f"{args.count} x {args.size} MB, concurrency {args.concurrency}")
+    print(f"{'flow':<9}{'seconds':>9}{'API CPU s':>11}{'CPU ms/MB':>11}{'peak MB':>9}")
+    for flow, r in results.items():
+        print(f"{flow:<9}{r['seconds']:>9.2f}{r['cpu']:>11.2f}"
+              f"{r['cpu'] * 1000 / total_mb:>11.1f}{r['peak_rss_mb']:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
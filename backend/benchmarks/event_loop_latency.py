@@ -0,0 +1,127 @@
+"""
+GET /api/files/ latency while large uploads are in flight.
+
+Storage is a local directory that sleeps per chunk to mimic a remote bucket.
+`--mode async` (default) uses the AsyncStorage executor; `--mode inline`
+calls the backend directly on the event loop, reproducing the old behaviour.
+
+    python -m benchmarks.event_loop_latency --uploads 4 --size-mb 20
+    python -m benchmarks.event_loop_latency --mode inline
+"""
+
+import argparse
+import threading
+import time
+
+from benchmarks._env import offline_env, start_server, percentiles
+
+offline_env()
+
+import httpx  # noqa: E402
+
+from app import files  # noqa: E402
+from app.main import app  # noqa: E402
+from app.storage import LocalStorage  # noqa: E402
+
+
+class SlowLocalStorage(LocalStorage):
+    """LocalStorage that waits `delay` seconds per chunk written."""
+
+    def __init__(self, root, delay: float):
+        super().__init__(root)
+        self.delay = delay
+
+    def upload_stream(self, path, chunks, content_type):
+        def slow():
+            for chunk in chunks:
+                time.sleep(self.delay)
+                yield chunk
+
+        return super().upload_stream(path, slow(), content_type)
+
+
+class InlineStorage:
+    """Same interface as AsyncStorage, but blocks the event loop."""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    async def upload_stream(self, path, open_chunks, content_type):
+        return self.backend.upload_stream(path, open_chunks(), content_type)
+
+    async def create_signed_url(self, path, expires_in):
+        return self.backend.create_signed_url(path, expires_in)
+
+    async def remove(self, paths):
+        self.backend.remove(paths)
+
+    def close(self):
+        pass
+
+
+def poll(client, headers, n, interval=0.02):
+    samples = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        client.get("/api/files/", headers=headers).raise_for_status()
+        samples.append((time.perf_counter() - t0) * 1000)
+        time.sleep(interval)
+    return samples
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--mode", choices=["async", "inline"], default="async")
+    ap.add_argument("--uploads", type=int, default=4)
+    ap.add_argument("--size-mb", type=int, default=20)
+    ap.add_argument("--chunk-delay-ms", type=float, default=25)
+    ap.add_argument("--polls", type=int, default=100)
+    args = ap.parse_args()
+
+    slow = SlowLocalStorage(files.storage.root, args.chunk_delay_ms / 1000)
+    files.async_storage.backend = slow
+    if args.mode == "inline":
+        files.async_storage = InlineStorage(slow)
+
+    base = start_server(app)
+    client = httpx.Client(base_url=base, timeout=600)
+    token = client.post(
+        "/api/auth/register",
+        json={"email": "bench@example.com", "password": "benchmark"},
+    ).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    idle = poll(client, headers, args.polls)
+
+    payload = b"\0" * (args.size_mb * 1024 * 1024)
+
+    def upload(i):
+        with httpx.Client(base_url=base, timeout=600) as c:
+            c.post(
+                "/api/files/upload",
+                files={"file": (f"big-{i}.bin", payload)},
+                headers=headers,
+            ).raise_for_status()
+
+    threads = [
+        threading.Thread(target=upload, args=(i,)) for i in range(args.uploads)
+    ]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    time.sleep(0.5)  # let the multipart bodies arrive and storage writes begin
+    busy = []
+    while any(t.is_alive() for t in threads):
+        busy += poll(client, headers, 5)
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+
+    print(f"mode={args.mode} uploads={args.uploads}x{args.size_mb}MB "
+          f"chunk_delay={args.chunk_delay_ms}ms upload_wall={elapsed:.1f}s")
+    print("GET /api/files/ idle (ms):        ", percentiles(idle))
+    print("GET /api/files/ during uploads (ms):", percentiles(busy))
+
+
+if __name__ == "__main__":
+    main()
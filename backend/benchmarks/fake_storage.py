@@ -0,0 +1,143 @@
+"""
+Filesystem stand-in for the storage3 client that SupabaseStorage drives.
+
+Only the calls SupabaseStorage makes are implemented: get_bucket, from_(bucket)
+with upload / create_signed_url(s) / create_signed_upload_url / remove, and
+session.stream("GET", ...) / session.head(...) on "/object/{bucket}/{path}"
+for downloads and stat. upload_to_signed_url plays the client's PUT to a
+signed upload URL. Each call can sleep `latency`
+seconds first, to stand in for the round trip to a real bucket. With it,
+benchmarks exercise the production backend class instead of LocalStorage.
+"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO, Iterator, List
+
+
+class FakeStorageError(Exception):
+    pass
+
+
+class _Response:
+    def __init__(self, status_code: int, path: Path = None):
+        self.status_code = status_code
+        self._path = path
+        self.headers = {"content-length": str(path.stat().st_size)} if path else {}
+
+    def iter_bytes(self, chunk_size: int = 1024 * 1024) -> Iterator[bytes]:
+        with open(self._path, "rb") as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+
+
+class _Session:
+    def __init__(self, client: "FakeStorageClient"):
+        self.client = client
+
+    @contextmanager
+    def stream(self, method: str, url: str):
+        self.client._round_trip()
+        _, _, bucket, path = url.split("/", 3)  # "/object/{bucket}/{path}"
+        target = self.client._object(bucket, path)
+        yield _Response(200, target) if target.is_file() else _Response(404)
+
+    def head(self, url: str) -> _Response:
+        self.client._round_trip()
+        _, _, bucket, path = url.split("/", 3)
+        target = self.client._object(bucket, path)
+        return _Response(200, target) if target.is_file() else _Response(400)
+
+
+class _Bucket:
+    def __init__(self, client: "FakeStorageClient", name: str):
+        self.client = client
+        self.name = name
+
+    def upload(self, path: str, file: BinaryIO, file_options: dict = None) -> dict:
+        self.client._round_trip()
+        target = self.client._object(self.name, path)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=target.parent)
+        with os.fdopen(fd, "wb") as out:
+            shutil.copyfileobj(file, out, 1024 * 1024)
+        os.replace(tmp, target)
+        return {"Key": f"{self.name}/{path}"}
+
+    def _signed(self, path: str, expires_in: int) -> str:
+        return f"http://fake-storage.invalid/object/sign/{self.name}/{path}?token={uuid.uuid4().hex}"
+
+    def create_signed_url(self, path: str, expires_in: int) -> dict:
+        self.client._round_trip()
+        if not self.client._object(self.name, path).is_file():
+            raise FakeStorageError("Object not found")
+        return {"signedURL": self._signed(path, expires_in)}
+
+    def create_signed_urls(self, paths: List[str], expires_in: int) -> List[dict]:
+        self.client._round_trip()
+        return [
+            {"path": p, "signedURL": self._signed(p, expires_in), "error": None}
+            if self.client._object(self.name, p).is_file()
+            else {"path": p, "signedURL": None, "error": "Object not found"}
+            for p in paths
+        ]
+
+    def create_signed_upload_url(self, path: str) -> dict:
+        self.client._round_trip()
+        token = self.client._upload_token(self.name, path)
+        return {
+            "signed_url": f"http://fake-storage.invalid/object/upload/sign/{self.name}/{path}?token={token}",
+            "token": token,
+            "path": path,
+        }
+
+    def upload_to_signed_url(self, path: str, token: str, file: BinaryIO) -> dict:
+        if token != self.client._upload_token(self.name, path):
+            raise FakeStorageError("Invalid signature")
+        if self.client._object(self.name, path).exists():
+            raise FakeStorageError("The resource already exists")
+        return self.upload(path, file)
+
+    def remove(self, paths: List[str]) -> List[dict]:
+        self.client._round_trip()
+        for p in paths:
+            self.client._object(self.name, p).unlink(missing_ok=True)
+        return [{"name": p} for p in paths]
+
+
+class FakeStorageClient:
+    def __init__(self, root: str, latency: float = 0.0):
+        self.root = Path(root)
+        self.latency = latency
+        self.session = _Session(self)
+
+    def _round_trip(self) -> None:
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _object(self, bucket: str, path: str) -> Path:
+        target = (self.root / bucket / path).resolve()
+        if self.root.resolve() not in target.parents:
+            raise FakeStorageError(f"Invalid object path: {path}")
+        return target
+
+    def _upload_token(self, bucket: str, path: str) -> str:
+        # Derived, not stored, so another client over the same root (the
+        # benchmark playing the browser) can use URLs this one signed.
+        return hashlib.sha256(f"{self.root.resolve()}/{bucket}/{path}".encode()).hexdigest()
+
+    def from_(self, bucket: str) -> _Bucket:
+        return _Bucket(self, bucket)
+
+    def get_bucket(self, bucket: str) -> dict:
+        self._round_trip()
+        return {"id": bucket, "name": bucket}
@@ -0,0 +1,133 @@
+"""
+GET /api/files/search latency with many files per user.
+
+Seeds --files rows for the benchmark user (plus as many for other users)
+straight into the database, then times substring, prefix and extension
+searches, first through the trigram index and then with the index
+bypassed (a scan of the user's names), for comparison.
+
+    python -m benchmarks.filename_search --files 100000
+    python -m benchmarks.filename_search --database-url postgresql://localhost/bench
+"""
+
+import argparse
+import random
+import time
+import uuid
+
+from benchmarks._env import offline_env, start_server, percentiles
+
+WORDS = [
+    "report", "invoice", "photo", "scan", "budget", "notes", "draft", "final",
+    "meeting", "contract", "backup", "summary", "design", "slides", "export",
+    "holiday", "receipt", "resume", "plan", "data", "archive", "project",
+]
+EXTENSIONS = ["pdf", "docx", "xlsx", "jpg", "png", "txt", "csv", "zip", "mp4", "pptx"]
+
+QUERIES = {
+    "substring (rare)": {"q": "quarterly-7"},
+    "substring (common)": {"q": "invoice"},
+    "two words": {"q": "budget final"},
+    "prefix": {"prefix": "contract_2"},
+    "extension": {"ext": "pptx"},
+    "word + extension": {"q": "receipt", "ext": "pdf,jpg"},
+}
+
+
+def random_name(rng: random.Random, i: int) -> str:
+    words = rng.sample(WORDS, rng.randint(1, 3))
+    if i % 997 == 0:
+        words.append(f"quarterly-{i % 10}")
+    return f"{'_'.join(words)}_{rng.randint(2000, 2030)}_{i}.{rng.choice(EXTENSIONS)}"
+
+
+def seed(user_ids, per_user: int) -> None:
+    from sqlalchemy import insert
+
+    from app.database import SessionLocal
+    from app.models import File
+
+    rng = random.Random(42)
+    db = SessionLocal()
+    try:
+        for user_id in user_ids:
+            for start in range(0, per_user, 10000):
+                db.execute(insert(File), [
+                    {
+                        "user_id": user_id,
+                        "original_filename": random_name(rng, i),
+                        "stored_filename": f"{user_id}/{uuid.uuid4().hex}",
+                        "size_bytes": 1024,
+                        "mime_type": "application/octet-stream",
+                    }
+                    for i in range(start, min(start + 10000, per_user))
+                ])
+            db.commit()
+    finally:
+        db.close()
+
+
+def measure(client, runs: int) -> dict:
+    results = {}
+    for label, params in QUERIES.items():
+        samples, hits = [], 0
+        for _ in range(runs):
+            t0 = time.perf_counter()
+            r = client.get("/api/files/search", params={**params, "limit": 50})
+            samples.append((time.perf_counter() - t0) * 1000)
+            r.raise_for_status()
+            hits = len(r.json())
+        results[label] = {"results": hits, **percentiles(samples)}
+    return results
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--files", type=int, default=100000, help="files per user")
+    ap.add_argument("--runs", type=int, default=30)
+    ap.add_argument("--database-url")
+    args = ap.parse_args()
+
+    overrides = {"BCRYPT_ROUNDS": 4}
+    if args.database_url:
+        overrides["DATABASE_URL"] = args.database_url
+    offline_env(**overrides)
+
+    import httpx
+
+    from app import search
+    from app.main import app
+
+    base = start_server(app)
+    users = []
+    for _ in range(2):
+        r = httpx.post(
+            f"{base}/api/auth/register",
+            json={"email": f"bench-{uuid.uuid4().hex[:8]}@example.com", "password": "benchmark-pw"},
+        )
+        r.raise_for_status()
+        users.append(r.json())
+
+    t0 = time.perf_counter()
+    seed([u["user"]["id"] for u in users], args.files)
+    print(f"seeded {args.files} files x {len(users)} users in {time.perf_counter() - t0:.1f}s")
+
+    client = httpx.Client(
+        base_url=base,
+        headers={"Authorization": f"Bearer {users[0]['access_token']}"},
+        timeout=120,
+    )
+    indexed = measure(client, args.runs)
+    search.MIN_INDEXED_TERM = 10 ** 9  # SQLite: skip the FTS table
+    scanned = measure(client, max(3, args.runs // 5))
+
+    print(f"{'query':<22}{'results':>8}{'indexed p50':>13}{'p95':>9}{'scan p50':>11}")
+    for label in QUERIES:
+        i, s = indexed[label], scanned[label]
+        print(f"{label:<22}{i['results']:>8}{i['p50']:>11}ms{i['p95']:>7}ms{s['p50']:>9}ms")
+    if args.database_url:
+        print("(Postgres: the pg_trgm index is always used; the scan column is not a baseline)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""
+Response path cost of the big listings: column-only queries + orjson (+
+streaming for the user list) against the previous entity + jsonable_encoder
++ json module path, which this script mounts next to the real routes.
+
+Seeds --rows users and --rows files/activity events for one user, then for
+each listing measures sequential requests/sec over HTTP and, in process,
+the peak memory traced (tracemalloc) while one request is served.
+
+    python -m benchmarks.json_listing
+    python -m benchmarks.json_listing --rows 10000 --seconds 5
+"""
+
+import argparse
+import asyncio
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta
+from typing import List
+
+from benchmarks._env import offline_env, start_server
+
+PAGE = 500  # the largest page list_files / history serve
+
+
+def seed(user_id: int, rows: int) -> None:
+    from sqlalchemy import insert
+
+    from app.database import SessionLocal
+    from app.models import Activity, File, User
+
+    start = datetime.utcnow() - timedelta(days=30)
+    db = SessionLocal()
+    try:
+        for lo in range(0, rows, 5000):
+            hi = min(lo + 5000, rows)
+            db.execute(insert(User), [
+                {"email": f"user-{i}@example.com", "hashed_password": "x", "full_name": f"User {i}",
+                 "created_at": start + timedelta(seconds=i)}
+                for i in range(lo, hi)
+            ])
+            db.execute(insert(File), [
+                {"user_id": user_id, "original_filename": f"document-{i}.pdf",
+                 "stored_filename": f"{user_id}/{uuid.uuid4().hex}.pdf", "size_bytes": 1000 + i,
+                 "mime_type": "application/pdf", "uploaded_at": start + timedelta(seconds=i)}
+                for i in range(lo, hi)
+            ])
+            db.execute(insert(Activity), [
+                {"user_id": user_id, "action": "upload", "filename": f"document-{i}.pdf",
+                 "created_at": start + timedelta(seconds=i)}
+                for i in range(lo, hi)
+            ])
+        db.commit()
+    finally:
+        db.close()
+
+
+def mount_legacy_routes(app) -> None:
+    """The listings as they were: ORM entities, isoformat(), jsonable_encoder, json."""
+    from fastapi import Depends
+    from fastapi.responses import JSONResponse
+    from sqlalchemy.orm import Session
+
+    from app.activity import visible_activity
+    from app.auth import Principal, get_current_user, require_admin
+    from app.database import DBRunner, get_db, get_runner
+    from app.models import Activity, File, User
+    from app.pagination import keyset_page
+
+    def files_page(db, user_id, limit):
+        files, _ = keyset_page(
+            db.query(File).filter(File.user_id == user_id), File.uploaded_at, File.id, "desc", limit
+        )
+        return [
+            {
+                "id": f.id,
+                "original_filename": f.original_filename,
+                "size_bytes": f.size_bytes,
+                "uploaded_at": f.uploaded_at.isoformat(),
+                "preview": (
+                    {"kind": f.preview_kind, "url": f"/api/files/{f.id}/preview"}
+                    if f.preview_path
+                    else None
+                ),
+            }
+            for f in files
+        ]
+
+    def history_page(db, user_id, limit):
+        activities, _ = keyset_page(
+            visible_activity(db, user_id), Activity.created_at, Activity.id, "desc", limit
+        )
+        return [
+            {
+                "id": a.id,
+                "action": a.action,
+                "filename": a.filename,
+                "created_at": a.created_at.isoformat() if a.created_at else None,
+            }
+            for a in activities
+        ]
+
+    @app.get("/legacy/files", response_class=JSONResponse)
+    async def legacy_files(
+        limit: int = PAGE,
+        db: DBRunner = Depends(get_runner),
+        user: Principal = Depends(get_current_user),
+    ) -> List[dict]:
+        return await db.run(files_page, user.id, limit)
+
+    @app.get("/legacy/history", response_class=JSONResponse)
+    async def legacy_history(
+        limit: int = PAGE,
+        db: DBRunner = Depends(get_runner),
+        user: Principal = Depends(get_current_user),
+    ) -> List[dict]:
+        return await db.run(history_page, user.id, limit)
+
+    @app.get("/legacy/users", response_class=JSONResponse)
+    def legacy_users(
+        db: Session = Depends(get_db),
+        user: Principal = Depends(require_admin),
+    ) -> List[dict]:
+        users = db.query(User).order_by(User.created_at.desc()).all()
+        return [
+            {
+                "id": u.id,
+                "email": u.email,
+                "full_name": u.full_name,
+                "is_admin": u.is_admin,
+                "created_at": u.created_at.isoformat() if u.created_at else None,
+            }
+            for u in users
+        ]
+
+
+def requests_per_second(client, path: str, params: dict, seconds: float) -> float:
+    n = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        client.get(path, params=params).raise_for_status()
+        n += 1
+    return n / (time.perf_counter() - start)
+
+
+async def peak_memory(app, headers: dict, path: str, params: dict) -> float:
+    """MB traced at peak while the app serves one request in process."""
+    import httpx
+
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://bench", headers=headers
+    ) as client:
+        (await client.get(path, params=params)).raise_for_status()  # warm caches
+        tracemalloc.start()
+        try:
+            (await client.get(path, params=params)).raise_for_status()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    return peak / (1024 * 1024)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=10000)
+    ap.add_argument("--seconds", type=float, default=3)
+    args = ap.parse_args()
+
+    offline_env(BCRYPT_ROUNDS=4, AUTH_CACHE_TTL_SECONDS=60)
+
+    import httpx
+
+    from app.database import SessionLocal
+    from app.main import app
+    from app.models import User
+
+    mount_legacy_routes(app)
+    base = start_server(app)
+    r = httpx.post(
+        f"{base}/api/auth/register",
+        json={"email": "bench-admin@example.com", "password": "benchmark-pw"},
+    )
+    r.raise_for_status()
+    me = r.json()
+    db = SessionLocal()
+    db.query(User).filter(User.id == me["user"]["id"]).update({User.is_admin: True})
+    db.commit()
+    db.close()
+    seed(me["user"]["id"], args.rows)
+
+    headers = {"Authorization": f"Bearer {me['access_token']}"}
+    client = httpx.Client(base_url=base, headers=headers, timeout=120)
+    listings = [
+        (f"files ({PAGE} rows)", "/legacy/files", "/api/files/", {"limit": PAGE}),
+        (f"history ({PAGE} rows)", "/legacy/history", "/api/auth/history", {"limit": PAGE}),
+        (f"admin users ({args.rows + 1} rows)", "/legacy/users", "/api/admin/users", {}),
+    ]
+
+    print(f"{'listing':<26}{'':>8}{'req/s':>10}{'peak MB':>10}")
+    for label, old, new, params in listings:
+        assert client.get(old, params=params).json() == client.get(new, params=params).json()
+        for name, path in (("before", old), ("after", new)):
+            rps = requests_per_second(client, path, params, args.seconds)
+            peak = asyncio.run(peak_memory(app, headers, path, params))
+            print(f"{label if name == 'before' else '':<26}{name:>8}{rps:>10.1f}{peak:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,393 @@
+"""
+Mixed-workload load test of the whole API, offline.
+
+Boots app.main:app under uvicorn in a child process against SQLite (or
+--database-url, e.g. a local Postgres) and either local-filesystem storage
+or SupabaseStorage over a filesystem fake of the storage client
+(--storage fake-supabase, with --storage-latency-ms per call). Then runs
+each scenario for --seconds with --concurrency clients:
+
+    auth      logins, with occasional registrations (bcrypt bound)
+    upload    uploads of 4 KB - 16 MB, mostly small
+    browse    file list, history and storage summary polling
+    download  download link + proxied content, read to the end
+    delete    deleting files uploaded during (untimed) setup
+    mixed     all of the above at once, weighted like real use
+
+For every scenario it reports throughput, errors, p50/p95/p99 latency per
+operation and the server's peak RSS. Results are written as JSON (see
+--out); --compare prints the change against an earlier results file.
+
+    python -m benchmarks.loadtest
+    python -m benchmarks.loadtest --scenarios browse,download --seconds 20
+    python -m benchmarks.loadtest --storage fake-supabase --storage-latency-ms 30
+    python -m benchmarks.loadtest --compare benchmarks/results/loadtest-abc123-....json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List
+
+from benchmarks._env import RSSSampler, git_revision, percentiles, rss_bytes
+
+SCENARIOS = ["auth", "upload", "browse", "download", "delete", "mixed"]
+MIXED_WEIGHTS = {"browse": 50, "download": 20, "upload": 15, "delete": 10, "auth": 5}
+PASSWORD = "loadtest-password"
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+MB = 1024 * 1024
+
+# Payloads are slices of one random buffer, each with a unique prefix so
+# deduplication does not turn uploads into no-ops.
+_NOISE = os.urandom(16 * MB)
+
+
+def upload_size(rng: random.Random) -> int:
+    r = rng.random()
+    if r < 0.70:
+        return rng.randint(4 * 1024, 64 * 1024)
+    if r < 0.95:
+        return rng.randint(256 * 1024, 2 * MB)
+    return rng.randint(8 * MB, 16 * MB - 64)
+
+
+def payload(size: int) -> bytes:
+    return uuid.uuid4().bytes * 4 + _NOISE[: max(0, size - 64)]
+
+
+# ---------------- SERVER (child process) ----------------
+
+def serve(args) -> None:
+    from benchmarks._env import offline_env, use_fake_supabase
+
+    overrides = {"DOWNLOAD_MODE": "proxy"}
+    if args.database_url:
+        overrides["DATABASE_URL"] = args.database_url
+    if args.bcrypt_rounds:
+        overrides["BCRYPT_ROUNDS"] = args.bcrypt_rounds
+    workdir = offline_env(**overrides)
+
+    import uvicorn
+
+    from app.main import app
+
+    if args.storage == "fake-supabase":
+        use_fake_supabase(os.path.join(workdir, "bucket"), args.storage_latency_ms / 1000)
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+def start_child(args) -> subprocess.Popen:
+    cmd = [
+        sys.executable, "-m", "benchmarks.loadtest", "--serve", "--port", str(args.port),
+        "--storage", args.storage, "--storage-latency-ms", str(args.storage_latency_ms),
+    ]
+    if args.database_url:
+        cmd += ["--database-url", args.database_url]
+    if args.bcrypt_rounds:
+        cmd += ["--bcrypt-rounds", str(args.bcrypt_rounds)]
+    return subprocess.Popen(cmd, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+# ---------------- CLIENT ----------------
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.bytes = 0
+
+    async def timed(self, op: str, request):
+        t0 = time.perf_counter()
+        try:
+            res = await request
+        except Exception:
+            self.errors[op] += 1
+            return None
+        self.latencies[op].append((time.perf_counter() - t0) * 1000)
+        if res.status_code >= 400:
+            self.errors[op] += 1
+            return None
+        return res
+
+
+class Workload:
+    def __init__(self, client, users: List[dict], rng: random.Random):
+        self.client = client
+        self.users = users
+        self.rng = rng
+        # File ids uploaded by the workload that nobody has deleted yet.
+        self.files: Dict[int, List[int]] = defaultdict(list)
+        self.deleted = set()
+
+    def _user(self) -> dict:
+        return self.rng.choice(self.users)
+
+    @staticmethod
+    def _auth(user) -> dict:
+        return {"Authorization": f"Bearer {user['token']}"}
+
+    async def auth(self, rec: Recorder) -> None:
+        if self.rng.random() < 0.1:
+            await rec.timed("register", self.client.post(
+                "/api/auth/register",
+                json={"email": f"lt-{uuid.uuid4().hex[:12]}@example.com", "password": PASSWORD},
+            ))
+        else:
+            await rec.timed("login", self.client.post(
+                "/api/auth/login",
+                json={"email": self._user()["email"], "password": PASSWORD},
+            ))
+
+    async def upload(self, rec: Recorder, size: int = None) -> None:
+        user = self._user()
+        size = size or upload_size(self.rng)
+        res = await rec.timed("upload", self.client.post(
+            "/api/files/upload",
+            files={"file": (f"lt-{size}.bin", payload(size), "application/octet-stream")},
+            headers=self._auth(user),
+        ))
+        if res is not None:
+            rec.bytes += size
+            self.files[user["id"]].append(res.json()["id"])
+
+    async def browse(self, rec: Recorder) -> None:
+        h = self._auth(self._user())
+        await rec.timed("list", self.client.get("/api/files/", params={"limit": 50}, headers=h))
+        await rec.timed("history", self.client.get("/api/auth/history", params={"limit": 50}, headers=h))
+        await rec.timed("storage", self.client.get("/api/files/storage", headers=h))
+
+    async def download(self, rec: Recorder) -> None:
+        user = self._user()
+        if not self.files[user["id"]]:
+            return await self.browse(rec)
+        file_id = self.rng.choice(self.files[user["id"]])
+        h = self._auth(user)
+        res = await rec.timed("download_link", self.client.get(
+            f"/api/files/{file_id}/download", headers=h
+        ))
+        if res is None:
+            if file_id in self.deleted:
+                rec.errors["download_link"] -= 1  # lost a race with a delete: expected
+            return
+
+        async def fetch():
+            size = 0
+            async with self.client.stream("GET", res.json()["url"]) as body:
+                async for chunk in body.aiter_bytes():
+                    size += len(chunk)
+            rec.bytes += size
+            return body
+
+        await rec.timed("download_content", fetch())
+
+    async def delete(self, rec: Recorder) -> None:
+        user = self._user()
+        if not self.files[user["id"]]:
+            return
+        file_id = self.files[user["id"]].pop(self.rng.randrange(len(self.files[user["id"]])))
+        self.deleted.add(file_id)
+        await rec.timed("delete", self.client.delete(
+            f"/api/files/{file_id}", headers=self._auth(user)
+        ))
+
+    async def mixed(self, rec: Recorder) -> None:
+        ops, weights = zip(*MIXED_WEIGHTS.items())
+        await getattr(self, self.rng.choices(ops, weights)[0])(rec)
+
+
+async def setup_users(client, n: int) -> List[dict]:
+    users = []
+    for _ in range(n):
+        email = f"lt-{uuid.uuid4().hex[:12]}@example.com"
+        r = await client.post("/api/auth/register", json={"email": email, "password": PASSWORD})
+        r.raise_for_status()
+        body = r.json()
+        users.append({"email": email, "token": body["access_token"], "id": body["user"]["id"]})
+    return users
+
+
+async def run_scenario(name: str, work: Workload, args, pid: int) -> dict:
+    rec = Recorder()
+    if name in ("download", "delete", "mixed"):
+        # Make sure there is something to fetch and delete (not timed).
+        need = args.concurrency * (8 if name == "delete" else 2)
+        await asyncio.gather(*(
+            work.upload(Recorder(), work.rng.randint(4 * 1024, 256 * 1024)) for _ in range(need)
+        ))
+
+    action = getattr(work, name)
+    deadline = time.perf_counter() + args.seconds
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            await action(rec)
+
+    sampler = RSSSampler(pid, interval=0.05)
+    sampler.start()
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - t0
+    peak = sampler.stop()
+
+    all_ms = [ms for samples in rec.latencies.values() for ms in samples]
+    return {
+        "seconds": round(elapsed, 2),
+        "ops": len(all_ms),
+        "ops_per_s": round(len(all_ms) / elapsed, 1),
+        "errors": sum(rec.errors.values()),
+        "mb_per_s": round(rec.bytes / MB / elapsed, 2),
+        "peak_rss_mb": round(peak / MB, 1),
+        "latency_ms": percentiles(all_ms),
+        "by_op": {
+            op: {
+                "ops_per_s": round(len(samples) / elapsed, 1),
+                "errors": rec.errors.get(op, 0),
+                **percentiles(samples),
+            }
+            for op, samples in sorted(rec.latencies.items())
+        },
+    }
+
+
+async def drive(args, pid: int) -> dict:
+    import httpx
+
+    base = f"http://127.0.0.1:{args.port}"
+    async with httpx.AsyncClient(
+        base_url=base,
+        timeout=300,
+        limits=httpx.Limits(max_connections=args.concurrency * 2),
+    ) as client:
+        for _ in range(600):
+            try:
+                if (await client.get("/")).status_code == 200:
+                    break
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.1)
+        else:
+            raise RuntimeError("server did not start")
+
+        work = Workload(client, await setup_users(client, args.users), random.Random(args.seed))
+        results = {}
+        for name in args.scenarios:
+            results[name] = await run_scenario(name, work, args, pid)
+            print_scenario(name, results[name])
+        return results
+
+
+# ---------------- REPORTING ----------------
+
+def print_scenario(name: str, r: dict) -> None:
+    lat = r["latency_ms"]
+    print(
+        f"{name:<9} {r['ops_per_s']:>8} ops/s  p50 {lat.get('p50', '-'):>8} ms  "
+        f"p95 {lat.get('p95', '-'):>8} ms  p99 {lat.get('p99', '-'):>8} ms  "
+        f"errors {r['errors']:>4}  {r['mb_per_s']:>7} MB/s  peak RSS {r['peak_rss_mb']} MB"
+    )
+    for op, o in r["by_op"].items():
+        print(f"    {op:<17} {o['ops_per_s']:>8} ops/s  p50 {o['p50']:>8} ms  p99 {o['p99']:>8} ms")
+
+
+def _change(new, old) -> str:
+    if not old:
+        return "    n/a"
+    return f"{(new - old) / old * 100:+6.1f}%"
+
+
+def compare(current: dict, baseline_path: str) -> None:
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nvs {baseline['meta']['revision']} ({baseline['meta']['timestamp']}):")
+    for name, r in current["scenarios"].items():
+        old = baseline["scenarios"].get(name)
+        if not old:
+            continue
+        print(
+            f"{name:<9} ops/s {_change(r['ops_per_s'], old['ops_per_s'])}  "
+            f"p50 {_change(r['latency_ms'].get('p50'), old['latency_ms'].get('p50'))}  "
+            f"p99 {_change(r['latency_ms'].get('p99'), old['latency_ms'].get('p99'))}  "
+            f"peak RSS {_change(r['peak_rss_mb'], old['peak_rss_mb'])}"
+        )
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--scenarios", default=",".join(SCENARIOS),
+                    help=f"comma-separated subset of {','.join(SCENARIOS)}")
+    ap.add_argument("--seconds", type=float, default=10, help="per scenario")
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--users", type=int, default=20)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--database-url")
+    ap.add_argument("--storage", choices=["local", "fake-supabase"], default="local")
+    ap.add_argument("--storage-latency-ms", type=float, default=0)
+    ap.add_argument("--bcrypt-rounds", type=int, help="default: the app's BCRYPT_ROUNDS")
+    ap.add_argument("--out", help="results file (default: benchmarks/results/loadtest-<rev>-<time>.json)")
+    ap.add_argument("--compare", help="earlier results file to compare against")
+    ap.add_argument("--port", type=int, default=0)
+    ap.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    args.scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        ap.error(f"unknown scenario(s): {', '.join(sorted(unknown))}")
+    if not args.port:
+        from benchmarks._env import _free_port
+
+        args.port = _free_port()
+
+    child = start_child(args)
+    try:
+        results = asyncio.run(drive(args, child.pid))
+        final_rss = rss_bytes(child.pid)
+    finally:
+        child.terminate()
+        child.wait(timeout=30)
+
+    revision = git_revision()
+    report = {
+        "meta": {
+            "revision": revision,
+            "timestamp": datetime.utcnow().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "database": (args.database_url or "sqlite").split(":", 1)[0],
+            "storage": args.storage,
+            "storage_latency_ms": args.storage_latency_ms,
+            "seconds": args.seconds,
+            "concurrency": args.concurrency,
+            "users": args.users,
+            "bcrypt_rounds": args.bcrypt_rounds,
+            "final_rss_mb": round(final_rss / MB, 1),
+        },
+        "scenarios": results,
+    }
+    out = args.out or os.path.join(
+        RESULTS_DIR, f"loadtest-{revision}-{datetime.utcnow():%Y%m%d-%H%M%S}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nresults written to {out}")
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
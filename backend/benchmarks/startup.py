@@ -0,0 +1,145 @@
+"""
+Cold-start cost: how long `import app.main` takes and how soon a freshly
+started server answers.
+
+Every run is a fresh interpreter:
+
+- import: `import app.main` timed in a child process, with local storage
+  and with STORAGE_BACKEND=supabase (placeholder credentials, nothing is
+  contacted), which shows what the storage SDK adds when built up front;
+- serve: uvicorn started in a child process, timed from spawn until GET /
+  (first response) and GET /readyz (database and storage reachable)
+  answer 200.
+
+The schema is migrated once beforehand, so startup does not include it.
+Prints medians and p95 over --runs, then the slowest modules by import
+self time (-X importtime).
+
+    python -m benchmarks.startup
+    python -m benchmarks.startup --runs 10 --top 15
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks._env import _free_port, offline_env, percentiles
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORT_SNIPPET = (
+    "import time; t = time.perf_counter(); import app.main; "
+    "print((time.perf_counter() - t) * 1000)"
+)
+
+
+def storage_env(storage: str) -> dict:
+    env = dict(os.environ)
+    if storage == "supabase":
+        env.update(
+            STORAGE_BACKEND="supabase",
+            SUPABASE_URL="http://127.0.0.1:9",
+            SUPABASE_SERVICE_KEY="placeholder",
+        )
+    return env
+
+
+def _python(*args, env=None) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, *args], env=env, cwd=BACKEND,
+        capture_output=True, text=True, check=True,
+    )
+
+
+def time_import(env: dict) -> float:
+    return float(_python("-c", IMPORT_SNIPPET, env=env).stdout.split()[-1])
+
+
+def slowest_imports(env: dict, top: int):
+    """(self ms, cumulative ms, module) of the `top` slowest imports."""
+    rows = []
+    for line in _python("-X", "importtime", "-c", "import app.main", env=env).stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((int(own) / 1000, int(cumulative) / 1000, name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def _wait_for(client, url: str, start: float, deadline: float):
+    """ms from `start` until `url` answers 200; None if the route is missing."""
+    import httpx
+
+    while time.perf_counter() < deadline:
+        try:
+            r = client.get(url)
+        except httpx.TransportError:
+            time.sleep(0.005)
+            continue
+        if r.status_code == 200:
+            return (time.perf_counter() - start) * 1000
+        if r.status_code == 404:
+            return None
+        time.sleep(0.005)
+    raise RuntimeError(f"{url} did not become available")
+
+
+def time_serve(env: dict) -> dict:
+    import httpx
+
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port),
+         "--log-level", "warning"],
+        env=env, cwd=BACKEND,
+    )
+    try:
+        with httpx.Client(timeout=5) as client:
+            deadline = start + 60
+            first = _wait_for(client, f"{base}/", start, deadline)
+            ready = _wait_for(client, f"{base}/readyz", start, deadline)
+    finally:
+        proc.terminate()
+        proc.wait()
+    return {"first": first, "ready": ready}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--top", type=int, default=10, help="slowest imports to list")
+    args = ap.parse_args()
+
+    offline_env(DB_AUTO_MIGRATE="false")
+    try:
+        _python("-m", "app.migrate")
+    except subprocess.CalledProcessError:
+        pass  # no app.migrate (older tree): the app creates the schema itself
+    time_import(storage_env("local"))  # compile bytecode outside the timed runs
+
+    imports = {s: [time_import(storage_env(s)) for _ in range(args.runs)]
+               for s in ("local", "supabase")}
+    serves = [time_serve(storage_env("local")) for _ in range(args.runs)]
+
+    print(f"{'':<32}{'p50':>10}{'p95':>10}")
+    for storage, samples in imports.items():
+        p = percentiles(samples)
+        print(f"{'import app.main (' + storage + ')':<32}{p['p50']:>8}ms{p['p95']:>8}ms")
+    for key, label in (("first", "first response (GET /)"), ("ready", "ready (GET /readyz)")):
+        samples = [s[key] for s in serves if s[key] is not None]
+        if not samples:
+            print(f"{label:<32}{'n/a':>10}")
+            continue
+        p = percentiles(samples)
+        print(f"{label:<32}{p['p50']:>8}ms{p['p95']:>8}ms")
+
+    print(f"\nslowest imports, STORAGE_BACKEND=supabase ({'self':>6} / cumulative ms):")
+    for own, cumulative, name in slowest_imports(storage_env("supabase"), args.top):
+        print(f"  {name:<40}{own:>8.1f}{cumulative:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
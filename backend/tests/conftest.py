@@ -0,0 +1,97 @@
+"""
+Shared fixtures: the app on a throwaway SQLite database and LocalStorage
+directory. The environment is set before `app` is first imported, since
+app.config reads it at import time.
+"""
+
+import os
+import tempfile
+import time
+import uuid
+
+import pytest
+
+_workdir = tempfile.mkdtemp(prefix="skyvault-tests-")
+os.environ.update(
+    DATABASE_URL=f"sqlite:///{_workdir}/test.db",
+    STORAGE_BACKEND="local",
+    LOCAL_STORAGE_DIR=os.path.join(_workdir, "storage"),
+    DOWNLOAD_CACHE_DIR=os.path.join(_workdir, "download-cache"),
+    JWT_SECRET="test-secret-not-for-production-use",
+    DB_AUTO_MIGRATE="true",
+    BCRYPT_ROUNDS="4",
+    # Tests drive many requests from one address; test_admission enables it.
+    RATE_LIMIT_ENABLED="false",
+)
+
+PASSWORD = "test-password"
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    with TestClient(app) as c:
+        yield c
+
+
+def register(client) -> dict:
+    """A fresh account: {"id", "email", "headers"}; the password is PASSWORD."""
+    email = f"{uuid.uuid4().hex[:12]}@example.com"
+    r = client.post("/api/auth/register", json={"email": email, "password": PASSWORD})
+    assert r.status_code == 200, r.text
+    body = r.json()
+    return {
+        "id": body["user"]["id"],
+        "email": email,
+        "headers": {"Authorization": f"Bearer {body['access_token']}"},
+    }
+
+
+@pytest.fixture
+def user(client):
+    return register(client)
+
+
+@pytest.fixture
+def db(client):
+    from app.database import SessionLocal
+
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+def upload(client, user, name: str, content: bytes) -> dict:
+    """
+    Upload as application/octet-stream, then wait for the preview worker to
+    record its outcome and flush the activity log, so that the upload's
+    version bumps are all in before the test goes on.
+    """
+    from app.activity import activity_log
+    from app.database import SessionLocal
+    from app.models import File
+
+    r = client.post(
+        "/api/files/upload",
+        files={"file": (name, content, "application/octet-stream")},
+        headers=user["headers"],
+    )
+    assert r.status_code == 200, r.text
+    file_id = r.json()["id"]
+    deadline = time.monotonic() + 10
+    with SessionLocal() as db:
+        while db.query(File.preview_status).filter(File.id == file_id).scalar() is None:
+            assert time.monotonic() < deadline, "preview never recorded"
+            time.sleep(0.01)
+            db.rollback()
+    activity_log.flush()
+    return r.json()
+
+
+def stored_path(path: str) -> str:
+    return os.path.join(os.environ["LOCAL_STORAGE_DIR"], path)
@@ -0,0 +1,85 @@
+import time
+
+from app.activity import ActivityLog
+from app.models import Activity, UserUsage
+from app.usage import get_version
+
+
+def activities(db, user_id: int):
+    db.expire_all()
+    return [
+        (a.action, a.filename)
+        for a in db.query(Activity).filter(Activity.user_id == user_id).order_by(Activity.id)
+    ]
+
+
+def test_flush_writes_queued_events_in_one_batch(user, db):
+    log = ActivityLog(batch_size=100, interval=60, max_pending=100)
+    before = get_version(db, user["id"], UserUsage.history_version)
+    for i in range(3):
+        log.log(user["id"], "upload", f"f{i}.bin")
+    assert activities(db, user["id"]) == []
+
+    assert log.flush() == 3
+    assert activities(db, user["id"]) == [("upload", f"f{i}.bin") for i in range(3)]
+    assert log.stats()["batches"] == 1
+    assert get_version(db, user["id"], UserUsage.history_version) == before + 1
+
+
+def test_logging_never_writes_inline(user, db):
+    log = ActivityLog(batch_size=2, interval=60, max_pending=3)
+    # Hold the SQLite write lock, as a delete_file_rows transaction does.
+    db.query(UserUsage).filter(UserUsage.user_id == user["id"]).update(
+        {UserUsage.file_count: UserUsage.file_count}
+    )
+    started = time.monotonic()
+    for i in range(5):
+        log.log(user["id"], "delete", f"f{i}.bin")
+    assert time.monotonic() - started < 1
+    db.commit()
+
+    stats = log.stats()
+    assert (stats["pending"], stats["dropped"], stats["written"]) == (3, 2, 0)
+    log.flush()
+    # The oldest events went to keep the bound.
+    assert activities(db, user["id"]) == [("delete", f"f{i}.bin") for i in (2, 3, 4)]
+
+
+def test_failing_batch_is_retried_then_dropped(user, db, monkeypatch):
+    log = ActivityLog(batch_size=100, interval=60, max_pending=100, max_attempts=3)
+    write = log._write
+
+    def write_unless_poisoned(batch):
+        if any(e["action"] == "poison" for e in batch):
+            raise ValueError("bad row")
+        write(batch)
+
+    monkeypatch.setattr(log, "_write", write_unless_poisoned)
+
+    log.log(user["id"], "poison")
+    assert log.flush() == 0
+    assert log.stats()["retrying"] == 1
+
+    # Later events are written although the failed batch still is not.
+    log.log(user["id"], "upload", "ok.bin")
+    assert log.flush() == 1
+    assert activities(db, user["id"]) == [("upload", "ok.bin")]
+
+    log.flush()  # third failure: dropped
+    stats = log.stats()
+    assert (stats["retrying"], stats["dropped"]) == (0, 1)
+    log.log(user["id"], "upload", "later.bin")
+    assert log.flush() == 1
+
+
+def test_queued_events_follow_deletes_and_clears(user, db):
+    log = ActivityLog(batch_size=100, interval=60, max_pending=100)
+    log.log(user["id"], "upload", "a.bin", file_id=10 ** 9)
+    log.detach_files([10 ** 9])
+    log.log(user["id"] + 10 ** 6, "upload", "other.bin")
+    log.discard_user(user["id"] + 10 ** 6)
+
+    assert log.flush() == 1
+    db.expire_all()
+    (row,) = db.query(Activity).filter(Activity.user_id == user["id"]).all()
+    assert row.file_id is None
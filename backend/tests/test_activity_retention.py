@@ -0,0 +1,87 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from app.activity import archive_activity
+from app.database import engine
+from app.models import Activity, ActivityDaily, HistoryClear
+
+
+@pytest.fixture
+def deletes():
+    """DELETE statements, as they are run."""
+    seen = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("DELETE"):
+            seen.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    yield seen
+    event.remove(engine, "before_cursor_execute", record)
+
+
+def add_events(db, user_id: int, at: datetime, n: int, action: str = "upload"):
+    db.add_all(
+        Activity(user_id=user_id, action=action, filename=f"f{i}.bin", created_at=at)
+        for i in range(n)
+    )
+    db.commit()
+
+
+def events(db, user_id: int) -> int:
+    db.expire_all()
+    return db.query(Activity).filter(Activity.user_id == user_id).count()
+
+
+def history(client, user):
+    return client.get("/api/auth/history", headers=user["headers"]).json()
+
+
+def test_clear_hides_at_once_and_is_purged_later(client, user, db):
+    add_events(db, user["id"], datetime.utcnow() - timedelta(minutes=5), 3)
+    assert len(history(client, user)) == 3
+
+    assert client.delete("/api/auth/history/clear", headers=user["headers"]).status_code == 200
+    assert history(client, user) == []
+    assert events(db, user["id"]) == 3
+
+    assert archive_activity()["purged"] >= 3
+    assert events(db, user["id"]) == 0
+
+
+def test_purge_only_runs_for_new_marks(client, user, db, deletes):
+    add_events(db, user["id"], datetime.utcnow() - timedelta(minutes=5), 2)
+    client.delete("/api/auth/history/clear", headers=user["headers"])
+    archive_activity()
+
+    # Nothing cleared since: no DELETE is issued at all.
+    deletes.clear()
+    assert archive_activity()["purged"] == 0
+    assert deletes == []
+
+    # Clearing again is a new mark, purged by the next run.
+    add_events(db, user["id"], datetime.utcnow() - timedelta(seconds=1), 1)
+    client.delete("/api/auth/history/clear", headers=user["headers"])
+    assert archive_activity()["purged"] == 1
+    db.expire_all()
+    mark = db.get(HistoryClear, user["id"])
+    assert mark.purged_at == mark.cleared_at
+
+
+def test_old_days_fold_into_daily_counts(user, db):
+    day = datetime.utcnow().replace(hour=12, minute=0, second=0, microsecond=0) - timedelta(days=400)
+    add_events(db, user["id"], day, 3, "upload")
+    add_events(db, user["id"], day + timedelta(hours=1), 1, "delete")
+    recent = datetime.utcnow() - timedelta(minutes=1)
+    add_events(db, user["id"], recent, 1)
+
+    result = archive_activity(retention_days=30)
+    assert result["archived"] >= 4
+    assert events(db, user["id"]) == 1
+    counts = {
+        d.action: d.count
+        for d in db.query(ActivityDaily).filter(ActivityDaily.user_id == user["id"])
+    }
+    assert counts == {"upload": 3, "delete": 1}
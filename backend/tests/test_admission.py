@@ -0,0 +1,94 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import app.admission
+from app.admission import (
+    Admission,
+    AdmissionMiddleware,
+    RateLimiter,
+    UploadGate,
+    client_address,
+    client_key,
+)
+from app.auth import create_access_token
+
+
+@pytest.fixture
+def limited(monkeypatch):
+    """A stub app behind admission: 2 auth requests, then 1 per minute."""
+    monkeypatch.setattr(app.admission, "RATE_LIMIT_ENABLED", True)
+    stub = FastAPI()
+
+    @stub.post("/api/auth/login")
+    def login():
+        return {"ok": True}
+
+    @stub.get("/")
+    def root():
+        return {"ok": True}
+
+    admission = Admission(RateLimiter({"auth": (1, 2)}), UploadGate(3, 10 ** 9, 10 ** 9))
+    return TestClient(AdmissionMiddleware(stub, admission=admission))
+
+
+def test_rate_limited_with_retry_after(limited):
+    assert limited.post("/api/auth/login").status_code == 200
+    assert limited.post("/api/auth/login").status_code == 200
+
+    r = limited.post("/api/auth/login")
+    assert r.status_code == 429
+    assert 1 <= int(r.headers["Retry-After"]) <= 60
+
+
+def test_unlimited_routes_pass(limited):
+    for _ in range(5):
+        assert limited.get("/").status_code == 200
+
+
+def test_clients_have_separate_buckets():
+    limiter = RateLimiter({"auth": (1, 1)})
+    assert limiter.acquire("auth", "a") == 0
+    assert limiter.acquire("auth", "a") > 0
+    assert limiter.acquire("auth", "b") == 0
+
+
+def scope(peer: str, *headers):
+    return {"client": (peer, 1234), "headers": [(k.encode(), v.encode()) for k, v in headers]}
+
+
+def test_client_address_behind_trusted_proxies():
+    # A direct peer's own address; a forged header is ignored.
+    assert client_address(scope("203.0.113.5", ("x-forwarded-for", "1.2.3.4"))) == "203.0.113.5"
+    # Through nginx: the hop it appended.
+    assert client_address(scope("172.18.0.2", ("x-forwarded-for", "198.51.100.7"))) == "198.51.100.7"
+    # Left-most hops are the client's claims; trusted hops are skipped.
+    forwarded = ("x-forwarded-for", "1.2.3.4, 198.51.100.7, 10.0.0.3")
+    assert client_address(scope("127.0.0.1", forwarded)) == "198.51.100.7"
+    assert client_address(scope("127.0.0.1")) == "127.0.0.1"
+
+
+def test_client_key_prefers_the_session_user():
+    token = create_access_token({"sub": "42"})
+    authed = scope("203.0.113.5", ("authorization", f"Bearer {token}"))
+    assert client_key(authed, "listing") == "user:42"
+    # Login and register are limited per address, whatever the token.
+    assert client_key(authed, "auth") == "addr:203.0.113.5"
+    assert client_key(scope("203.0.113.5", ("authorization", "Bearer junk")), "listing") == "addr:203.0.113.5"
+
+
+def test_upload_gate_limits_slots_and_bytes():
+    gate = UploadGate(max_per_user=2, bytes_per_user=100, bytes_total=150)
+    assert gate.acquire("a", 500) is None  # one upload always gets through
+    assert gate.acquire("a", 1) == "bytes"
+    gate.release("a", 500)
+
+    assert gate.acquire("a", 60) is None
+    assert gate.acquire("a", 30) is None
+    assert gate.acquire("a", 1) == "concurrency"
+    assert gate.acquire("b", 70) == "bytes"  # over the total
+    gate.release("a", 60)
+    assert gate.acquire("b", 70) is None
+    assert gate.stats() == {
+        "uploads_in_flight": 2, "upload_bytes_reserved": 100, "users_uploading": 2,
+    }
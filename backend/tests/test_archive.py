@@ -0,0 +1,89 @@
+import io
+import threading
+import time
+import uuid
+import zipfile
+from datetime import datetime
+
+from app.archive import ArchiveEntry, ZipStream, unique_names
+from app.storage import StorageBackend, StorageError
+
+from conftest import upload
+
+
+class MemoryBackend(StorageBackend):
+    """Objects from a dict, recording how many chunks have been read."""
+
+    def __init__(self, objects):
+        self.objects = objects
+        self.read = 0
+        self.lock = threading.Lock()
+
+    def open_stream(self, path, chunk_size=1024 * 1024):
+        if path not in self.objects:
+            raise StorageError("Object not found")
+        data = self.objects[path]
+        for i in range(0, len(data), chunk_size):
+            with self.lock:
+                self.read += 1
+            yield data[i:i + chunk_size]
+
+
+def entries(objects):
+    return [ArchiveEntry(p, p, len(d), datetime(2024, 1, 1)) for p, d in objects.items()]
+
+
+def test_unique_names():
+    assert unique_names(["a.txt", "a.txt", "dir/a.txt", "b", "b", ""]) == [
+        "a.txt", "a (1).txt", "a (2).txt", "b", "b (1)", "file",
+    ]
+
+
+def test_archive_holds_every_object():
+    objects = {f"{i}.bin": bytes([i]) * (1000 + i) for i in range(5)}
+    stream = ZipStream(MemoryBackend(objects), entries(objects), concurrency=2, chunk_size=100)
+
+    with zipfile.ZipFile(io.BytesIO(b"".join(stream))) as zf:
+        assert zf.testzip() is None
+        assert {n: zf.read(n) for n in zf.namelist()} == objects
+
+
+def test_unreadable_objects_are_listed_not_fatal():
+    objects = {"a.bin": b"a" * 10}
+    stream = ZipStream(MemoryBackend(objects), entries({**objects, "gone.bin": b"x"}))
+
+    with zipfile.ZipFile(io.BytesIO(b"".join(stream))) as zf:
+        assert zf.namelist() == ["a.bin", "_export_errors.txt"]
+        assert zf.read("_export_errors.txt").startswith(b"gone.bin: ")
+
+
+def test_reads_stay_bounded_ahead_of_the_consumer():
+    objects = {f"{i}.bin": b"x" * 10_000 for i in range(4)}
+    backend = MemoryBackend(objects)
+    stream = iter(ZipStream(backend, entries(objects), concurrency=2, readahead=2, chunk_size=100))
+
+    next(stream)
+    time.sleep(0.3)
+    # Two objects in flight, each at most readahead chunks (+1 being put) ahead.
+    assert backend.read <= 2 * (2 + 2)
+    stream.close()
+    time.sleep(0.7)
+    stopped_at = backend.read
+    time.sleep(0.5)
+    assert backend.read == stopped_at < 400
+
+
+def test_archive_endpoint(client, user):
+    a = upload(client, user, "same.txt", b"first " + uuid.uuid4().bytes)
+    b = upload(client, user, "same.txt", b"second " + uuid.uuid4().bytes)
+
+    r = client.get("/api/files/archive", params={"ids": f"{a['id']},{b['id']}"}, headers=user["headers"])
+    assert r.status_code == 200
+    assert r.headers["content-type"] == "application/zip"
+    with zipfile.ZipFile(io.BytesIO(r.content)) as zf:
+        assert zf.namelist() == ["same.txt", "same (1).txt"]
+        assert zf.read("same.txt").startswith(b"first ")
+
+    assert client.get("/api/files/archive", params={"ids": "1,x"}, headers=user["headers"]).status_code == 400
+    r = client.get("/api/files/archive", params={"ids": str(10 ** 9)}, headers=user["headers"])
+    assert r.status_code == 404
@@ -0,0 +1,129 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.storage import AsyncStorage, StorageBackend, StorageError
+
+
+class FlakyBackend(StorageBackend):
+    """Fails the first `failures` calls of each kind, optionally by hanging."""
+
+    def __init__(self, failures: int = 0, hang: float = 0):
+        self.failures = failures
+        self.hang = hang
+        self.calls = []
+        self.threads = set()
+        self.consumed = []
+
+    def _attempt(self, name):
+        self.calls.append(name)
+        self.threads.add(threading.get_ident())
+        if self.calls.count(name) <= self.failures:
+            if self.hang:
+                time.sleep(self.hang)
+            else:
+                raise StorageError(f"{name} failed")
+
+    def upload_stream(self, path, chunks, content_type):
+        self._attempt("upload")
+        written = 0
+        for chunk in chunks:
+            self.consumed.append(chunk)
+            written += len(chunk)
+        return written
+
+    def remove(self, paths):
+        self._attempt("remove")
+
+    def create_signed_url(self, path, expires_in):
+        self._attempt("sign")
+        return f"https://storage.test/{path}"
+
+
+def run(storage, coro):
+    try:
+        return asyncio.run(coro)
+    finally:
+        storage.close()
+
+
+def test_calls_run_off_the_event_loop():
+    backend = FlakyBackend()
+    storage = AsyncStorage(backend)
+
+    async def go():
+        await storage.remove(["a"])
+        return threading.get_ident()
+
+    loop_thread = run(storage, go())
+    assert backend.threads and loop_thread not in backend.threads
+
+
+def test_failed_calls_are_retried():
+    backend = FlakyBackend(failures=2)
+    storage = AsyncStorage(backend, retries=2, backoff=0.001)
+    assert run(storage, storage.create_signed_url("a", 60)) == "https://storage.test/a"
+    assert backend.calls == ["sign"] * 3
+
+
+def test_retries_are_bounded():
+    backend = FlakyBackend(failures=5)
+    storage = AsyncStorage(backend, retries=1, backoff=0.001)
+    with pytest.raises(StorageError):
+        run(storage, storage.remove(["a"]))
+    assert backend.calls == ["remove"] * 2
+
+
+def test_timed_out_call_is_retried():
+    backend = FlakyBackend(failures=1, hang=0.5)
+    storage = AsyncStorage(backend, timeout=0.1, retries=1, backoff=0.001)
+    run(storage, storage.remove(["a"]))
+    assert backend.calls == ["remove"] * 2
+
+
+def test_failed_upload_restarts_from_fresh_chunks():
+    class FailsMidway(FlakyBackend):
+        def upload_stream(self, path, chunks, content_type):
+            self.calls.append("upload")
+            chunks = iter(chunks)
+            self.consumed.append(next(chunks))
+            if len(self.calls) == 1:
+                raise StorageError("connection reset")
+            self.consumed.extend(chunks)
+            return sum(map(len, self.consumed[1:]))
+
+    backend = FailsMidway()
+    storage = AsyncStorage(backend, retries=1, backoff=0.001)
+    opened = []
+
+    def open_chunks():
+        opened.append(1)
+        return iter([b"ab", b"cd"])
+
+    written = run(storage, storage.upload_stream("a", open_chunks, "text/plain"))
+    assert written == 4
+    assert len(opened) == 2
+    assert backend.consumed == [b"ab", b"ab", b"cd"]
+
+
+def test_timed_out_upload_is_not_retried_and_stops():
+    class SlowUpload(FlakyBackend):
+        def upload_stream(self, path, chunks, content_type):
+            self.calls.append("upload")
+            for chunk in chunks:
+                self.consumed.append(chunk)
+                time.sleep(0.05)
+
+    backend = SlowUpload()
+    storage = AsyncStorage(backend, upload_timeout=0.1, retries=2, backoff=0.001)
+
+    with pytest.raises(StorageError, match="timed out"):
+        run(storage, storage.upload_stream("a", lambda: iter([b"x"] * 100), "text/plain"))
+    time.sleep(0.2)
+    # One attempt, abandoned at its next chunk instead of running to the end.
+    assert backend.calls == ["upload"]
+    stopped_at = len(backend.consumed)
+    time.sleep(0.2)
+    assert len(backend.consumed) == stopped_at < 100
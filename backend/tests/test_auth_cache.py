@@ -0,0 +1,80 @@
+from datetime import timedelta
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import event
+
+import app.cache
+from app.auth import create_access_token, create_file_token, invalidate_user, principal_cache
+from app.cache import LRUCache
+from app.database import engine
+from app.models import User
+
+
+@pytest.fixture
+def user_queries():
+    """Statements reading the users table, as they are run."""
+    seen = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if "FROM users" in statement:
+            seen.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    yield seen
+    event.remove(engine, "before_cursor_execute", record)
+
+
+def test_lru_cache_expiry_and_eviction(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(app.cache, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    cache = LRUCache(max_entries=2, ttl=10)
+
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=60)  # capped at the cache's own ttl
+    cache.set("gone", 3, ttl=0)
+    assert cache.get("gone") is None
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None  # least recently used
+    now[0] += 11
+    assert cache.get("a") is None and cache.get("c") is None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_principal_is_loaded_once(client, user, user_queries):
+    principal_cache.pop(user["id"])
+    for _ in range(3):
+        assert client.get("/api/auth/me", headers=user["headers"]).status_code == 200
+    assert len(user_queries) == 1
+
+
+def test_user_update_evicts_principal(client, user, db):
+    client.get("/api/auth/me", headers=user["headers"])
+    row = db.get(User, user["id"])
+    row.full_name = "Renamed"
+    db.commit()
+
+    assert client.get("/api/auth/me", headers=user["headers"]).json()["full_name"] == "Renamed"
+
+
+def test_bulk_update_is_seen_after_invalidate_user(client, user, db):
+    client.get("/api/auth/me", headers=user["headers"])
+    email = f"moved-{user['id']}@example.com"
+    db.query(User).filter(User.id == user["id"]).update({User.email: email})
+    db.commit()
+    # Bulk updates bypass the ORM hooks, so the cached principal stays...
+    assert client.get("/api/auth/me", headers=user["headers"]).json()["email"] != email
+
+    invalidate_user(user["id"])  # ...until it is dropped explicitly.
+    assert client.get("/api/auth/me", headers=user["headers"]).json()["email"] == email
+
+
+def test_file_links_and_expired_tokens_are_not_sessions(client, user):
+    file_token = create_file_token(user["id"], 1, 60)
+    r = client.get("/api/auth/me", headers={"Authorization": f"Bearer {file_token}"})
+    assert r.status_code == 401
+
+    expired = create_access_token({"sub": str(user["id"])}, timedelta(seconds=-5))
+    r = client.get("/api/auth/me", headers={"Authorization": f"Bearer {expired}"})
+    assert r.status_code == 401
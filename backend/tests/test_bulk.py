@@ -0,0 +1,66 @@
+import os
+import uuid
+
+import app.files
+from app.activity import activity_log
+from app.models import Activity, File, UserUsage
+
+from conftest import register, stored_path, upload
+
+
+def test_bulk_delete_reports_what_it_could_not_delete(client, user, db):
+    mine = [upload(client, user, f"{i}.bin", uuid.uuid4().bytes) for i in range(3)]
+    other = register(client)
+    theirs = upload(client, other, "theirs.bin", uuid.uuid4().bytes)
+    paths = {
+        i: p
+        for i, p in db.query(File.id, File.stored_filename).filter(File.user_id == user["id"])
+    }
+
+    ids = [mine[0]["id"], theirs["id"], mine[1]["id"], mine[0]["id"], 10 ** 9]
+    r = client.post("/api/files/bulk-delete", json={"file_ids": ids}, headers=user["headers"])
+    assert r.status_code == 200
+    assert r.json() == {
+        "deleted": [mine[0]["id"], mine[1]["id"]],
+        "failed": [
+            {"id": theirs["id"], "error": "File not found"},
+            {"id": 10 ** 9, "error": "File not found"},
+        ],
+    }
+
+    db.expire_all()
+    left = [i for (i,) in db.query(File.id).filter(File.user_id == user["id"])]
+    assert left == [mine[2]["id"]]
+    assert db.get(File, theirs["id"]) is not None
+    usage = db.query(UserUsage).filter(UserUsage.user_id == user["id"]).one()
+    assert (usage.file_count, usage.bytes_used) == (1, 16)
+    # Only the deleted files' objects are removed from storage.
+    assert [os.path.exists(stored_path(paths[f["id"]])) for f in mine] == [False, False, True]
+
+
+def test_bulk_download_signs_owned_files_and_logs_them(client, user, db):
+    mine = [upload(client, user, f"{i}.bin", uuid.uuid4().bytes) for i in range(2)]
+    ids = [f["id"] for f in mine] + [10 ** 9]
+
+    r = client.post("/api/files/bulk-download", json={"file_ids": ids}, headers=user["headers"])
+    assert r.status_code == 200
+    body = r.json()
+    assert sorted(body["urls"]) == sorted(str(f["id"]) for f in mine)
+    assert body["missing"] == [10 ** 9]
+
+    activity_log.flush()
+    db.expire_all()
+    logged = db.query(Activity.file_id).filter(
+        Activity.user_id == user["id"], Activity.action == "download"
+    )
+    assert sorted(i for (i,) in logged) == sorted(f["id"] for f in mine)
+
+
+def test_bulk_requests_are_limited(client, user, monkeypatch):
+    monkeypatch.setattr(app.files, "BULK_OPERATION_LIMIT", 2)
+    for path in ("/api/files/bulk-delete", "/api/files/bulk-download"):
+        r = client.post(path, json={"file_ids": [1, 2, 3]}, headers=user["headers"])
+        assert r.status_code == 400
+    # Repeated ids count once.
+    r = client.post("/api/files/bulk-delete", json={"file_ids": [1, 1, 1]}, headers=user["headers"])
+    assert r.status_code == 200
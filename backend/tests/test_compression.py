@@ -0,0 +1,82 @@
+import os
+
+import pytest
+
+import app.compression
+from app.compression import Encoder, accepts_encoding, decode, worth_trying
+from app.models import File
+
+from conftest import upload
+
+TEXT = b"".join(b"%06d a line of quite repetitive text\n" % i for i in range(5000))
+
+
+def chunked(data: bytes, size: int = 10_000):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize("setting", ["zstd", "gzip"])
+def test_round_trip(setting, monkeypatch):
+    if setting == "zstd" and app.compression.zstandard is None:
+        pytest.skip("zstandard not installed")
+    monkeypatch.setattr(app.compression, "UPLOAD_COMPRESSION", setting)
+    enc = Encoder("text/plain")
+    stored = b"".join(enc.encode(chunked(TEXT)))
+
+    assert enc.encoding == setting
+    assert (enc.logical_size, enc.stored_size) == (len(TEXT), len(stored))
+    assert len(stored) < len(TEXT) / 4
+    assert b"".join(decode(chunked(stored, 777), setting)) == TEXT
+
+
+@pytest.mark.parametrize("mime, data", [
+    ("image/jpeg", TEXT),  # compressed format
+    ("text/plain", os.urandom(100_000)),  # sample does not shrink
+    ("text/plain", b"tiny"),  # below UPLOAD_COMPRESSION_MIN_BYTES
+])
+def test_stored_as_is(mime, data):
+    enc = Encoder(mime)
+    assert b"".join(enc.encode(chunked(data))) == data
+    assert enc.encoding is None and enc.stored_size == len(data)
+
+
+def test_compression_off(monkeypatch):
+    monkeypatch.setattr(app.compression, "UPLOAD_COMPRESSION", "off")
+    enc = Encoder("text/plain")
+    assert b"".join(enc.encode([TEXT])) == TEXT
+    assert enc.encoding is None
+
+
+def test_type_and_header_checks():
+    assert worth_trying("text/csv; charset=utf-8")
+    assert worth_trying("image/svg+xml")
+    assert not worth_trying("application/zip")
+    assert accepts_encoding("gzip, zstd;q=0.5", "zstd")
+    assert not accepts_encoding("gzip, zstd;q=0", "zstd")
+    assert accepts_encoding("*", "gzip")
+    assert not accepts_encoding(None, "gzip")
+
+
+def test_compressed_upload_is_served_decoded_or_as_stored(client, user, db):
+    content = TEXT + os.urandom(8)  # its own blob
+    f = upload(client, user, "log.txt", content)
+    row = db.get(File, f["id"])
+    assert row.content_encoding == app.compression.upload_encoding()
+    assert row.size_bytes == len(content) > row.stored_size_bytes
+
+    # Linked through /content even in signed mode: it decodes the object.
+    link = client.get(f"/api/files/{f['id']}/download", headers=user["headers"]).json()["url"]
+    assert f"/api/files/{f['id']}/content" in link
+
+    url = f"/api/files/{f['id']}/content"
+    plain = client.get(url, headers={**user["headers"], "Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    assert plain.content == content
+
+    encoding = row.content_encoding
+    with client.stream("GET", url, headers={**user["headers"], "Accept-Encoding": encoding}) as r:
+        raw = b"".join(r.iter_raw())
+    assert r.headers["content-encoding"] == encoding
+    assert "Accept-Encoding" in r.headers["vary"]
+    assert len(raw) == row.stored_size_bytes
+    assert b"".join(decode([raw], encoding)) == content
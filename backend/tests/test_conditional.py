@@ -0,0 +1,72 @@
+import pytest
+
+from app.activity import activity_log
+
+from conftest import register, upload
+
+LISTINGS = ["/api/files/", "/api/files/storage", "/api/auth/history"]
+
+
+def etag(client, user, path: str) -> str:
+    r = client.get(path, headers=user["headers"])
+    assert r.status_code == 200, r.text
+    return r.headers["ETag"]
+
+
+def revalidate(client, user, path: str, tag: str) -> int:
+    return client.get(path, headers={**user["headers"], "If-None-Match": tag}).status_code
+
+
+@pytest.mark.parametrize("path", LISTINGS)
+def test_current_etag_gets_304(client, user, path):
+    upload(client, user, "a.bin", b"x" * 10)
+    tag = etag(client, user, path)
+
+    r = client.get(path, headers={**user["headers"], "If-None-Match": tag})
+    assert r.status_code == 304
+    assert r.headers["ETag"] == tag
+    assert r.content == b""
+
+
+@pytest.mark.parametrize("path", LISTINGS)
+def test_upload_and_delete_invalidate(client, user, path):
+    tag = etag(client, user, path)
+
+    f = upload(client, user, "a.bin", b"x" * 10)
+    assert revalidate(client, user, path, tag) == 200
+
+    tag = etag(client, user, path)
+    client.delete(f"/api/files/{f['id']}", headers=user["headers"])
+    activity_log.flush()
+    assert revalidate(client, user, path, tag) == 200
+
+
+def test_download_only_invalidates_history(client, user):
+    f = upload(client, user, "a.bin", b"x" * 10)
+    tags = {path: etag(client, user, path) for path in LISTINGS}
+
+    assert client.get(f"/api/files/{f['id']}/content", headers=user["headers"]).status_code == 200
+    activity_log.flush()
+
+    assert revalidate(client, user, "/api/files/", tags["/api/files/"]) == 304
+    assert revalidate(client, user, "/api/files/storage", tags["/api/files/storage"]) == 304
+    assert revalidate(client, user, "/api/auth/history", tags["/api/auth/history"]) == 200
+
+
+def test_etag_depends_on_query(client, user):
+    upload(client, user, "a.bin", b"x" * 10)
+    tag = etag(client, user, "/api/files/?limit=1")
+    assert revalidate(client, user, "/api/files/?limit=2", tag) == 200
+
+
+def test_clearing_history_invalidates_it(client, user):
+    upload(client, user, "a.bin", b"x" * 10)
+    tag = etag(client, user, "/api/auth/history")
+    client.delete("/api/auth/history/clear", headers=user["headers"])
+    assert revalidate(client, user, "/api/auth/history", tag) == 200
+
+
+def test_etags_are_per_user(client, user):
+    other = register(client)
+    tag = etag(client, user, "/api/files/")
+    assert revalidate(client, other, "/api/files/", tag) == 200
@@ -0,0 +1,148 @@
+import hashlib
+import os
+import threading
+import uuid
+
+import app.files
+from app.files import acquire_blob, reference_blob, release_blobs, storage
+from app.models import Blob, File, UploadSession, UserUsage
+
+from conftest import stored_path, upload
+
+
+def test_acquire_and_release_count_references(db):
+    sha = hashlib.sha256(uuid.uuid4().bytes).hexdigest()
+
+    assert acquire_blob(db, sha, "u/first.bin", 10) == ("u/first.bin", None, None)
+    # The second upload of the same content gets the first object back.
+    assert acquire_blob(db, sha, "u/second.bin", 10) == ("u/first.bin", None, None)
+    db.commit()
+    assert db.query(Blob.ref_count).filter(Blob.sha256 == sha).scalar() == 2
+
+    assert release_blobs(db, {sha: 1}) == []
+    db.commit()
+    assert db.query(Blob.ref_count).filter(Blob.sha256 == sha).scalar() == 1
+
+    assert release_blobs(db, {sha: 1}) == ["u/first.bin"]
+    db.commit()
+    assert db.query(Blob).filter(Blob.sha256 == sha).first() is None
+
+
+def test_duplicate_upload_shares_one_object(client, user, db):
+    content = uuid.uuid4().bytes * 100
+    a = upload(client, user, "a.bin", content)
+    b = upload(client, user, "b.bin", content)
+
+    paths = {
+        p for (p,) in db.query(File.stored_filename).filter(File.id.in_([a["id"], b["id"]]))
+    }
+    assert len(paths) == 1
+    path = paths.pop()
+    sha = hashlib.sha256(content).hexdigest()
+    assert db.query(Blob.ref_count).filter(Blob.sha256 == sha).scalar() == 2
+    assert os.listdir(os.path.dirname(stored_path(path))) == [os.path.basename(path)]
+
+
+def test_object_removed_with_last_reference(client, user, db):
+    content = uuid.uuid4().bytes * 100
+    a = upload(client, user, "a.bin", content)
+    b = upload(client, user, "b.bin", content)
+    path = db.query(File.stored_filename).filter(File.id == a["id"]).scalar()
+
+    assert client.delete(f"/api/files/{a['id']}", headers=user["headers"]).status_code == 200
+    assert os.path.exists(stored_path(path))
+
+    assert client.delete(f"/api/files/{b['id']}", headers=user["headers"]).status_code == 200
+    assert not os.path.exists(stored_path(path))
+    sha = hashlib.sha256(content).hexdigest()
+    db.expire_all()
+    assert db.query(Blob).filter(Blob.sha256 == sha).first() is None
+
+
+def test_known_content_is_not_sent_to_storage(client, user, monkeypatch):
+    content = uuid.uuid4().bytes * 100
+    upload(client, user, "a.bin", content)
+
+    uploads = []
+    upload_stream = storage.upload_stream
+    monkeypatch.setattr(
+        storage, "upload_stream", lambda *args: uploads.append(args[0]) or upload_stream(*args)
+    )
+    upload(client, user, "b.bin", content)
+    assert uploads == []
+
+
+def commit_session(client, user, content: bytes):
+    r = client.post(
+        "/api/files/uploads/",
+        json={"filename": "s.bin", "size_bytes": len(content)},
+        headers=user["headers"],
+    )
+    sid = r.json()["session_id"]
+    r = client.put(
+        f"/api/files/uploads/{sid}/parts/0", files={"file": ("p", content)}, headers=user["headers"]
+    )
+    assert r.status_code == 200, r.text
+    r = client.post(f"/api/files/uploads/{sid}/commit", headers=user["headers"])
+    assert r.status_code == 200, r.text
+    return sid, r.json()
+
+
+def test_lost_blob_race_keeps_the_session_claim(client, user, db, monkeypatch):
+    content = uuid.uuid4().bytes * 100
+    sha = hashlib.sha256(content).hexdigest()
+    upload(client, user, "a.bin", content)
+
+    # The commit's lookup misses, as if the other upload's blob had been
+    # inserted just after it: the insert then hits the unique sha256.
+    missed = []
+
+    def miss_once(session, digest):
+        if not missed:
+            missed.append(digest)
+            return None
+        return reference_blob(session, digest)
+
+    monkeypatch.setattr(app.files, "reference_blob", miss_once)
+    sid, f = commit_session(client, user, content)
+    assert missed == [sha]
+
+    db.expire_all()
+    assert db.query(UploadSession).filter(UploadSession.id == sid).count() == 0
+    r = client.post(f"/api/files/uploads/{sid}/commit", headers=user["headers"])
+    assert r.status_code == 404
+    assert db.query(File).filter(File.user_id == user["id"]).count() == 2
+    assert db.query(Blob.ref_count).filter(Blob.sha256 == sha).scalar() == 2
+    usage = db.query(UserUsage).filter(UserUsage.user_id == user["id"]).one()
+    assert (usage.file_count, usage.bytes_used) == (2, 2 * len(content))
+
+
+def test_identical_session_commits_race_to_one_blob(client, user, db, monkeypatch):
+    content = uuid.uuid4().bytes * 100
+    barrier = threading.Barrier(2)
+    upload_stream = storage.upload_stream
+
+    def in_step(*args):
+        written = upload_stream(*args)
+        barrier.wait(5)
+        return written
+
+    monkeypatch.setattr(storage, "upload_stream", in_step)
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(commit_session(client, user, content)))
+        for _ in range(2)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    monkeypatch.undo()
+
+    assert len(results) == 2
+    sha = hashlib.sha256(content).hexdigest()
+    assert db.query(Blob.ref_count).filter(Blob.sha256 == sha).scalar() == 2
+    paths = {p for (p,) in db.query(File.stored_filename).filter(File.blob_sha256 == sha)}
+    assert len(paths) == 1
+    user_dir = os.path.dirname(stored_path(paths.pop()))
+    assert len([n for n in os.listdir(user_dir) if not n.startswith(".")]) == 1
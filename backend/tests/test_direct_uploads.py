@@ -0,0 +1,108 @@
+import hashlib
+import hmac
+import os
+from datetime import datetime, timedelta
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from app.models import DirectUpload, UserUsage
+from app.storage import LocalStorage, StorageError
+
+from conftest import stored_path
+
+
+def test_upload_tokens_are_bound_to_path_size_and_time(tmp_path):
+    backend = LocalStorage(str(tmp_path), secret="s3cret")
+    url = backend.create_signed_upload_url("1/a.bin", 60, 100)
+    parts = urlsplit(url)
+    assert parts.path == "/api/storage/local/1/a.bin"
+    q = {k: v[0] for k, v in parse_qs(parts.query).items()}
+    expires, token = int(q["expires"]), q["token"]
+
+    assert backend.check_upload_token("1/a.bin", expires, 100, token)
+    assert not backend.check_upload_token("1/b.bin", expires, 100, token)
+    assert not backend.check_upload_token("1/a.bin", expires, 101, token)
+    assert not backend.check_upload_token("1/a.bin", expires + 1, 100, token)
+    expired = backend.create_signed_upload_url("1/a.bin", -1, 100)
+    q = {k: v[0] for k, v in parse_qs(urlsplit(expired).query).items()}
+    assert not backend.check_upload_token("1/a.bin", int(q["expires"]), 100, q["token"])
+
+    # Signed with a key derived from the secret, not the secret itself.
+    message = f"1/a.bin\n{expires}\n100".encode()
+    assert token != hmac.new(b"s3cret", message, hashlib.sha256).hexdigest()
+    with pytest.raises(StorageError):
+        LocalStorage(str(tmp_path)).create_signed_upload_url("1/a.bin", 60, 100)
+
+
+def reserve(client, user, size: int, name: str = "big.bin") -> dict:
+    r = client.post(
+        "/api/files/direct/", json={"filename": name, "size_bytes": size}, headers=user["headers"]
+    )
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+def test_reserve_upload_finalize(client, user, db):
+    content = os.urandom(3000)
+    res = reserve(client, user, len(content))
+    assert client.put(res["upload_url"], content=content).status_code == 200
+    # A signed URL creates its object once.
+    assert client.put(res["upload_url"], content=content).status_code == 409
+
+    r = client.post(f"/api/files/direct/{res['upload_id']}/finalize", headers=user["headers"])
+    assert r.status_code == 200, r.text
+    f = r.json()
+    assert (f["original_filename"], f["size_bytes"]) == ("big.bin", 3000)
+    assert client.get(f"/api/files/{f['id']}/content", headers=user["headers"]).content == content
+    usage = db.query(UserUsage).filter(UserUsage.user_id == user["id"]).one()
+    assert (usage.file_count, usage.bytes_used) == (1, 3000)
+
+    again = client.post(f"/api/files/direct/{res['upload_id']}/finalize", headers=user["headers"])
+    assert again.status_code == 404
+
+
+def test_signed_url_is_checked(client, user):
+    res = reserve(client, user, 10)
+    tampered = res["upload_url"].replace("max_bytes=10", "max_bytes=1000")
+    assert client.put(tampered, content=b"x" * 100).status_code == 403
+    assert client.put(res["upload_url"], content=b"x" * 11).status_code == 413
+
+
+def test_finalize_checks_the_object(client, user, db):
+    res = reserve(client, user, 10)
+    url = f"/api/files/direct/{res['upload_id']}/finalize"
+    assert client.post(url, headers=user["headers"]).status_code == 409  # nothing yet
+
+    client.put(res["upload_url"], content=b"x" * 5)
+    r = client.post(url, headers=user["headers"])
+    assert r.status_code == 400
+    assert db.query(DirectUpload).filter(DirectUpload.id == res["upload_id"]).count() == 0
+    path = urlsplit(res["upload_url"]).path.removeprefix("/api/storage/local/")
+    assert not os.path.exists(stored_path(path))
+
+
+def test_expired_and_aborted_reservations(client, user, db):
+    res = reserve(client, user, 4)
+    client.put(res["upload_url"], content=b"data")
+    db.query(DirectUpload).filter(DirectUpload.id == res["upload_id"]).update(
+        {DirectUpload.expires_at: datetime.utcnow() - timedelta(seconds=1)}
+    )
+    db.commit()
+    r = client.post(f"/api/files/direct/{res['upload_id']}/finalize", headers=user["headers"])
+    assert r.status_code == 410
+
+    res = reserve(client, user, 4)
+    client.put(res["upload_url"], content=b"data")
+    path = urlsplit(res["upload_url"]).path.removeprefix("/api/storage/local/")
+    assert os.path.exists(stored_path(path))
+    assert client.delete(f"/api/files/direct/{res['upload_id']}", headers=user["headers"]).status_code == 200
+    assert not os.path.exists(stored_path(path))
+
+
+def test_reservations_are_limited(client, user):
+    r = client.post(
+        "/api/files/direct/", json={"filename": "huge.bin", "size_bytes": 10 ** 15},
+        headers=user["headers"],
+    )
+    assert r.status_code == 413
@@ -0,0 +1,68 @@
+import os
+
+import pytest
+from sqlalchemy import create_engine, inspect
+
+import app.files
+import app.health
+from app.files import download_cache
+from app.migrate import SchemaOutdated, check_schema, migrate, pending
+
+
+def test_healthz(client):
+    assert client.get("/healthz").json() == {"status": "ok"}
+
+
+def test_readyz_checks_dependencies(client):
+    r = client.get("/readyz")
+    assert r.status_code == 200
+    checks = r.json()["checks"]
+    assert {"database", "schema", "storage"} <= set(checks)
+    assert all(c["ok"] for c in checks.values())
+
+
+def test_readyz_fails_until_migrated(client, monkeypatch):
+    def outdated():
+        raise SchemaOutdated("1 pending change(s)")
+
+    monkeypatch.setattr(app.health, "_schema_current", False)
+    monkeypatch.setattr(app.health, "check_schema", outdated)
+    r = client.get("/readyz")
+    assert r.status_code == 503
+    schema = r.json()["checks"]["schema"]
+    assert (schema["ok"], schema["error"]) == (False, "SchemaOutdated")
+
+
+def test_migrate_brings_a_schema_up_to_date(tmp_path):
+    bind = create_engine(f"sqlite:///{tmp_path}/fresh.db")
+    assert "table users" in pending(bind)
+    with pytest.raises(SchemaOutdated):
+        check_schema(bind)
+
+    assert migrate(bind)
+    assert pending(bind) == []
+    check_schema(bind)
+    assert migrate(bind) == []  # a second run changes nothing
+
+    # A column the models gained later is added to the existing table.
+    with bind.begin() as conn:
+        conn.exec_driver_sql("ALTER TABLE history_clears DROP COLUMN purged_at")
+    assert pending(bind) == ["column history_clears.purged_at"]
+    assert migrate(bind) == ["added column history_clears.purged_at"]
+    assert "purged_at" in {c["name"] for c in inspect(bind).get_columns("history_clears")}
+
+
+def test_download_cache_only_in_proxy_mode(tmp_path, monkeypatch):
+    root = tmp_path / "cache"
+    monkeypatch.setattr(app.files, "DOWNLOAD_CACHE_DIR", str(root))
+    monkeypatch.setattr(app.files, "_download_cache", None)
+
+    monkeypatch.setattr(app.files, "DOWNLOAD_MODE", "signed")
+    assert download_cache() is None
+    monkeypatch.setattr(app.files, "DOWNLOAD_MODE", "proxy")
+    assert download_cache(create=False) is None
+    assert not os.path.exists(root)
+
+    cache = download_cache()
+    assert os.path.isdir(root)
+    assert download_cache() is cache
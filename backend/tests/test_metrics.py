@@ -0,0 +1,57 @@
+import pytest
+
+import app.metrics
+from app.metrics import Counter, Histogram, Registry
+from app.models import User
+
+from conftest import register
+
+
+@pytest.fixture
+def admin(client, db):
+    account = register(client)
+    db.get(User, account["id"]).is_admin = True
+    db.commit()  # the ORM update evicts the cached principal
+    return account
+
+
+def test_exposition_format():
+    registry = Registry()
+    hits = registry.add(Counter("hits_total", "Hits.", ("route",)))
+    latency = registry.add(Histogram("latency_seconds", "Latency.", buckets=(0.1, 1.0)))
+    hits.inc(route='/a"b')
+    latency.observe(0.5)
+    latency.observe(2)
+
+    lines = registry.render().splitlines()
+    assert 'hits_total{route="/a\\"b"} 1' in lines
+    assert 'latency_seconds_bucket{le="0.1"} 0' in lines
+    assert 'latency_seconds_bucket{le="1"} 1' in lines
+    assert 'latency_seconds_bucket{le="+Inf"} 2' in lines
+    assert "latency_seconds_sum 2.5" in lines
+
+
+def test_metrics_are_never_public(client, user, admin):
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers=user["headers"]).status_code == 403
+
+    r = client.get("/metrics", headers=admin["headers"])
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain")
+
+
+def test_scraper_token(client, monkeypatch):
+    monkeypatch.setattr(app.metrics, "METRICS_TOKEN", "scrape-me")
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer scrape-me"}).status_code == 200
+
+
+def test_requests_are_counted_by_route_template(client, user, admin):
+    r = client.get("/api/files/123456789/preview", headers=user["headers"])
+    assert r.status_code == 404
+    assert "db;dur=" in r.headers["server-timing"]
+
+    body = client.get("/metrics", headers=admin["headers"]).text
+    assert 'route="/api/files/{file_id}/preview",status="404"' in body
+    assert "123456789" not in body
+    assert "db_pool_connections" in body
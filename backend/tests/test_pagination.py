@@ -0,0 +1,80 @@
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+
+from app.models import Activity, File
+from app.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
+
+from conftest import upload
+
+
+@pytest.mark.parametrize("value", [0, 1234, "report.pdf", datetime(2024, 5, 1, 12, 30, 15, 250)])
+def test_cursor_round_trip(value):
+    cursor = encode_cursor("size", "asc", value, 42)
+    expected = value.isoformat() if isinstance(value, datetime) else value
+    assert decode_cursor(cursor, "size", "asc") == (expected, 42)
+
+
+def test_cursor_for_another_order_is_rejected():
+    cursor = encode_cursor("size", "asc", 10, 1)
+    with pytest.raises(HTTPException) as e:
+        decode_cursor(cursor, "size", "desc")
+    assert e.value.status_code == 400
+    with pytest.raises(HTTPException):
+        decode_cursor("not-a-cursor", "size", "asc")
+
+
+def pages(client, user, path="/api/files/", **params):
+    """Follow X-Next-Cursor to the end; returns the ids in listing order."""
+    ids, cursor = [], None
+    while True:
+        query = dict(params, **({"cursor": cursor} if cursor else {}))
+        r = client.get(path, params=query, headers=user["headers"])
+        assert r.status_code == 200, r.text
+        ids += [f["id"] for f in r.json()]
+        cursor = r.headers.get(NEXT_CURSOR_HEADER)
+        if not cursor:
+            return ids
+
+
+@pytest.mark.parametrize("order", ["asc", "desc"])
+def test_pages_with_tied_sizes(client, user, order):
+    # Equal sizes, different content (no dedup): ties are broken by id.
+    ids = [upload(client, user, f"f{i}.bin", bytes([i]) * 50)["id"] for i in range(7)]
+
+    listed = pages(client, user, sort="size", order=order, limit=2)
+    assert listed == sorted(ids, reverse=order == "desc")
+
+
+def test_pages_with_tied_upload_times(client, user, db):
+    ids = [upload(client, user, f"f{i}.bin", bytes([i]) * (i + 1))["id"] for i in range(5)]
+    db.query(File).filter(File.id.in_(ids)).update(
+        {File.uploaded_at: datetime(2024, 1, 1)}, synchronize_session=False
+    )
+    db.commit()
+
+    assert pages(client, user, sort="uploaded_at", order="desc", limit=2) == sorted(
+        ids, reverse=True
+    )
+
+
+def test_pages_sorted_by_name(client, user):
+    names = ["b.bin", "a.bin", "c.bin", "a.bin"]
+    ids = [upload(client, user, n, bytes([i]) * 10)["id"] for i, n in enumerate(names)]
+
+    listed = pages(client, user, sort="name", order="asc", limit=3)
+    assert listed == [i for _, i in sorted(zip(names, ids))]
+
+
+def test_history_pages_with_tied_times(client, user, db):
+    at = datetime(2024, 1, 1, 9, 30)
+    db.add_all(
+        Activity(user_id=user["id"], action="upload", filename=f"f{i}.bin", created_at=at)
+        for i in range(5)
+    )
+    db.commit()
+    ids = [i for (i,) in db.query(Activity.id).filter(Activity.user_id == user["id"])]
+
+    listed = pages(client, user, "/api/auth/history", limit=2)
+    assert listed == sorted(ids, reverse=True)
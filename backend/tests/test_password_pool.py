@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+
+from app.auth import password_hasher
+from app.hashing import PasswordHasher, PoolSaturated, hash_secret
+from app.models import User
+
+from conftest import PASSWORD
+
+
+def test_pool_refuses_work_past_max_pending():
+    hasher = PasswordHasher(workers=1, max_pending=1, rounds=4)
+
+    async def two_at_once():
+        return await asyncio.gather(
+            hasher.hash("first"), hasher.hash("second"), return_exceptions=True
+        )
+
+    try:
+        first, second = asyncio.run(two_at_once())
+    finally:
+        hasher.close()
+    assert first.startswith("$2b$04$")
+    assert isinstance(second, PoolSaturated)
+    assert hasher.stats()["rejected"] == 1
+    assert hasher.pending == 0
+
+
+def test_saturated_pool_answers_503(client, user, monkeypatch):
+    monkeypatch.setattr(password_hasher, "max_pending", 0)
+    r = client.post("/api/auth/login", json={"email": user["email"], "password": PASSWORD})
+    assert r.status_code == 503
+    assert r.headers["Retry-After"] == "1"
+
+
+@pytest.mark.parametrize("password, status", [(PASSWORD, 200), ("wrong-password", 401)])
+def test_login_verifies_on_the_pool(client, user, password, status):
+    r = client.post("/api/auth/login", json={"email": user["email"], "password": password})
+    assert r.status_code == status
+
+
+def test_login_rehashes_at_new_cost(client, user, db):
+    db.query(User).filter(User.id == user["id"]).update(
+        {User.hashed_password: hash_secret(PASSWORD, 5)}
+    )
+    db.commit()
+
+    r = client.post("/api/auth/login", json={"email": user["email"], "password": PASSWORD})
+    assert r.status_code == 200
+    db.expire_all()
+    assert db.get(User, user["id"]).hashed_password.startswith("$2b$04$")
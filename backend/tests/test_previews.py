@@ -0,0 +1,86 @@
+import io
+import os
+
+import pytest
+
+from app.files import storage
+from app.models import File
+from app.previews import (
+    HAVE_PILLOW,
+    PreviewWorkers,
+    enqueue_missing_previews,
+    generate_preview,
+    preview_kind,
+    render_text,
+)
+
+from conftest import upload
+
+
+def test_preview_kind_and_text():
+    assert preview_kind("a.PNG", None) == "image"
+    assert preview_kind("blob", "image/webp") == "image"
+    assert preview_kind("notes.md", "application/octet-stream") == "text"
+    assert preview_kind("a.bin", "application/octet-stream") is None
+    assert render_text(b"1\n2\n3\n", lines=2) == b"1\n2"
+    assert render_text(b"\x00binary") is None
+
+
+def test_text_preview(client, user, db):
+    f = upload(client, user, "notes.txt", b"".join(b"line %d\n" % i for i in range(100)))
+    row = db.get(File, f["id"])
+    assert (row.preview_status, row.preview_kind) == ("ready", "text")
+
+    r = client.get(f"/api/files/{f['id']}/preview", headers=user["headers"])
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain")
+    assert r.text.splitlines()[:2] == ["line 0", "line 1"]
+    assert len(r.text.splitlines()) < 100
+
+
+@pytest.mark.skipif(not HAVE_PILLOW, reason="Pillow not installed")
+def test_image_thumbnail(client, user):
+    from PIL import Image
+
+    buf = io.BytesIO()
+    Image.new("RGB", (1200, 600), (200, 30, 30)).save(buf, "PNG")
+    f = upload(client, user, "photo.png", buf.getvalue())
+
+    r = client.get(f"/api/files/{f['id']}/preview", headers=user["headers"])
+    assert r.status_code == 200
+    assert r.headers["content-type"] == "image/jpeg"
+    with Image.open(io.BytesIO(r.content)) as thumb:
+        assert max(thumb.size) <= 256 and thumb.size[0] == 2 * thumb.size[1]
+
+
+def test_no_preview_for_binary_files(client, user, db):
+    f = upload(client, user, "data.txt", b"\x00" + os.urandom(100))
+    assert db.get(File, f["id"]).preview_status == "unsupported"
+    assert client.get(f"/api/files/{f['id']}/preview", headers=user["headers"]).status_code == 404
+
+
+def test_generating_is_idempotent(client, user, db):
+    f = upload(client, user, "again.txt", b"hello")
+    assert generate_preview(storage, f["id"]) is None  # already done
+
+    db.query(File).filter(File.id == f["id"]).update({File.preview_status: None})
+    db.commit()
+    assert generate_preview(storage, f["id"]) == "ready"
+    assert generate_preview(storage, 10 ** 9) is None
+
+
+def test_full_queue_drops_jobs_and_sweep_fills_free_slots(client, user, db):
+    workers = PreviewWorkers(storage, workers=1, queue_size=2)  # not started
+    assert workers.submit(1) and workers.submit(1)  # already queued: no new slot
+    assert workers.submit(2)
+    assert not workers.submit(3)
+    assert workers.stats()["dropped"] == 1
+    assert enqueue_missing_previews(workers) == 0
+
+    f = upload(client, user, "swept.txt", b"hello")
+    db.query(File).filter(File.id == f["id"]).update({File.preview_status: None})
+    db.commit()
+    workers = PreviewWorkers(storage, workers=1, queue_size=1000)
+    assert enqueue_missing_previews(workers) >= 1
+    assert f["id"] in workers._queued
+    generate_preview(storage, f["id"])  # leave the row done for other tests
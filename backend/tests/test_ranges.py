@@ -0,0 +1,113 @@
+import os
+
+import pytest
+from fastapi import HTTPException
+
+import app.files
+from app.files import download_cache, parse_range
+from app.storage import ObjectDiskCache
+
+from conftest import upload
+
+CONTENT = bytes(range(100))
+
+
+def test_parse_range():
+    assert parse_range(None, 100) is None
+    assert parse_range("bytes=0-9", 100) == (0, 9)
+    assert parse_range("bytes=90-", 100) == (90, 99)
+    assert parse_range("bytes=95-500", 100) == (95, 99)
+    assert parse_range("bytes=-5", 100) == (95, 99)
+    assert parse_range("bytes=-500", 100) == (0, 99)
+    assert parse_range("bytes=0-1,5-6", 100) is None
+    assert parse_range("items=0-9", 100) is None
+    with pytest.raises(HTTPException) as e:
+        parse_range("bytes=100-", 100)
+    assert e.value.status_code == 416
+    assert e.value.headers["Content-Range"] == "bytes */100"
+
+
+@pytest.fixture
+def content_url(client, user):
+    f = upload(client, user, "range.bin", CONTENT)
+    return f"/api/files/{f['id']}/content"
+
+
+def test_single_range(client, user, content_url):
+    r = client.get(content_url, headers={**user["headers"], "Range": "bytes=10-19"})
+    assert r.status_code == 206
+    assert r.headers["Content-Range"] == "bytes 10-19/100"
+    assert r.content == CONTENT[10:20]
+
+
+def test_suffix_range(client, user, content_url):
+    r = client.get(content_url, headers={**user["headers"], "Range": "bytes=-5"})
+    assert r.status_code == 206
+    assert r.headers["Content-Range"] == "bytes 95-99/100"
+    assert r.content == CONTENT[-5:]
+
+
+def test_unsatisfiable_range(client, user, content_url):
+    r = client.get(content_url, headers={**user["headers"], "Range": "bytes=1000-"})
+    assert r.status_code == 416
+    assert r.headers["Content-Range"] == "bytes */100"
+
+
+def test_no_range_sends_whole_file(client, user, content_url):
+    r = client.get(content_url, headers=user["headers"])
+    assert r.status_code == 200
+    assert r.content == CONTENT
+
+
+def test_range_of_compressed_file(client, user):
+    content = b"compressible line of text\n" * 1000
+    f = upload(client, user, "big.bin", content)
+    r = client.get(
+        f"/api/files/{f['id']}/content",
+        headers={**user["headers"], "Range": "bytes=5000-5099"},
+    )
+    assert r.status_code == 206
+    assert r.headers["Content-Range"] == f"bytes 5000-5099/{len(content)}"
+    assert r.content == content[5000:5100]
+
+
+def test_range_miss_fills_the_cache_once(client, user, monkeypatch):
+    monkeypatch.setattr(app.files, "DOWNLOAD_MODE", "proxy")
+    cache = download_cache()
+    content = os.urandom(100)  # not already cached through another test's blob
+    f = upload(client, user, "cached.bin", content)
+    url = f"/api/files/{f['id']}/content"
+    before = cache.stats()
+
+    for _ in range(2):
+        r = client.get(url, headers={**user["headers"], "Range": "bytes=10-19"})
+        assert r.content == content[10:20]
+    after = cache.stats()
+    # The fill read the whole object once; both slices came from the cache.
+    assert after["bytes_from_storage"] - before["bytes_from_storage"] == 100
+    assert after["bytes_from_cache"] - before["bytes_from_cache"] == 20
+    assert (after["misses"] - before["misses"], after["hits"] - before["hits"]) == (1, 1)
+
+
+def test_disk_cache_evicts_least_recently_used(tmp_path):
+    cache = ObjectDiskCache(str(tmp_path), max_bytes=25, max_object_bytes=100)
+    assert not cache.cacheable(26)
+    for name in ("a", "b"):
+        list(cache.tee(iter([b"x" * 10]), name))
+    assert cache.lookup("a") is not None
+    list(cache.tee(iter([b"y" * 10]), "c"))
+
+    assert cache.lookup("b") is None
+    assert cache.lookup("a").read_bytes() == b"x" * 10
+    assert cache.stats()["evictions"] == 1
+    # Entries survive a restart.
+    assert ObjectDiskCache(str(tmp_path), 25, 100).stats()["entries"] == 2
+
+
+def test_interrupted_fill_is_not_cached(tmp_path):
+    cache = ObjectDiskCache(str(tmp_path), max_bytes=100, max_object_bytes=100)
+    stream = cache.tee(iter([b"a" * 10, b"b" * 10]), "obj")
+    next(stream)
+    stream.close()
+    assert cache.lookup("obj") is None
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,57 @@
+import json
+import uuid
+from datetime import datetime
+
+import pytest
+
+import app.responses
+from app.files import file_to_dict
+from app.models import File, User
+from app.responses import dumps, json_array_stream
+
+from conftest import register, upload
+
+SAMPLE = {"name": "é.txt", "at": datetime(2024, 1, 2, 3, 4, 5, 678901), "n": [1, None, True]}
+
+
+@pytest.mark.parametrize("fast", [True, False])
+def test_dumps_with_and_without_orjson(fast, monkeypatch):
+    if not fast:
+        monkeypatch.setattr(app.responses, "orjson", None)
+    elif app.responses.orjson is None:
+        pytest.skip("orjson not installed")
+    assert json.loads(dumps(SAMPLE)) == {
+        "name": "é.txt", "at": "2024-01-02T03:04:05.678901", "n": [1, None, True],
+    }
+
+
+@pytest.mark.parametrize("count", [0, 1, 3, 7])
+def test_array_stream_is_one_array(count):
+    items = [{"i": i} for i in range(count)]
+    chunks = list(json_array_stream(items, batch_size=3))
+    assert json.loads(b"".join(chunks)) == items
+    assert len(chunks) == 2 + -(-count // 3)
+
+
+def test_listing_matches_the_entity_shape(client, user, db):
+    upload(client, user, "notes.txt", b"hello " + uuid.uuid4().bytes)
+    (listed,) = client.get("/api/files/", headers=user["headers"]).json()
+
+    entity = db.get(File, listed["id"])
+    expected = json.loads(dumps(file_to_dict(entity)))
+    assert listed == expected
+    assert listed["preview"]["kind"] == "text"
+
+
+def test_admin_user_list_streams_every_user(client, db):
+    admin = register(client)
+    db.get(User, admin["id"]).is_admin = True
+    db.commit()
+    other = register(client)
+
+    r = client.get("/api/admin/users", headers=admin["headers"])
+    assert r.status_code == 200
+    users = {u["email"]: u for u in r.json()}
+    assert users[admin["email"]]["is_admin"] is True
+    assert users[other["email"]]["is_admin"] is False
+    assert set(users[other["email"]]) >= {"id", "email", "full_name", "created_at"}
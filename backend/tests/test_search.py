@@ -0,0 +1,82 @@
+import uuid
+
+from app.pagination import NEXT_CURSOR_HEADER
+
+from conftest import register, upload
+
+
+def search(client, user, **params):
+    r = client.get("/api/files/search", params=params, headers=user["headers"])
+    assert r.status_code == 200, r.text
+    return [f["original_filename"] for f in r.json()]
+
+
+def add(client, user, *names):
+    for name in names:
+        upload(client, user, name, uuid.uuid4().bytes)
+
+
+def test_ranked_exact_then_prefix_then_substring(client, user):
+    add(client, user, "old report.pdf", "report.pdf", "report", "report-2024.pdf", "notes.txt")
+    assert search(client, user, q="report") == [
+        "report", "report.pdf", "report-2024.pdf", "old report.pdf",
+    ]
+
+
+def test_filters_combine(client, user):
+    add(client, user, "tax 2023.pdf", "tax 2024.pdf", "tax 2024.xlsx", "2024 tax.PDF", "plan.pdf")
+    assert sorted(search(client, user, q="tax 2024")) == ["2024 tax.PDF", "tax 2024.pdf", "tax 2024.xlsx"]
+    assert sorted(search(client, user, q="2024", ext="pdf")) == ["2024 tax.PDF", "tax 2024.pdf"]
+    assert sorted(search(client, user, prefix="tax", ext=".xlsx, pdf")) == [
+        "tax 2023.pdf", "tax 2024.pdf", "tax 2024.xlsx",
+    ]
+    # Shorter than a trigram: answered without the index.
+    assert search(client, user, q="pl") == ["plan.pdf"]
+
+
+def test_wildcards_are_literal(client, user):
+    add(client, user, "100% done.txt", "1000 done.txt", "a_b.txt", "axb.txt")
+    assert search(client, user, q="100%") == ["100% done.txt"]
+    assert search(client, user, q="a_b") == ["a_b.txt"]
+
+
+def test_only_own_files(client, user):
+    other = register(client)
+    add(client, other, "secret plans.txt")
+    add(client, user, "my plans.txt")
+    assert search(client, user, q="plans") == ["my plans.txt"]
+
+
+def test_pages_follow_the_ranking(client, user):
+    names = ["page"] + [f"page {i}.txt" for i in range(5)] + [f"a page {i}.txt" for i in range(3)]
+    add(client, user, *names)
+
+    seen, cursor = [], None
+    while True:
+        params = {"q": "page", "limit": 3, **({"cursor": cursor} if cursor else {})}
+        r = client.get("/api/files/search", params=params, headers=user["headers"])
+        seen += [f["original_filename"] for f in r.json()]
+        cursor = r.headers.get(NEXT_CURSOR_HEADER)
+        if not cursor:
+            break
+    assert seen == search(client, user, q="page", limit=50)
+    assert sorted(seen) == sorted(names)
+
+
+def test_cursor_is_bound_to_its_search(client, user):
+    add(client, user, *(f"doc {i}.txt" for i in range(3)))
+    r = client.get("/api/files/search", params={"q": "doc", "limit": 1}, headers=user["headers"])
+    cursor = r.headers[NEXT_CURSOR_HEADER]
+
+    for params in ({"q": "doc 1"}, {"q": "doc", "ext": "txt"}, {"prefix": "doc"}):
+        r = client.get(
+            "/api/files/search", params={**params, "cursor": cursor}, headers=user["headers"]
+        )
+        assert r.status_code == 400
+    r = client.get("/api/files/search", params={"q": "doc", "cursor": cursor}, headers=user["headers"])
+    assert r.status_code == 200
+
+
+def test_empty_search_is_refused(client, user):
+    r = client.get("/api/files/search", params={"q": "  "}, headers=user["headers"])
+    assert r.status_code == 400
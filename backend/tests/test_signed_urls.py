@@ -0,0 +1,89 @@
+import uuid
+from types import SimpleNamespace
+
+import app.files
+import app.storage
+from app.files import signed_urls, storage
+from app.models import File
+from app.storage import SignedURLCache
+
+from conftest import register, upload
+
+
+def test_cache_reuses_urls_with_time_left(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(app.storage, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    cache = SignedURLCache(max_entries=10, min_remaining=60)
+
+    cache.put("a", "https://a", expires_in=300)
+    assert cache.get("a") == "https://a"
+    now[0] += 239
+    assert cache.get("a") == "https://a"
+    now[0] += 2  # under a minute left: sign again
+    assert cache.get("a") is None
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["entries"] == 0
+
+
+def test_cache_evicts_least_recently_used():
+    cache = SignedURLCache(max_entries=2)
+    cache.put("a", "https://a", 300)
+    cache.put("b", "https://b", 300)
+    cache.get("a")
+    cache.put("c", "https://c", 300)
+    assert cache.get("b") is None
+    assert cache.get("a") == "https://a"
+    cache.discard(["a"])
+    assert cache.get("a") is None
+    assert cache.stats()["evictions"] == 1
+
+
+def count_signing(monkeypatch):
+    batches = []
+    sign = storage.create_signed_urls
+    monkeypatch.setattr(
+        storage, "create_signed_urls",
+        lambda paths, expires_in: batches.append(list(paths)) or sign(paths, expires_in),
+    )
+    return batches
+
+
+def test_batch_signs_owned_files_once(client, user, monkeypatch):
+    batches = count_signing(monkeypatch)
+    ids = [upload(client, user, f"{i}.bin", uuid.uuid4().bytes)["id"] for i in range(3)]
+
+    r = client.post("/api/files/signed-urls", json={"file_ids": ids + [10 ** 9]}, headers=user["headers"])
+    assert r.status_code == 200
+    body = r.json()
+    assert sorted(body["urls"]) == sorted(map(str, ids))
+    assert body["missing"] == [10 ** 9]
+    assert len(batches) == 1 and len(batches[0]) == 3
+
+    # Served from the cache the second time.
+    again = client.post("/api/files/signed-urls", json={"file_ids": ids}, headers=user["headers"])
+    assert again.json()["urls"] == body["urls"]
+    assert len(batches) == 1
+
+
+def test_batch_hides_other_users_files(client, user):
+    other = register(client)
+    theirs = upload(client, other, "theirs.bin", uuid.uuid4().bytes)
+
+    r = client.post("/api/files/signed-urls", json={"file_ids": [theirs["id"]]}, headers=user["headers"])
+    assert r.json() == {"urls": {}, "missing": [theirs["id"]]}
+
+
+def test_batch_size_is_limited(client, user, monkeypatch):
+    monkeypatch.setattr(app.files, "SIGNED_URL_BATCH_LIMIT", 2)
+    r = client.post("/api/files/signed-urls", json={"file_ids": [1, 2, 3]}, headers=user["headers"])
+    assert r.status_code == 400
+
+
+def test_delete_forgets_cached_url(client, user, db):
+    f = upload(client, user, "a.bin", uuid.uuid4().bytes)
+    client.post("/api/files/signed-urls", json={"file_ids": [f["id"]]}, headers=user["headers"])
+    path = db.query(File.stored_filename).filter(File.id == f["id"]).scalar()
+    assert signed_urls.get(path) is not None
+
+    client.delete(f"/api/files/{f['id']}", headers=user["headers"])
+    assert signed_urls.get(path) is None
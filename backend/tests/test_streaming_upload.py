@@ -0,0 +1,135 @@
+import asyncio
+import io
+import os
+
+import pytest
+from fastapi import HTTPException, UploadFile
+
+import app.files
+from app.body_limit import BodyLimitMiddleware
+from app.files import iter_upload_chunks
+from app.models import File
+from app.storage import LocalStorage
+
+from conftest import upload
+
+
+class CountingReader(io.BytesIO):
+    def __init__(self, data: bytes):
+        super().__init__(data)
+        self.reads = 0
+
+    def read(self, size=-1):
+        self.reads += 1
+        return super().read(size)
+
+
+def test_upload_is_read_in_chunks(monkeypatch):
+    monkeypatch.setattr(app.files, "UPLOAD_CHUNK_SIZE", 1000)
+    f = UploadFile(io.BytesIO(b"x" * 3500), filename="a.bin")
+
+    assert [len(c) for c in iter_upload_chunks(f, limit=10 ** 6)] == [1000, 1000, 1000, 500]
+    # Each call starts over, so a failed storage attempt can be retried.
+    assert sum(len(c) for c in iter_upload_chunks(f, limit=10 ** 6)) == 3500
+
+
+def test_read_stops_once_over_limit(monkeypatch):
+    monkeypatch.setattr(app.files, "UPLOAD_CHUNK_SIZE", 1000)
+    source = CountingReader(b"x" * 10000)
+    f = UploadFile(source, filename="a.bin")
+
+    with pytest.raises(HTTPException) as e:
+        for _ in iter_upload_chunks(f, limit=2500):
+            pass
+    assert e.value.status_code == 413
+    assert source.reads == 3
+
+
+def test_local_storage_writes_chunks_as_they_arrive(tmp_path):
+    storage = LocalStorage(str(tmp_path))
+    chunk = b"y" * (256 * 1024)
+    on_disk = []
+
+    def chunks():
+        for _ in range(3):
+            yield chunk
+            (part,) = [p for p in tmp_path.glob("u/.*.part")]
+            on_disk.append(part.stat().st_size)
+
+    assert storage.upload_stream("u/a.bin", chunks(), "application/octet-stream") == 3 * len(chunk)
+    assert on_disk == [len(chunk), 2 * len(chunk), 3 * len(chunk)]
+    assert os.path.getsize(tmp_path / "u" / "a.bin") == 3 * len(chunk)
+    assert list(tmp_path.glob("u/.*.part")) == []
+
+
+def test_chunked_upload_round_trip(client, user, monkeypatch):
+    monkeypatch.setattr(app.files, "UPLOAD_CHUNK_SIZE", 1000)
+    content = os.urandom(5500)
+    f = upload(client, user, "random.bin", content)
+    assert f["size_bytes"] == len(content)
+
+    r = client.get(f"/api/files/{f['id']}/content", headers=user["headers"])
+    assert r.content == content
+
+
+def test_oversize_upload_leaves_nothing(client, user, db, monkeypatch):
+    monkeypatch.setattr(app.files, "MAX_FILE_SIZE_BYTES", 1000)
+    r = client.post(
+        "/api/files/upload",
+        files={"file": ("big.bin", b"x" * 5000, "application/octet-stream")},
+        headers=user["headers"],
+    )
+    assert r.status_code == 413
+    assert db.query(File).filter(File.user_id == user["id"]).count() == 0
+
+
+def call(middleware, method: str, path: str, headers, bodies):
+    """Drive an ASGI app; returns (status, receive() calls)."""
+    messages = [{"type": "http.request", "body": b, "more_body": True} for b in bodies]
+    messages[-1]["more_body"] = False
+    calls, sent = [], []
+
+    async def receive():
+        calls.append(1)
+        return messages[len(calls) - 1] if len(calls) <= len(messages) else {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": method, "path": path, "headers": headers}
+    asyncio.run(middleware(scope, receive, send))
+    (start,) = [m for m in sent if m["type"] == "http.response.start"]
+    return start["status"], len(calls)
+
+
+async def read_all(scope, receive, send):
+    """Stand-in for an upload route: read the whole body, then answer 200."""
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            raise OSError("client went away")
+        if not message.get("more_body"):
+            break
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+def test_body_over_limit_is_rejected_before_it_is_read():
+    middleware = BodyLimitMiddleware(read_all, limit=1000)
+    status, reads = call(middleware, "POST", "/api/files/upload", [], [b"x" * 100] * 100)
+    assert status == 413
+    assert reads == 11
+
+
+def test_declared_length_over_limit_is_rejected_unread():
+    middleware = BodyLimitMiddleware(read_all, limit=1000)
+    headers = [(b"content-length", b"10000")]
+    status, reads = call(middleware, "POST", "/api/files/upload", headers, [b"x" * 100] * 100)
+    assert status == 413
+    assert reads == 0
+
+
+def test_body_within_limit_and_other_routes_pass():
+    middleware = BodyLimitMiddleware(read_all, limit=1000)
+    assert call(middleware, "POST", "/api/files/upload", [], [b"x" * 100] * 10) == (200, 10)
+    assert call(middleware, "POST", "/api/auth/login", [], [b"x" * 100] * 20) == (200, 20)
@@ -0,0 +1,127 @@
+import os
+import threading
+
+import pytest
+
+import app.uploads
+from app.files import storage
+from app.models import File, UploadSession, UserUsage
+
+from conftest import stored_path
+
+PART = 1000
+
+
+@pytest.fixture(autouse=True)
+def small_parts(monkeypatch):
+    monkeypatch.setattr(app.uploads, "UPLOAD_PART_SIZE", PART)
+
+
+def create(client, user, content: bytes, name: str = "a.bin") -> str:
+    r = client.post(
+        "/api/files/uploads/",
+        json={"filename": name, "size_bytes": len(content)},
+        headers=user["headers"],
+    )
+    assert r.status_code == 200, r.text
+    return r.json()["session_id"]
+
+
+def put_part(client, user, session_id: str, n: int, data: bytes):
+    return client.put(
+        f"/api/files/uploads/{session_id}/parts/{n}",
+        files={"file": ("part", data)},
+        headers=user["headers"],
+    )
+
+
+def parts(content: bytes):
+    return [content[i:i + PART] for i in range(0, len(content), PART)]
+
+
+def test_parts_in_any_order_then_commit(client, user, db):
+    content = os.urandom(2500)
+    sid = create(client, user, content)
+    chunks = parts(content)
+
+    for n in (2, 0):
+        assert put_part(client, user, sid, n, chunks[n]).status_code == 200
+    r = client.get(f"/api/files/uploads/{sid}", headers=user["headers"])
+    assert r.json()["part_count"] == 3
+    assert r.json()["parts_done"] == [0, 2]
+
+    # Resuming: only the missing part is sent.
+    assert put_part(client, user, sid, 1, chunks[1]).status_code == 200
+    r = client.post(f"/api/files/uploads/{sid}/commit", headers=user["headers"])
+    assert r.status_code == 200, r.text
+    f = r.json()
+
+    body = client.get(f"/api/files/{f['id']}/content", headers=user["headers"]).content
+    assert body == content
+    assert not os.path.exists(stored_path(f"{user['id']}/.parts/{sid}/0"))
+    assert client.get(f"/api/files/uploads/{sid}", headers=user["headers"]).status_code == 404
+
+
+def test_commit_with_missing_parts_is_refused(client, user):
+    content = os.urandom(2500)
+    sid = create(client, user, content)
+    put_part(client, user, sid, 0, parts(content)[0])
+
+    r = client.post(f"/api/files/uploads/{sid}/commit", headers=user["headers"])
+    assert r.status_code == 409
+    assert "1, 2" in r.json()["detail"]
+
+
+def test_part_of_wrong_size_is_refused(client, user):
+    sid = create(client, user, os.urandom(2500))
+    assert put_part(client, user, sid, 0, b"short").status_code == 400
+    assert put_part(client, user, sid, 3, b"x" * PART).status_code == 400
+    assert client.get(f"/api/files/uploads/{sid}", headers=user["headers"]).json()["parts_done"] == []
+
+
+def test_abort_removes_parts(client, user, db):
+    content = os.urandom(1500)
+    sid = create(client, user, content)
+    put_part(client, user, sid, 0, parts(content)[0])
+    assert os.path.exists(stored_path(f"{user['id']}/.parts/{sid}/0"))
+
+    assert client.delete(f"/api/files/uploads/{sid}", headers=user["headers"]).status_code == 200
+    assert not os.path.exists(stored_path(f"{user['id']}/.parts/{sid}/0"))
+    assert db.query(UploadSession).filter(UploadSession.id == sid).count() == 0
+
+
+def test_concurrent_commits_record_one_file(client, user, db, monkeypatch):
+    content = os.urandom(1500)
+    sid = create(client, user, content)
+    for n, data in enumerate(parts(content)):
+        put_part(client, user, sid, n, data)
+
+    # Both commits finish their storage upload before either claims the session.
+    barrier = threading.Barrier(2)
+    upload_stream = storage.upload_stream
+
+    def in_step(*args):
+        written = upload_stream(*args)
+        barrier.wait(5)
+        return written
+
+    monkeypatch.setattr(storage, "upload_stream", in_step)
+    statuses = []
+
+    def commit():
+        r = client.post(f"/api/files/uploads/{sid}/commit", headers=user["headers"])
+        statuses.append(r.status_code)
+
+    threads = [threading.Thread(target=commit) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert sorted(statuses) == [200, 409]
+    assert db.query(File).filter(File.user_id == user["id"]).count() == 1
+    usage = db.query(UserUsage).filter(UserUsage.user_id == user["id"]).one()
+    assert (usage.file_count, usage.bytes_used) == (1, len(content))
+    # The losing commit's object is removed again.
+    user_dir = os.path.dirname(stored_path(f"{user['id']}/x"))
+    assert len([n for n in os.listdir(user_dir) if not n.startswith(".")]) == 1
@@ -0,0 +1,102 @@
+from app.models import File, UserUsage
+from app.usage import backfill_usage, get_usage, get_version, reconcile_usage
+
+from conftest import upload
+
+
+def set_quota(db, user_id: int, quota: int) -> None:
+    db.query(UserUsage).filter(UserUsage.user_id == user_id).update(
+        {UserUsage.quota_bytes: quota}
+    )
+    db.commit()
+
+
+def test_upload_over_quota_is_rejected(client, user, db):
+    upload(client, user, "a.bin", b"x" * 600)
+    set_quota(db, user["id"], 1000)
+
+    r = client.post(
+        "/api/files/upload",
+        files={"file": ("b.bin", b"y" * 600, "application/octet-stream")},
+        headers=user["headers"],
+    )
+    assert r.status_code == 413
+
+    usage = client.get("/api/files/storage", headers=user["headers"]).json()
+    assert usage["total_bytes"] == 600
+    assert usage["file_count"] == 1
+
+
+def test_upload_and_delete_bump_version(client, user, db):
+    start = get_version(db, user["id"])
+
+    f = upload(client, user, "a.bin", b"x" * 100)
+    db.expire_all()
+    uploaded = get_version(db, user["id"])
+    assert uploaded > start
+
+    client.delete(f"/api/files/{f['id']}", headers=user["headers"])
+    db.expire_all()
+    assert get_version(db, user["id"]) == uploaded + 1
+
+
+def test_rejected_upload_keeps_version(client, user, db):
+    upload(client, user, "a.bin", b"x" * 600)
+    set_quota(db, user["id"], 1000)
+    before = get_version(db, user["id"])
+
+    client.post(
+        "/api/files/upload",
+        files={"file": ("b.bin", b"y" * 600, "application/octet-stream")},
+        headers=user["headers"],
+    )
+    db.expire_all()
+    assert get_version(db, user["id"]) == before
+
+
+def test_register_creates_counters(client, user, db):
+    usage = db.query(UserUsage).filter(UserUsage.user_id == user["id"]).one()
+    assert (usage.bytes_used, usage.file_count, usage.version) == (0, 0, 0)
+
+
+def test_get_usage_never_commits(client, user, db):
+    db.query(UserUsage).filter(UserUsage.user_id == user["id"]).delete()
+    db.commit()
+    upload_row = File(
+        user_id=user["id"], original_filename="x.bin", stored_filename="x", size_bytes=7
+    )
+    db.add(upload_row)
+    db.flush()
+
+    usage = get_usage(db, user["id"])
+    assert (usage.bytes_used, usage.file_count) == (7, 1)
+    db.rollback()  # the caller's transaction: both the row and the File go
+    assert db.query(UserUsage).filter(UserUsage.user_id == user["id"]).first() is None
+    assert db.query(File).filter(File.user_id == user["id"]).count() == 0
+    get_usage(db, user["id"])
+    db.commit()
+
+
+def test_backfill_creates_missing_counters(client, user, db):
+    upload(client, user, "a.bin", b"x" * 300)
+    db.query(UserUsage).filter(UserUsage.user_id == user["id"]).delete()
+    db.commit()
+
+    assert backfill_usage(db) >= 1
+    usage = db.query(UserUsage).filter(UserUsage.user_id == user["id"]).one()
+    assert (usage.bytes_used, usage.file_count) == (300, 1)
+    assert backfill_usage(db) == 0
+
+
+def test_reconcile_fixes_drift(client, user, db):
+    upload(client, user, "a.bin", b"x" * 300)
+    db.query(UserUsage).filter(UserUsage.user_id == user["id"]).update(
+        {UserUsage.bytes_used: 5, UserUsage.file_count: 9}
+    )
+    db.commit()
+    before = get_version(db, user["id"])
+
+    fixed = [d for d in reconcile_usage(db) if d["user_id"] == user["id"]]
+    assert fixed == [{"user_id": user["id"], "bytes_used": [5, 300], "file_count": [9, 1]}]
+    db.expire_all()
+    assert get_version(db, user["id"]) == before + 1
@@ -1,30 +1,99 @@
 import React, { useState, useEffect, useRef } from "react";
-import { getFiles, downloadFile, deleteFile, uploadFile } from "../services/api";
+import {
+  getFilesPage,
+  searchFiles,
+  downloadFile,
+  deleteFile,
+  uploadFile,
+  bulkDeleteFiles,
+  bulkDownloadFiles,
+  getPreview,
+} from "../services/api";
 import UploadModal from "../components/UploadModal";
 import "../styles/global.css";
 import "../styles/dashboard.css";
 import "../styles/files.css";
 
+const PARALLEL_UPLOAD_THRESHOLD = 8 * 1024 * 1024; // 8 MB
+const PAGE_SIZE = 100;
+const SEARCH_DELAY_MS = 250;
+
+const SORT_OPTIONS = [
+  { value: "uploaded_at:desc", label: "Newest first" },
+  { value: "uploaded_at:asc", label: "Oldest first" },
+  { value: "name:asc", label: "Name (A–Z)" },
+  { value: "name:desc", label: "Name (Z–A)" },
+  { value: "size:desc", label: "Largest first" },
+  { value: "size:asc", label: "Smallest first" },
+];
+
+// Previews never change for a file id, so keep what was fetched for the session.
+const previewCache = new Map();
+
+function FileIcon({ file }) {
+  const { preview } = file;
+  const [content, setContent] = useState(() => preview && previewCache.get(preview.url));
+
+  useEffect(() => {
+    if (!preview || previewCache.has(preview.url)) return;
+    let active = true;
+    getPreview(preview)
+      .then((value) => {
+        previewCache.set(preview.url, value);
+        if (active) setContent(value);
+      })
+      .catch(() => {});
+    return () => {
+      active = false;
+    };
+  }, [preview?.url]);
+
+  if (preview?.kind === "image" && content) {
+    return <img className="file-thumb" src={content} alt="" loading="lazy" />;
+  }
+  return (
+    <span className="file-icon" title={preview?.kind === "text" ? content : undefined}>
+      📄
+    </span>
+  );
+}
+
 export default function Files({ user, onRefresh }) {
   const [files, setFiles] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [sortKey, setSortKey] = useState(SORT_OPTIONS[0].value);
+  const [query, setQuery] = useState("");
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [error, setError] = useState("");
   const [uploadModal, setUploadModal] = useState(false);
   const [droppedFile, setDroppedFile] = useState(null);
   const [dragOver, setDragOver] = useState(false);
   const [downloadingId, setDownloadingId] = useState(null);
   const [deletingId, setDeletingId] = useState(null);
+  const [selected, setSelected] = useState(() => new Set());
+  const [bulkBusy, setBulkBusy] = useState(false);
   const loadIdRef = useRef(0);
 
+  const fetchPage = (cursor) => {
+    // While searching, results come ranked by relevance instead of sortKey.
+    if (query.trim()) return searchFiles({ q: query.trim(), cursor, limit: PAGE_SIZE });
+    const [sort, order] = sortKey.split(":");
+    return getFilesPage({ cursor, limit: PAGE_SIZE, sort, order });
+  };
+
+  // (Re)load the first page; later pages are appended by loadMore.
   const load = async () => {
     const id = loadIdRef.current + 1;
     loadIdRef.current = id;
     setLoading(true);
     setError("");
     try {
-      const data = await getFiles();
+      const page = await fetchPage(null);
       if (loadIdRef.current === id) {
-        setFiles(data);
+        setFiles(page.items);
+        setNextCursor(page.nextCursor);
+        setSelected(new Set());
       }
     } catch (err) {
       if (loadIdRef.current === id) {
@@ -37,12 +106,31 @@ export default function Files({ user, onRefresh }) {
     }
   };
 
+  const loadMore = async () => {
+    if (!nextCursor || loadingMore) return;
+    const id = loadIdRef.current;
+    setLoadingMore(true);
+    try {
+      const page = await fetchPage(nextCursor);
+      if (loadIdRef.current === id) {
+        setFiles((prev) => [...prev, ...page.items]);
+        setNextCursor(page.nextCursor);
+      }
+    } catch (err) {
+      setError(err.message || "Failed to load files");
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   useEffect(() => {
-    load();
-  }, []);
+    const timer = setTimeout(load, query ? SEARCH_DELAY_MS : 0);
+    return () => clearTimeout(timer);
+  }, [sortKey, query]);
 
   const handleUpload = async (file) => {
-    await uploadFile(file);
+    // Large files go up as a resumable multipart session with parallel parts.
+    await uploadFile(file, { parallel: file.size > PARALLEL_UPLOAD_THRESHOLD });
     await load();
     onRefresh?.();
   };
@@ -74,6 +162,51 @@ export default function Files({ user, onRefresh }) {
     }
   };
 
+  const toggleSelected = (id) => {
+    setSelected((prev) => {
+      const next = new Set(prev);
+      if (next.has(id)) next.delete(id);
+      else next.add(id);
+      return next;
+    });
+  };
+
+  const allSelected = files.length > 0 && selected.size === files.length;
+  const toggleAll = () => {
+    setSelected(allSelected ? new Set() : new Set(files.map((f) => f.id)));
+  };
+
+  const handleBulkDownload = async () => {
+    if (bulkBusy || selected.size === 0) return;
+    setBulkBusy(true);
+    setError("");
+    try {
+      const { missing } = await bulkDownloadFiles([...selected]);
+      if (missing.length) setError(`${missing.length} file(s) could not be downloaded`);
+    } catch (err) {
+      setError(err.message || "Download failed");
+    } finally {
+      setBulkBusy(false);
+    }
+  };
+
+  const handleBulkDelete = async () => {
+    if (bulkBusy || selected.size === 0) return;
+    if (!window.confirm(`Delete ${selected.size} selected file(s)?`)) return;
+    setBulkBusy(true);
+    setError("");
+    try {
+      const { failed } = await bulkDeleteFiles([...selected]);
+      await load();
+      onRefresh?.();
+      if (failed.length) setError(`${failed.length} file(s) could not be deleted`);
+    } catch (err) {
+      setError(err.message || "Delete failed");
+    } finally {
+      setBulkBusy(false);
+    }
+  };
+
   const formatSize = (bytes) => {
     if (bytes < 1024) return `${bytes} B`;
     if (bytes < 1024 * 1024) return `${(bytes / 1024).toFixed(1)} KB`;
@@ -102,7 +235,8 @@ export default function Files({ user, onRefresh }) {
     setDroppedFile(null);
   };
 
-  if (loading && files.length === 0) {
+  // Not while searching: the spinner would replace (and unfocus) the search box.
+  if (loading && files.length === 0 && !query) {
     return (
       <div className="app-content app-loading">
         <div className="spinner" />
@@ -114,9 +248,51 @@ export default function Files({ user, onRefresh }) {
     <div className="app-content">
       <div className="page-header">
         <h1 className="page-title">Files</h1>
-        <button type="button" className="btn btn-primary" onClick={() => setUploadModal(true)}>
-          Upload file
-        </button>
+        <div className="files-toolbar">
+          <input
+            type="search"
+            className="files-search"
+            placeholder="Search files"
+            value={query}
+            onChange={(e) => setQuery(e.target.value)}
+            aria-label="Search files by name"
+          />
+          <select
+            className="files-sort"
+            value={sortKey}
+            onChange={(e) => setSortKey(e.target.value)}
+            disabled={Boolean(query.trim())}
+            aria-label="Sort files"
+          >
+            {SORT_OPTIONS.map((o) => (
+              <option key={o.value} value={o.value}>{o.label}</option>
+            ))}
+          </select>
+          {selected.size > 0 && (
+            <>
+              <span className="files-selected-count">{selected.size} selected</span>
+              <button
+                type="button"
+                className="btn btn-ghost"
+                onClick={handleBulkDownload}
+                disabled={bulkBusy}
+              >
+                Download selected
+              </button>
+              <button
+                type="button"
+                className="btn btn-danger"
+                onClick={handleBulkDelete}
+                disabled={bulkBusy}
+              >
+                {bulkBusy ? "…" : "Delete selected"}
+              </button>
+            </>
+          )}
+          <button type="button" className="btn btn-primary" onClick={() => setUploadModal(true)}>
+            Upload file
+          </button>
+        </div>
       </div>
       {error && <p className="msg-error">{error}</p>}
 
@@ -134,6 +310,14 @@ export default function Files({ user, onRefresh }) {
         <table>
           <thead>
             <tr>
+              <th className="file-select">
+                <input
+                  type="checkbox"
+                  checked={allSelected}
+                  onChange={toggleAll}
+                  aria-label="Select all files"
+                />
+              </th>
               <th>Name</th>
               <th>Size</th>
               <th>Uploaded</th>
@@ -142,10 +326,18 @@ export default function Files({ user, onRefresh }) {
           </thead>
           <tbody>
             {files.map((f) => (
-              <tr key={f.id}>
+              <tr key={f.id} className={selected.has(f.id) ? "selected" : ""}>
+                <td className="file-select">
+                  <input
+                    type="checkbox"
+                    checked={selected.has(f.id)}
+                    onChange={() => toggleSelected(f.id)}
+                    aria-label={`Select ${f.original_filename}`}
+                  />
+                </td>
                 <td>
                   <div className="file-cell">
-                    <span className="file-icon">📄</span>
+                    <FileIcon file={f} />
                     <span className="file-name">{f.original_filename}</span>
                   </div>
                 </td>
@@ -178,7 +370,16 @@ export default function Files({ user, onRefresh }) {
           </tbody>
         </table>
         {files.length === 0 && !loading && (
-          <p className="files-empty">No files yet. Upload one to get started.</p>
+          <p className="files-empty">
+            {query.trim() ? "No files match your search." : "No files yet. Upload one to get started."}
+          </p>
+        )}
+        {nextCursor && (
+          <div className="list-load-more">
+            <button type="button" className="btn btn-ghost" onClick={loadMore} disabled={loadingMore}>
+              {loadingMore ? "Loading…" : "Load more"}
+            </button>
+          </div>
         )}
       </div>
 
@@ -1,5 +1,5 @@
 import React, { useState, useEffect } from "react";
-import { getHistory, clearHistory } from "../services/api";
+import { getHistoryPage, clearHistory } from "../services/api";
 import "../styles/global.css";
 import "../styles/dashboard.css";
 
@@ -11,20 +11,39 @@ function getActionIcon(action) {
   return "upload";
 }
 
+const PAGE_SIZE = 50;
+
 export default function History() {
   const [items, setItems] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [clearLoading, setClearLoading] = useState(false);
   const [error, setError] = useState("");
 
   const loadHistory = () => {
     setError("");
-    getHistory(50)
-      .then(setItems)
+    getHistoryPage({ limit: PAGE_SIZE })
+      .then((page) => {
+        setItems(page.items);
+        setNextCursor(page.nextCursor);
+      })
       .catch((err) => setError(err.message || "Failed to load history"))
       .finally(() => setLoading(false));
   };
 
+  const loadMore = () => {
+    if (!nextCursor || loadingMore) return;
+    setLoadingMore(true);
+    getHistoryPage({ cursor: nextCursor, limit: PAGE_SIZE })
+      .then((page) => {
+        setItems((prev) => [...prev, ...page.items]);
+        setNextCursor(page.nextCursor);
+      })
+      .catch((err) => setError(err.message || "Failed to load history"))
+      .finally(() => setLoadingMore(false));
+  };
+
   useEffect(() => {
     loadHistory();
   }, []);
@@ -63,6 +82,7 @@ export default function History() {
               try {
                 await clearHistory();
                 setItems([]);
+                setNextCursor(null);
               } catch (err) {
                 setError(err.message || "Failed to clear history");
               } finally {
@@ -115,6 +135,13 @@ export default function History() {
             ))}
           </ul>
         )}
+        {nextCursor && (
+          <div className="list-load-more">
+            <button type="button" className="btn btn-ghost" onClick={loadMore} disabled={loadingMore}>
+              {loadingMore ? "Loading…" : "Load more"}
+            </button>
+          </div>
+        )}
       </div>
     </div>
   );
@@ -1,15 +1,13 @@
 import React, { useState, useEffect } from "react";
-import { getStorage, getFiles, getHistory } from "../services/api";
+import { getStorage, getFilesPage, getHistory } from "../services/api";
 import DashboardCard from "../components/DashboardCard";
 import StorageBar from "../components/StorageBar";
 import "../styles/global.css";
 import "../styles/dashboard.css";
 
-const MAX_STORAGE_BYTES = 5 * 1024 * 1024 * 1024; // 5 GB
-
 export default function Home({ user, onOpenUpload }) {
-  const [storage, setStorage] = useState({ total_bytes: 0, total_mb: 0 });
-  const [files, setFiles] = useState([]);
+  const [storage, setStorage] = useState({ total_bytes: 0, total_mb: 0, file_count: 0 });
+  const [lastUpload, setLastUpload] = useState(null);
   const [history, setHistory] = useState([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState("");
@@ -20,12 +18,12 @@ export default function Home({ user, onOpenUpload }) {
       try {
         const [s, f, h] = await Promise.all([
           getStorage(),
-          getFiles(),
+          getFilesPage({ limit: 1 }),
           getHistory(10),
         ]);
         if (!cancelled) {
           setStorage(s);
-          setFiles(f);
+          setLastUpload(f.items[0] || null);
           setHistory(h);
         }
       } catch (err) {
@@ -38,10 +36,6 @@ export default function Home({ user, onOpenUpload }) {
     return () => { cancelled = true; };
   }, []);
 
-  const lastUpload = files.length
-    ? files.reduce((a, b) => (a.uploaded_at > b.uploaded_at ? a : b), files[0])
-    : null;
-
   if (loading) {
     return (
       <div className="app-content app-loading">
@@ -59,10 +53,10 @@ export default function Home({ user, onOpenUpload }) {
           onClick={() => {
             setError("");
             setLoading(true);
-            Promise.all([getStorage(), getFiles(), getHistory(10)])
+            Promise.all([getStorage(), getFilesPage({ limit: 1 }), getHistory(10)])
               .then(([s, f, h]) => {
                 setStorage(s);
-                setFiles(f);
+                setLastUpload(f.items[0] || null);
                 setHistory(h);
               })
               .catch((err) => setError(err.message || "Failed to load"))
@@ -86,11 +80,11 @@ export default function Home({ user, onOpenUpload }) {
         )}
       </div>
 
-      <StorageBar usedBytes={storage.total_bytes} maxBytes={MAX_STORAGE_BYTES} />
+      <StorageBar usedBytes={storage.total_bytes} maxBytes={storage.quota_bytes} />
 
       <div className="dashboard-grid">
         <DashboardCard label="Total storage used" value={`${storage.total_mb} MB`} icon="storage" />
-        <DashboardCard label="Files uploaded" value={String(files.length)} icon="files" />
+        <DashboardCard label="Files uploaded" value={String(storage.file_count)} icon="files" />
         <DashboardCard
           label="Last upload"
           value={
@@ -33,6 +33,29 @@ function parseErrorDetail(body) {
   return body.message || "Something went wrong";
 }
 
+/**
+ * Listings the backend tags with an ETag (files, storage, history) are kept
+ * here by URL and revalidated with If-None-Match; a 304 reuses the copy.
+ * Setting If-None-Match ourselves also keeps the browser's HTTP cache out
+ * of the way, so the 304 reaches this code.
+ */
+const listingCache = new Map();
+
+async function cachedGet(path, errorMessage) {
+  const url = `${API_BASE}${path}`;
+  const cached = listingCache.get(url);
+  const h = headers();
+  if (cached && cached.token === getToken()) h["If-None-Match"] = cached.etag;
+  const res = await fetch(url, { headers: h });
+  if (res.status === 304 && cached) return cached.result;
+  if (!res.ok) throw new Error(errorMessage);
+  const result = { data: await res.json(), nextCursor: res.headers.get("X-Next-Cursor") };
+  const etag = res.headers.get("ETag");
+  if (etag) listingCache.set(url, { etag, token: getToken(), result });
+  else listingCache.delete(url);
+  return result;
+}
+
 // --- Auth ---
 export async function login(email, password) {
   const res = await fetch(`${API_BASE}/api/auth/login`, {
@@ -69,6 +92,7 @@ export async function register(email, password, fullName) {
 export function logout() {
   localStorage.removeItem("token");
   localStorage.removeItem("user");
+  listingCache.clear();
 }
 
 export async function getMe() {
@@ -78,19 +102,61 @@ export async function getMe() {
 }
 
 // --- Files ---
+
+/**
+ * One page of files: { items, nextCursor }. Pass nextCursor back to get the
+ * following page; it is null on the last page.
+ */
+export async function getFilesPage({ cursor, limit = 100, sort = "uploaded_at", order = "desc" } = {}) {
+  const params = new URLSearchParams({ limit, sort, order });
+  if (cursor) params.set("cursor", cursor);
+  const { data, nextCursor } = await cachedGet(`/api/files/?${params}`, "Failed to fetch files");
+  return { items: data, nextCursor };
+}
+
+/**
+ * Search the user's files by name: { items, nextCursor }, best matches first.
+ * `q` matches anywhere in the name (every word must match); `ext` is e.g. "pdf,docx".
+ */
+export async function searchFiles({ q = "", prefix, ext, cursor, limit = 50 } = {}) {
+  const params = new URLSearchParams({ q, limit });
+  if (prefix) params.set("prefix", prefix);
+  if (ext) params.set("ext", ext);
+  if (cursor) params.set("cursor", cursor);
+  const res = await fetch(`${API_BASE}/api/files/search?${params}`, { headers: headers() });
+  if (!res.ok) throw new Error("Search failed");
+  return { items: await res.json(), nextCursor: res.headers.get("X-Next-Cursor") };
+}
+
 export async function getFiles() {
-  const res = await fetch(`${API_BASE}/api/files/`, { headers: headers() });
-  if (!res.ok) throw new Error("Failed to fetch files");
-  return res.json();
+  return (await getFilesPage()).items;
 }
 
 export async function getStorage() {
-  const res = await fetch(`${API_BASE}/api/files/storage`, { headers: headers() });
-  if (!res.ok) throw new Error("Failed to fetch storage");
-  return res.json();
+  return (await cachedGet("/api/files/storage", "Failed to fetch storage")).data;
 }
 
-export async function uploadFile(file) {
+/**
+ * Files below this go through the API, which deduplicates and compresses
+ * them; larger ones go straight to storage, where skipping the API hop
+ * matters more than either.
+ */
+const DIRECT_UPLOAD_MIN_BYTES = 8 * 1024 * 1024;
+
+/**
+ * Upload a file. With `parallel: true` the file is sent as a resumable
+ * multipart session: parts go up `concurrency` at a time, and a retry of the
+ * same file (same name/size/mtime) only resends the parts still missing.
+ * Otherwise large files go straight to storage through a signed upload URL
+ * (unless the backend has direct uploads turned off), small ones through
+ * the API.
+ */
+export async function uploadFile(file, { parallel = false, concurrency = 4 } = {}) {
+  if (parallel) return uploadFileInParts(file, concurrency);
+  if (file.size >= DIRECT_UPLOAD_MIN_BYTES) {
+    const direct = await uploadFileDirect(file);
+    if (direct) return direct;
+  }
   const form = new FormData();
   form.append("file", file);
   const res = await fetch(`${API_BASE}/api/files/upload`, {
@@ -105,22 +171,152 @@ export async function uploadFile(file) {
   return res.json();
 }
 
-export async function downloadFile(fileId) {
-  const token = getToken();
-  const res = await fetch(`${API_BASE}/api/files/${fileId}/download`, {
-    headers: { Authorization: `Bearer ${token}` },
+/** Reserve, PUT to storage, finalize. Resolves to null if direct uploads are off. */
+async function uploadFileDirect(file) {
+  const authorized = { Authorization: `Bearer ${getToken()}` };
+  const res = await fetch(`${API_BASE}/api/files/direct/`, {
+    method: "POST",
+    headers: { ...authorized, "Content-Type": "application/json" },
+    body: JSON.stringify({
+      filename: file.name,
+      size_bytes: file.size,
+      mime_type: file.type || null,
+    }),
   });
-  if (!res.ok) throw new Error("Download failed");
-  const blob = await res.blob();
-  const disposition = res.headers.get("Content-Disposition");
-  const nameMatch = disposition && disposition.match(/filename="?([^";]+)"?/);
-  const filename = nameMatch ? nameMatch[1] : "download";
-  const url = URL.createObjectURL(blob);
+  if (res.status === 404) return null;
+  if (!res.ok) {
+    const err = await res.json().catch(() => ({}));
+    throw new Error(parseErrorDetail(err) || "Upload failed");
+  }
+  const target = await res.json();
+
+  // Local storage's stand-in endpoint is an API path; Supabase URLs are absolute.
+  const url = target.upload_url.startsWith("/") ? `${API_BASE}${target.upload_url}` : target.upload_url;
+  const put = await fetch(url, { method: target.method, headers: target.headers, body: file });
+  if (!put.ok) {
+    await fetch(`${API_BASE}/api/files/direct/${target.upload_id}`, {
+      method: "DELETE",
+      headers: authorized,
+    }).catch(() => {});
+    const err = await put.json().catch(() => ({}));
+    throw new Error(parseErrorDetail(err) || "Upload failed");
+  }
+
+  const done = await fetch(`${API_BASE}/api/files/direct/${target.upload_id}/finalize`, {
+    method: "POST",
+    headers: authorized,
+  });
+  if (!done.ok) {
+    const err = await done.json().catch(() => ({}));
+    throw new Error(parseErrorDetail(err) || "Upload failed");
+  }
+  return done.json();
+}
+
+async function uploadsRequest(path, options = {}) {
+  const res = await fetch(`${API_BASE}/api/files/uploads${path}`, {
+    ...options,
+    headers: { Authorization: `Bearer ${getToken()}`, ...(options.headers || {}) },
+  });
+  if (!res.ok) {
+    const err = await res.json().catch(() => ({}));
+    const error = new Error(parseErrorDetail(err) || "Upload failed");
+    error.status = res.status;
+    throw error;
+  }
+  return res.json();
+}
+
+async function uploadFileInParts(file, concurrency) {
+  const resumeKey = `upload:${file.name}:${file.size}:${file.lastModified}`;
+  let session = null;
+
+  const savedId = localStorage.getItem(resumeKey);
+  if (savedId) {
+    session = await uploadsRequest(`/${savedId}`).catch(() => null);
+  }
+  if (!session) {
+    session = await uploadsRequest("/", {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({
+        filename: file.name,
+        size_bytes: file.size,
+        mime_type: file.type || null,
+      }),
+    });
+    localStorage.setItem(resumeKey, session.session_id);
+  }
+
+  const done = new Set(session.parts_done);
+  const queue = [];
+  for (let n = 0; n < session.part_count; n++) {
+    if (!done.has(n)) queue.push(n);
+  }
+
+  const sendPart = async (n, attempt = 1) => {
+    const form = new FormData();
+    form.append("file", file.slice(n * session.part_size, (n + 1) * session.part_size));
+    try {
+      await uploadsRequest(`/${session.session_id}/parts/${n}`, { method: "PUT", body: form });
+    } catch (err) {
+      if (attempt >= 3 || (err.status && err.status < 500)) throw err;
+      await sendPart(n, attempt + 1);
+    }
+  };
+
+  const worker = async () => {
+    while (queue.length) await sendPart(queue.shift());
+  };
+  await Promise.all(Array.from({ length: Math.min(concurrency, queue.length) }, worker));
+
+  const result = await uploadsRequest(`/${session.session_id}/commit`, { method: "POST" });
+  localStorage.removeItem(resumeKey);
+  return result;
+}
+
+/** Hand a download URL to the browser, which streams it straight to disk. */
+function startBrowserDownload(url) {
   const a = document.createElement("a");
-  a.href = url;
-  a.download = filename;
+  // Proxied links are API paths; signed storage URLs need ?download= to be
+  // served as an attachment.
+  a.href = url.startsWith("/")
+    ? `${API_BASE}${url}`
+    : url + (url.includes("?") ? "&" : "?") + "download=";
+  a.download = "";
+  a.rel = "noopener";
+  document.body.appendChild(a);
   a.click();
-  URL.revokeObjectURL(url);
+  a.remove();
+}
+
+export async function downloadFile(fileId) {
+  const res = await fetch(`${API_BASE}/api/files/${fileId}/download`, { headers: headers() });
+  if (!res.ok) throw new Error("Download failed");
+  const { url } = await res.json();
+  startBrowserDownload(url);
+}
+
+/** Download URLs for many files in one request: { urls: { [id]: url }, missing: [id] }. */
+export async function getSignedUrls(fileIds) {
+  const res = await fetch(`${API_BASE}/api/files/signed-urls`, {
+    method: "POST",
+    headers: headers(),
+    body: JSON.stringify({ file_ids: fileIds }),
+  });
+  if (!res.ok) throw new Error("Failed to get download links");
+  return res.json();
+}
+
+/**
+ * Fetch a file's preview (the `preview` object from the file list).
+ * Images resolve to an object URL, text previews to the snippet itself.
+ */
+export async function getPreview(preview) {
+  const res = await fetch(`${API_BASE}${preview.url}`, { headers: headers() });
+  if (!res.ok) throw new Error("Preview unavailable");
+  if (preview.kind === "image") return URL.createObjectURL(await res.blob());
+  return res.text();
 }
 
 export async function deleteFile(fileId) {
@@ -132,11 +328,49 @@ export async function deleteFile(fileId) {
   return res.json();
 }
 
+/** Delete many files in one request: { deleted: [id], failed: [{ id, error }] }. */
+export async function bulkDeleteFiles(fileIds) {
+  const res = await fetch(`${API_BASE}/api/files/bulk-delete`, {
+    method: "POST",
+    headers: headers(),
+    body: JSON.stringify({ file_ids: fileIds }),
+  });
+  if (!res.ok) throw new Error("Delete failed");
+  return res.json();
+}
+
+/** Download many files: one request for all links, then one browser download each. */
+export async function bulkDownloadFiles(fileIds) {
+  const res = await fetch(`${API_BASE}/api/files/bulk-download`, {
+    method: "POST",
+    headers: headers(),
+    body: JSON.stringify({ file_ids: fileIds }),
+  });
+  if (!res.ok) throw new Error("Download failed");
+  const { urls, missing } = await res.json();
+  Object.values(urls).forEach((url, i) => {
+    // Stagger the clicks; browsers drop downloads started in the same tick.
+    setTimeout(() => startBrowserDownload(url), i * 300);
+  });
+  return { started: Object.keys(urls).length, missing };
+}
+
 // --- History ---
+
+/** One page of history, newest first: { items, nextCursor }. */
+export async function getHistoryPage({ cursor, limit = 50 } = {}) {
+  const params = new URLSearchParams({ limit });
+  if (cursor) params.set("cursor", cursor);
+  // Activity is written in the background; make the first page include it.
+  else params.set("flush", "true");
+  const { data, nextCursor } = await cachedGet(
+    `/api/auth/history?${params}`, "Failed to fetch history"
+  );
+  return { items: data, nextCursor };
+}
+
 export async function getHistory(limit = 50) {
-  const res = await fetch(`${API_BASE}/api/auth/history?limit=${limit}`, { headers: headers() });
-  if (!res.ok) throw new Error("Failed to fetch history");
-  return res.json();
+  return (await getHistoryPage({ limit })).items;
 }
 
 // --- Admin ---